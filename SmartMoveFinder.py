@@ -1,23 +1,63 @@
 import random
+import time
+
+import endgameBitbases
+from bitboards import lsb, popCount
+from chessEngine import EMPTY_INDEX, PROMOTION
+from evaluation import PIECE_VALUES
+from moveOrdering import MoveOrderer
+from searchStats import SearchStats, TimedGameState, PROFILES, startProfile
+from transpositionTable import (TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND, DEPTH as TT_DEPTH,
+                                SCORE as TT_SCORE, BOUND as TT_BOUND, BEST_MOVE as TT_BEST_MOVE)
 
 pieceScore = {"K":0, "Q":10, "R":5, "B":3, "N":3, "P":1 }
-CHECKMATE = 1000
+CHECKMATE = 100000                          #scores are in centipawns (see evaluation.py)
 STALEMATE = 0
 DEPTH = 2
+MAX_DEPTH = 64                              #iterative deepening never goes past this
+MATE_BOUND = CHECKMATE - MAX_DEPTH          #scores beyond this are mates, stored relative to the node
+DELTA_MARGIN = 200                          #quiescence skips captures that cannot lift the score near alpha
+BITBASE_WIN = 20000                         #bitbase wins score above any evaluation but below the mates
+
+#selective search, every technique can be switched off on its own (NegaMaxSearch(..., selective=...))
+SELECTIVE = ("nullMove", "lmr", "futility", "razoring", "checkExtensions")
+NULL_MOVE_MIN_DEPTH = 3                     #null move search needs this much depth left
+NULL_MOVE_REDUCTION = 2                     #depth taken off the null move search (one more from depth 6)
+LMR_MIN_DEPTH = 3                           #late move reductions from this depth
+LMR_MIN_MOVES = 3                           #moves searched at full depth before reductions start
+FUTILITY_MARGINS = (0, 200, 450)            #by depth left: quiet moves cannot lift eval + margin above alpha
+RAZOR_MARGINS = (0, 300, 550)               #by depth left: eval + margin below alpha drops into quiescence
+
+#kept for the whole game, chessMain calls the AI every turn
+transpositionTable = TranspositionTable()
+#the greedy and minimax searches keep their own table: their entries are all exact and their mate scores are
+#not stored relative to the ply, so they must not read the bounds NegaMaxSearch writes (and the other way round)
+LEGACY_TABLE_SIZE = 1 << 16
+legacyTable = TranspositionTable(LEGACY_TABLE_SIZE)
 
 #random moves algorithm
 def findRandomMove(validMoves):
     return validMoves[random.randint(0, len(validMoves)-1)]
 
-#greedy algorithm + minimax
-def findBestMove(gs, validMoves):
+#greedy algorithm + minimax, tt defaults to legacyTable
+def findBestMove(gs, validMoves, tt=None):
+    tt = legacyTable if tt is None else tt
     turnMultiplier = 1 if gs.whiteToMove else -1
 
     opponentMinMaxScore = CHECKMATE
     bestPlayerMove = None
+    tt.newSearch()
     random.shuffle(validMoves)
     for playerMove in validMoves:
         gs.makeMove(playerMove)
+        entry = tt.probe(gs.zobristKey)
+        if entry is not None and entry[TT_DEPTH] >= 1:                 #opponent's best reply already known
+            opponentMaxScore = entry[TT_SCORE]
+            if opponentMaxScore < opponentMinMaxScore:
+                opponentMinMaxScore = opponentMaxScore
+                bestPlayerMove = playerMove
+            gs.undoMove()
+            continue
         opponentsMoves = gs.getValidMoves()
 
         if gs.staleMate:
@@ -35,11 +75,13 @@ def findBestMove(gs, validMoves):
                 elif gs.staleMate:
                     score = STALEMATE
                 else:
-                    score = - turnMultiplier * scoreMaterial(gs.board)
+                    score = - turnMultiplier * gs.evaluate()
                 if score > opponentMaxScore:
                     opponentMaxScore = score
                     #bestMove = playerMove
                 gs.undoMove()
+        #score from the opponent's point of view, who is to move here
+        tt.store(gs.zobristKey, 1, opponentMaxScore, EXACT, None)
 
         if opponentMaxScore < opponentMinMaxScore:
             opponentMinMaxScore = opponentMaxScore
@@ -49,42 +91,460 @@ def findBestMove(gs, validMoves):
     return bestPlayerMove
 
 #minmax algorithm
-def findBestMoveMinMax(gs, validMoves):
+def findBestMoveMinMax(gs, validMoves, tt=None):
     global nextMove
     nextMove = None
-    findMoveMinMax(gs, validMoves, DEPTH, gs.whiteToMove)
+    tt = legacyTable if tt is None else tt
+    tt.newSearch()
+    findMoveMinMax(gs, validMoves, DEPTH, gs.whiteToMove, tt)
     return nextMove
 
-def findMoveMinMax(gs, validMoves, depth, whiteToMove):
+#scores are from white's point of view, positions below the root are looked up in the transposition table
+#(the table holds scores from the side to move's point of view, like findBestMove)
+def findMoveMinMax(gs, validMoves, depth, whiteToMove, tt=legacyTable):
     global nextMove
     if depth == 0:
-        return scoreMaterial(gs.board)
+        return gs.evaluate()
+    turnMultiplier = 1 if whiteToMove else -1
+    if depth != DEPTH:                                      #the root still has to set nextMove
+        entry = tt.probe(gs.zobristKey)
+        if entry is not None and entry[TT_DEPTH] >= depth:
+            return turnMultiplier * entry[TT_SCORE]
 
+    bestMove = None
     if whiteToMove:
         maxScore = -CHECKMATE
         for move in validMoves:
             gs.makeMove(move)
-            nextMove = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMove, depth-1, False)
+            score = findMoveMinMax(gs, gs.getValidMoves(), depth-1, False, tt)
             if score > maxScore:
                 maxScore = score
+                bestMove = move
                 if depth == DEPTH:
                     nextMove = move
             gs.undoMove()
+        tt.store(gs.zobristKey, depth, turnMultiplier * maxScore, EXACT, bestMove)
         return maxScore
     else:
         minScore = CHECKMATE
         for move in validMoves:
             gs.makeMove(move)
-            score = findMoveMinMax(gs, validMoves, depth-1, True)
+            score = findMoveMinMax(gs, gs.getValidMoves(), depth-1, True, tt)
             if score < minScore:
                 minScore = score
+                bestMove = move
                 if depth == DEPTH:
                     nextMove = move
             gs.undoMove()
+        tt.store(gs.zobristKey, depth, turnMultiplier * minScore, EXACT, bestMove)
         return minScore
 
 
+#negamax + alpha beta with iterative deepening
+#stops at maxDepth, after timeLimit seconds or after nodeLimit nodes, whichever comes first
+def findBestMoveNegaMax(gs, validMoves, maxDepth=None, timeLimit=None, nodeLimit=None, orderMoves=True,
+                        quiescence=True, selective=SELECTIVE, staged=True, tt=None):
+    if maxDepth is None:
+        maxDepth = MAX_DEPTH if timeLimit is not None or nodeLimit is not None else DEPTH
+    return NegaMaxSearch(gs, maxDepth, timeLimit, nodeLimit, tt=tt, orderMoves=orderMoves,
+                         quiescence=quiescence, selective=selective, staged=staged).search(validMoves)
+
+
+class SearchResult:
+    def __init__(self, bestMove, score, depth, pv, nodes, elapsed, orderingStats=None, qNodes=0, stats=None):
+        self.bestMove = bestMove                #best move of the last completed iteration
+        self.score = score                      #from the side to move's point of view
+        self.depth = depth                      #depth of the last completed iteration
+        self.pv = pv                            #principal variation, starts with bestMove
+        self.nodes = nodes                      #main search nodes
+        self.qNodes = qNodes                    #quiescence search nodes
+        self.elapsed = elapsed                  #seconds
+        self.orderingStats = orderingStats      #cutoffs and how many came from the first move
+        self.stats = stats                      #searchStats.SearchStats of the whole search
+
+
+class SearchAborted(Exception):
+    pass
+
+
+class NegaMaxSearch:
+    #orderMoves=False searches moves in generation order (hash move still first), to measure the ordering
+    #quiescence=False scores leaves with evaluate() directly
+    #nodeLimit counts main and quiescence nodes together
+    #stopCheck is called with the time checks and aborts the search when it returns True (cancel from a GUI)
+    #onIteration is called with the SearchResult of every completed iteration
+    #profile is None, "timing", "cprofile" or "sample" (see searchStats.py), the result goes to result.stats
+    #selective holds the names of the selective search techniques to use (SELECTIVE, () for full width)
+    #staged=True generates the moves of an ordered node in stages (GameState.stagedMoves), False all at once
+    def __init__(self, gs, maxDepth, timeLimit=None, nodeLimit=None, tt=None, orderMoves=True, quiescence=True,
+                 stopCheck=None, onIteration=None, profile=None, selective=SELECTIVE, staged=True):
+        if profile is not None and profile not in PROFILES:
+            raise ValueError("unknown profile %r (choose from %s)" % (profile, ", ".join(PROFILES)))
+        unknown = set(selective) - set(SELECTIVE)
+        if unknown:
+            raise ValueError("unknown selective search technique %s (choose from %s)" % (
+                ", ".join(sorted(unknown)), ", ".join(SELECTIVE)))
+        self.gs = gs
+        self.maxDepth = min(maxDepth, MAX_DEPTH)
+        self.timeLimit = timeLimit
+        self.nodeLimit = nodeLimit
+        self.tt = transpositionTable if tt is None else tt
+        self.orderMoves = orderMoves
+        self.quiescence = quiescence
+        self.stopCheck = stopCheck
+        self.onIteration = onIteration
+        self.profile = profile
+        self.selective = tuple(name for name in SELECTIVE if name in selective)
+        self.nullMove = "nullMove" in selective
+        self.lmr = "lmr" in selective
+        self.futility = "futility" in selective
+        self.razoring = "razoring" in selective and quiescence          #razoring drops into the quiescence search
+        self.checkExtensions = "checkExtensions" in selective
+        self.staged = staged and orderMoves
+        self.stageCounts = [0, 0, 0]                                #staged nodes, capture stages, quiet stages
+        self.rootDepth = 0
+        self.stats = SearchStats(MAX_DEPTH)
+        self.nodesPerPly = [0] * (MAX_DEPTH + 1)                   #nodes per ply of the running iteration
+        self.orderer = MoveOrderer(pieceScore, MAX_DEPTH)          #history and killers last for all iterations
+        self.nodes = 0
+        self.qNodes = 0
+        self.deadline = None
+
+    def search(self, validMoves):
+        gs = self.gs
+        startTime = time.perf_counter()
+        self.deadline = startTime + self.timeLimit if self.timeLimit is not None else None
+        self.nodes = 0
+        self.qNodes = 0
+        self.stageCounts = [0, 0, 0]
+        self.tt.newSearch()
+        stats = self.stats = SearchStats(MAX_DEPTH)
+        tt, orderer = self.tt, self.orderer
+        ttStart = (tt.probes, tt.hits, tt.stores)
+        cutoffStart = (orderer.cutoffs, orderer.firstMoveCutoffs)
+        if self.profile == "timing":
+            self.gs = TimedGameState(gs, stats)
+        stopProfile = startProfile(self.profile, stats)
+        try:
+            result = self.iterate(gs, validMoves, startTime)
+        finally:
+            stopProfile()
+            self.gs = gs
+
+        stats.nodes = result.nodes = self.nodes
+        stats.qNodes = result.qNodes = self.qNodes
+        stats.elapsed = result.elapsed = time.perf_counter() - startTime
+        stats.depth = result.depth
+        stats.ttProbes, stats.ttHits, stats.ttStores = (tt.probes - ttStart[0], tt.hits - ttStart[1],
+                                                        tt.stores - ttStart[2])
+        stats.cutoffs = orderer.cutoffs - cutoffStart[0]
+        stats.firstMoveCutoffs = orderer.firstMoveCutoffs - cutoffStart[1]
+        stats.selective = self.selective
+        stats.stagedNodes, stats.captureStages, stats.quietStages = self.stageCounts
+        result.orderingStats = orderer.stats()
+        result.stats = stats
+        return result
+
+    #iterative deepening loop of search, returns the result of the last completed iteration
+    def iterate(self, gs, validMoves, startTime):
+        logLength = len(gs.moveLog)
+        rootMoves = filterBitbaseMoves(gs, validMoves)
+        if self.orderMoves:
+            self.orderer.orderMoves(rootMoves)
+        if not rootMoves:                                   #checkmate or stalemate, nothing to search
+            return SearchResult(None, -CHECKMATE if gs.inCheck() else STALEMATE, 0, [], 0,
+                                time.perf_counter() - startTime)
+        result = SearchResult(rootMoves[0], 0, 0, rootMoves[:1], 0, 0.0)
+
+        for depth in range(1, self.maxDepth + 1):
+            self.nodesPerPly = [0] * (MAX_DEPTH + 1)        #counted per iteration, the last complete one is kept
+            iterationStart = self.nodes + self.qNodes
+            try:
+                score, pv = self.searchRoot(rootMoves, depth)
+            except SearchAborted:
+                while len(gs.moveLog) > logLength:          #unwind the interrupted iteration
+                    gs.undoMove()
+                break
+            self.stats.nodesPerPly = self.nodesPerPly
+            self.stats.iterationNodes.append(self.nodes + self.qNodes - iterationStart)
+            pv = self.extendPv(pv, depth)
+            result = SearchResult(pv[0], score, depth, pv, self.nodes, time.perf_counter() - startTime,
+                                  qNodes=self.qNodes)
+            rootMoves.remove(pv[0])                         #search the best move first next iteration
+            rootMoves.insert(0, pv[0])
+            if self.onIteration is not None:
+                self.onIteration(result)
+            if abs(score) > MATE_BOUND:                     #forced mate found, deeper search cannot improve it
+                break
+        return result
+
+    def searchRoot(self, rootMoves, depth):
+        gs = self.gs
+        self.rootDepth = depth
+        alpha, beta = -CHECKMATE - 1, CHECKMATE + 1
+        bestPv = None
+        self.nodesPerPly[0] += 1
+        for move in rootMoves:
+            gs.makeMove(move)
+            childPv = []
+            score = -self.negaMax(depth - 1, -beta, -alpha, 1, childPv)
+            gs.undoMove()
+            if score > alpha:
+                alpha = score
+                bestPv = [move] + childPv
+        if bestPv is not None:
+            self.tt.store(gs.zobristKey, depth, alpha, EXACT, bestPv[0])
+        return alpha, bestPv
+
+    #a pv cut short by a transposition table hit is completed from the table's best moves
+    def extendPv(self, pv, depth):
+        gs = self.gs
+        pv = list(pv)
+        for move in pv:
+            gs.makeMove(move)
+        while len(pv) < depth:
+            entry = self.tt.probe(gs.zobristKey)
+            if entry is None or entry[TT_BEST_MOVE] is None:
+                break
+            move = next((m for m in gs.getValidMoves() if m == entry[TT_BEST_MOVE]), None)
+            if move is None:
+                break
+            gs.makeMove(move)
+            pv.append(move)
+        for _ in pv:
+            gs.undoMove()
+        return pv
+
+    def checkLimits(self):
+        nodes = self.nodes + self.qNodes
+        if self.nodeLimit is not None and nodes > self.nodeLimit:
+            raise SearchAborted()
+        if nodes & 255 == 0:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchAborted()
+            if self.stopCheck is not None and self.stopCheck():
+                raise SearchAborted()
+
+    def negaMax(self, depth, alpha, beta, ply, pv):
+        gs = self.gs
+        inCheck = bool(self.selective) and gs.inCheck()
+        if inCheck and self.checkExtensions and ply < 2 * self.rootDepth and ply + depth < MAX_DEPTH:
+            depth += 1                                      #check extension, also lifts checks off the horizon
+            self.stats.checkExtensions += 1
+        if depth <= 0:                                      #horizon node, counted before the quiescence search
+            self.nodes += 1
+            self.nodesPerPly[ply] += 1
+            if self.quiescence:
+                return self.quiescenceSearch(alpha, beta, ply)
+            self.checkLimits()
+            score = bitbaseScore(gs)
+            return evaluate(gs) if score is None else score
+        self.nodes += 1
+        self.nodesPerPly[ply] += 1
+        self.checkLimits()
+
+        alphaOrig = alpha
+        hashMove = None
+        entry = self.tt.probe(gs.zobristKey)
+        if entry is not None:
+            hashMove = entry[TT_BEST_MOVE]
+            if entry[TT_DEPTH] >= depth:
+                score = scoreFromTT(entry[TT_SCORE], ply)
+                bound = entry[TT_BOUND]
+                if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or \
+                        (bound == UPPER_BOUND and score <= alpha):
+                    return score
+
+        futile = False
+        if self.selective and not inCheck and -MATE_BOUND < alpha and beta < MATE_BOUND:
+            staticEval = evaluate(gs)
+            #razoring: far below alpha near the leaves, only captures can still help
+            if self.razoring and depth < len(RAZOR_MARGINS) and staticEval + RAZOR_MARGINS[depth] <= alpha:
+                score = self.quiescenceSearch(alpha, beta, ply)
+                if score <= alpha:
+                    self.stats.razorCutoffs += 1
+                    return score
+            #null move pruning: if passing still fails high, a real move will too (not in pawn endings: zugzwang)
+            if self.nullMove and depth >= NULL_MOVE_MIN_DEPTH and staticEval >= beta and \
+                    gs.moveLog[-1] is not None and hasPieces(gs):
+                reduction = NULL_MOVE_REDUCTION + (1 if depth >= 6 else 0)
+                gs.makeNullMove()
+                score = -self.negaMax(depth - 1 - reduction, -beta, -beta + 1, ply + 1, [])
+                gs.undoNullMove()
+                if score >= beta:
+                    self.stats.nullMoveCutoffs += 1
+                    return beta if score > MATE_BOUND else score
+            #futility pruning: quiet moves cannot lift the score to alpha near the leaves
+            if self.futility and depth < len(FUTILITY_MARGINS):
+                futilityScore = staticEval + FUTILITY_MARGINS[depth]
+                futile = futilityScore <= alpha
+
+        killers = self.orderer.killers[ply] if ply < len(self.orderer.killers) else ()
+        if self.staged:                                     #a cutoff leaves the later stages ungenerated
+            orderer = self.orderer
+            moves = gs.stagedMoves(hashMove, killers, orderer.captureScore, orderer.quietScore, self.stageCounts)
+        else:
+            moves = gs.getValidMoves()
+            if self.orderMoves:
+                self.orderer.orderMoves(moves, hashMove, ply)
+            elif hashMove is not None:                      #try the stored best move first
+                for i in range(len(moves)):
+                    if moves[i] == hashMove:
+                        moves.insert(0, moves.pop(i))
+                        break
+        reduce = self.lmr and depth >= LMR_MIN_DEPTH and not inCheck
+
+        bestScore = -CHECKMATE - 1
+        bestMove = None
+        i = -1
+        for i, move in enumerate(moves):
+            code = move.code
+            quiet = (code >> 20) & 15 == EMPTY_INDEX and (code >> 14) & 3 != PROMOTION
+            gs.makeMove(move)
+            childPv = []
+            if quiet and i > 0 and (futile or (reduce and i >= LMR_MIN_MOVES)) and not gs.inCheck():
+                if futile:
+                    gs.undoMove()
+                    self.stats.futilityPrunes += 1
+                    if futilityScore > bestScore:
+                        bestScore = futilityScore
+                    continue
+                if i >= LMR_MIN_MOVES and move not in killers:
+                    #late move reduction: a quiet move this far down the ordering is searched shallower
+                    #with a null window first, and again at full depth only if it beats alpha
+                    reduction = 2 if i >= 6 and depth >= 6 else 1
+                    self.stats.lmrReductions += 1
+                    score = -self.negaMax(depth - 1 - reduction, -alpha - 1, -alpha, ply + 1, childPv)
+                    if score <= alpha:
+                        gs.undoMove()
+                        if score > bestScore:
+                            bestScore = score
+                        continue
+                    self.stats.lmrResearches += 1
+                    childPv = []
+            score = -self.negaMax(depth - 1, -beta, -alpha, ply + 1, childPv)
+            gs.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+                if score > alpha:
+                    alpha = score
+                    pv[:] = [move] + childPv
+                    if alpha >= beta:
+                        self.orderer.recordCutoff(move, depth, ply, i)
+                        break
+        if i < 0:                                           #no legal move
+            return -(CHECKMATE - ply) if gs.inCheck() else STALEMATE
+
+        if bestScore >= beta:
+            bound = LOWER_BOUND
+        elif bestScore <= alphaOrig:
+            bound = UPPER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(gs.zobristKey, depth, scoreToTT(bestScore, ply), bound, bestMove)
+        return bestScore
+
+
+    #captures and promotions only, until the position is quiet
+    def quiescenceSearch(self, alpha, beta, ply):
+        gs = self.gs
+        self.qNodes += 1
+        self.checkLimits()
+
+        score = bitbaseScore(gs)
+        if score is not None:                               #3 pieces left, the bitbase knows the result
+            return score
+        standPat = evaluate(gs)
+        if standPat >= beta:                                #side to move can just keep this score
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+
+        moves = gs.getCaptureMoves()
+        self.orderer.orderMoves(moves, None, ply)
+        for move in moves:
+            if move.isPawnPromotion and move.promotionChoice != 'Q':   #underpromotions are left to the main search
+                continue
+            if not move.isPawnPromotion and \
+                    standPat + PIECE_VALUES[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha:     #delta pruning
+                continue
+            gs.makeMove(move)
+            score = -self.quiescenceSearch(-beta, -alpha, ply + 1)
+            gs.undoMove()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+#mate scores are stored as distance from the node instead of from the root
+def scoreToTT(score, ply):
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def scoreFromTT(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+#side to move has a knight, bishop, rook or queen (null move pruning is unsafe in pawn endings)
+def hasPieces(gs):
+    boards = gs.pieceBitboards
+    color = 'w' if gs.whiteToMove else 'b'
+    return bool(boards[color + 'N'] | boards[color + 'B'] | boards[color + 'R'] | boards[color + 'Q'])
+
+
+#static evaluation from the side to move's point of view, O(1) from the sums GameState keeps
+def evaluate(gs):
+    return gs.evaluate() if gs.whiteToMove else -gs.evaluate()
+
+
+#bitbase result from the side to move's point of view, None when no bitbase covers gs
+#wins add a mop-up term so the search drives the lone king to the edge and brings its own king closer
+def bitbaseScore(gs):
+    if popCount(gs.occupied) != 3:
+        return None
+    result = endgameBitbases.probe(gs)
+    if not result:
+        return result                                       #None or DRAW (0)
+    winning = gs.whiteToMove if result == endgameBitbases.WIN else not gs.whiteToMove
+    strongKing = lsb(gs.pieceBitboards["wK" if winning else "bK"])
+    loneKing = lsb(gs.pieceBitboards["bK" if winning else "wK"])
+    row, col = divmod(loneKing, 8)
+    edge = max(3 - row, row - 4) + max(3 - col, col - 4)
+    distance = abs(row - strongKing // 8) + abs(col - strongKing % 8)
+    score = BITBASE_WIN + abs(gs.evaluate()) + 10 * edge + 4 * (14 - distance)
+    return score if result == endgameBitbases.WIN else -score
+
+
+#root moves that keep the bitbase result (a won position stays won, a drawn one drawn), all moves otherwise
+def filterBitbaseMoves(gs, validMoves):
+    if popCount(gs.occupied) != 3:
+        return list(validMoves)
+    result = endgameBitbases.probe(gs)
+    if result is None:
+        return list(validMoves)
+    kept = []
+    for move in validMoves:
+        gs.makeMove(move)
+        childResult = endgameBitbases.probe(gs)
+        if childResult is None and popCount(gs.occupied) == 2:              #bare kings
+            childResult = endgameBitbases.DRAW
+        gs.undoMove()
+        if childResult == -result:
+            kept.append(move)
+    return kept or list(validMoves)
+
+
 def scoreBoard(gs):
     #positive score for white and negative score for black
     if gs.checkMate:
@@ -95,15 +555,7 @@ def scoreBoard(gs):
     elif gs.staleMate:
         return STALEMATE                             #stalemate
 
-    score = 0
-    for row in gs.board:
-        for square in row:
-            if square[0] == "w":
-                score += pieceScore[square[1]]
-            elif square[0] == "b":
-                score -= pieceScore[square[1]]
-
-    return score
+    return gs.evaluate()
 
 
 
@@ -0,0 +1,115 @@
+"""
+background AI for the GUI, the search runs in its own process so the pygame loop never waits on it
+-> startSearch / poll: the main loop asks for a move and checks every frame if it is ready
+-> cancel: drops the running search (undo, reset)
+-> pondering: while the human thinks the worker searches the position after the expected reply,
+   if the human plays it the same search goes on with a time limit (ponder hit)
+-> the worker keeps one transposition table for the whole game, so ponder misses are not all lost
+"""
+import multiprocessing
+import pickle
+import queue
+import time
+
+from SmartMoveFinder import NegaMaxSearch, MAX_DEPTH
+from transpositionTable import TranspositionTable
+
+AI_TIME_LIMIT = 2.0             #seconds per AI move (after a ponder hit: from the moment the human moved)
+
+
+def _workerLoop(commands, results, cancelledId, deadline):
+    tt = TranspositionTable()
+    while True:
+        command = commands.get()
+        if command is None:
+            return
+        searchId, state, maxDepth = command
+        if cancelledId.value >= searchId:
+            continue
+        gs = pickle.loads(state)
+
+        def stopCheck():
+            return cancelledId.value >= searchId or 0 < deadline.value < time.time()
+
+        search = NegaMaxSearch(gs, maxDepth, tt=tt, stopCheck=stopCheck)
+        results.put((searchId, search.search(gs.getValidMoves())))
+
+
+class AIWorker:
+    def __init__(self, timeLimit=AI_TIME_LIMIT, maxDepth=MAX_DEPTH):
+        self.timeLimit = timeLimit
+        self.maxDepth = maxDepth
+        context = multiprocessing.get_context("spawn")              #no forking of the pygame display
+        self.commands = context.Queue()
+        self.results = context.Queue()
+        self.cancelledId = context.Value('i', 0, lock=False)         #searches up to this id are dropped
+        self.deadline = context.Value('d', 0.0, lock=False)          #time.time() of the current search, 0 = none
+        self.process = context.Process(target=_workerLoop, daemon=True,
+                                       args=(self.commands, self.results, self.cancelledId, self.deadline))
+        self.searchId = 0
+        self.running = False             #a search or ponder was sent and its result is not taken yet
+        self.pondering = False
+        self.ponderKey = None            #zobrist key of the position the ponder search is for
+        self.readyResult = None
+
+    def start(self):
+        self.process.start()
+
+    def stop(self):
+        self.cancel()
+        self.commands.put(None)
+        self.process.join(1)
+
+    #searches the position of gs, poll() returns the result once the time is up
+    def startSearch(self, gs):
+        self.cancel()
+        self.deadline.value = time.time() + self.timeLimit
+        self.send(gs)
+
+    #searches the position after expectedMove (the human's predicted reply) without a time limit
+    def startPonder(self, gs, expectedMove):
+        self.cancel()
+        gs.makeMove(expectedMove)
+        self.ponderKey = gs.zobristKey
+        self.deadline.value = 0.0
+        self.send(gs)
+        gs.undoMove()
+        self.pondering = True
+
+    #the AI has to move in gs: continue the ponder search if it guessed right, else start a new one
+    def requestMove(self, gs):
+        if self.pondering and gs.zobristKey == self.ponderKey:
+            self.pondering = False
+            self.deadline.value = time.time() + self.timeLimit
+        else:
+            self.startSearch(gs)
+
+    def send(self, gs):
+        self.searchId += 1
+        self.running = True
+        self.readyResult = None
+        #pickled here, the queue's feeder thread would see gs after the caller changed it
+        self.commands.put((self.searchId, pickle.dumps(gs), self.maxDepth))
+
+    def cancel(self):
+        self.cancelledId.value = self.searchId
+        self.running = False
+        self.pondering = False
+        self.ponderKey = None
+        self.readyResult = None
+
+    #SearchResult of the current search if it is done, never blocks
+    def poll(self):
+        while True:
+            try:
+                searchId, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if searchId == self.searchId and self.running:              #results of cancelled searches are dropped
+                self.readyResult = result
+        if self.readyResult is None or self.pondering:                  #a finished ponder waits for the ponder hit
+            return None
+        result = self.readyResult
+        self.readyResult = None
+        self.running = False
+        return result
@@ -0,0 +1,420 @@
+"""
+local position analysis service (asyncio, HTTP/JSON, no pygame)
+-> POST /analyse {"fen": ..., "moves": [...], "depth": n, "time": seconds}
+   fen defaults to the start position, moves are coordinate (e2e4, e7e8q) or SAN (Nf3, O-O)
+   the moves are replayed into a GameState, the search itself only sees the final FEN (no repetition history)
+-> searches run on a process pool (NegaMaxSearch, one transposition table per worker)
+-> requests for the same position and limits share one search while it runs (coalescing)
+-> finished results go into an LRU cache keyed by position and limits
+-> GET /stats: queue depth, running searches, latency percentiles, cache hit rate; GET /health
+-> bench: starts the service on a free localhost port and sends concurrent requests with repeats
+
+usage:
+    python analysisService.py serve --port 8765 --workers 2
+    curl -d '{"moves": ["e4", "e5", "Nf3"], "depth": 4}' localhost:8765/analyse
+    python analysisService.py bench --requests 40 --concurrency 8 --depth 3
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+import chessEngine
+from parallelSearch import BENCH_POSITIONS
+from SmartMoveFinder import NegaMaxSearch, DEPTH, MAX_DEPTH, CHECKMATE, MATE_BOUND
+from transpositionTable import TranspositionTable
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 4096               #finished results kept
+MAX_TIME_LIMIT = 60.0                   #seconds, longest search a request can ask for
+MAX_BODY = 1 << 20                      #bytes of a request body
+LATENCY_WINDOW = 10000                  #latest requests the percentiles are taken over
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+#----worker process----
+
+_tt = None
+
+
+def _initWorker():
+    global _tt
+    _tt = TranspositionTable()
+
+
+def _ping():
+    return os.getpid()
+
+
+#mate in moves for the side to move (negative: gets mated), None for a normal score
+def mateDistance(score):
+    if score > MATE_BOUND:
+        return (CHECKMATE - score + 1) // 2
+    if score < -MATE_BOUND:
+        return -((CHECKMATE + score) // 2)
+    return None
+
+
+#runs in a worker, returns a plain dict (it goes back through a pipe)
+def analyseFen(fen, depth, timeLimit):
+    gs = chessEngine.GameState(fen)
+    validMoves = gs.getValidMoves()
+    if not validMoves:
+        return {"bestMove": None, "san": None, "score": -CHECKMATE if gs.checkMate else 0,
+                "mate": 0 if gs.checkMate else None, "depth": 0, "pv": [], "nodes": 0, "qNodes": 0,
+                "elapsed": 0.0, "gameOver": "checkmate" if gs.checkMate else "stalemate"}
+    search = NegaMaxSearch(gs, depth, timeLimit=timeLimit, tt=_tt if _tt is not None else TranspositionTable())
+    result = search.search(validMoves)
+    return {"bestMove": result.bestMove.getChessNotation(),
+            "san": gs.getSan(result.bestMove, validMoves),
+            "score": result.score,
+            "mate": mateDistance(result.score),
+            "depth": result.depth,
+            "pv": [move.getChessNotation() for move in result.pv],
+            "nodes": result.nodes,
+            "qNodes": result.qNodes,
+            "elapsed": result.elapsed,
+            "gameOver": None}
+
+
+#----request handling----
+
+#GameState of a request's fen and moves, ValueError for a bad FEN or an illegal move
+def replayRequest(fen, moves):
+    if fen is not None and not isinstance(fen, str):
+        raise ValueError("fen must be a string")
+    try:
+        gs = chessEngine.GameState(fen)
+    except (KeyError, IndexError):                      #unknown piece letters, squares off the board
+        raise ValueError("invalid FEN: %s" % fen)
+    for ply, text in enumerate(moves, 1):
+        if not isinstance(text, str):
+            raise ValueError("move %d is not a string" % ply)
+        validMoves = gs.getValidMoves()
+        move = next((m for m in validMoves if m.getChessNotation() == text), None) or gs.parseSan(text)
+        if move is None:
+            raise ValueError("illegal move %s at ply %d" % (text, ply))
+        gs.makeMove(move)
+    return gs
+
+
+#depth and time limit of a request, the depth defaults to DEPTH unless only a time is given
+def requestLimits(request):
+    depth, timeLimit = request.get("depth"), request.get("time")
+    if timeLimit is not None:
+        if not isinstance(timeLimit, (int, float)) or not 0 < timeLimit <= MAX_TIME_LIMIT:
+            raise ValueError("time must be a number of seconds in (0, %g]" % MAX_TIME_LIMIT)
+        timeLimit = float(timeLimit)
+    if depth is None:
+        depth = MAX_DEPTH if timeLimit is not None else DEPTH
+    elif not isinstance(depth, int) or not 1 <= depth <= MAX_DEPTH:
+        raise ValueError("depth must be an integer in [1, %d]" % MAX_DEPTH)
+    return depth, timeLimit
+
+
+def percentile(sortedValues, fraction):
+    if not sortedValues:
+        return 0.0
+    return sortedValues[min(len(sortedValues) - 1, int(fraction * len(sortedValues)))]
+
+
+class AnalysisService:
+    def __init__(self, workers=None, cacheSize=DEFAULT_CACHE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.cacheSize = cacheSize
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_initWorker)
+        self.slots = asyncio.Semaphore(self.workers)    #searches beyond the worker count wait here
+        self.inFlight = {}                              #key -> future of the running or queued search
+        self.cache = collections.OrderedDict()          #key -> result, least recently used first
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.startTime = time.perf_counter()
+        self.server = None
+        self.requests = 0
+        self.errors = 0
+        self.searches = 0
+        self.coalesced = 0
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        self.queued = 0
+        self.running = 0
+
+    #spawns every worker now instead of on the first requests
+    async def warmUp(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _ping) for _ in range(self.workers)))
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        await self.warmUp()
+        self.server = await asyncio.start_server(self.handleConnection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        self.executor.shutdown(cancel_futures=True)
+
+    #result dict of one analysis request, ValueError for a bad request
+    async def analyse(self, request):
+        start = time.perf_counter()
+        self.requests += 1
+        if not isinstance(request, dict):
+            raise ValueError("request must be a JSON object")
+        moves = request.get("moves", [])
+        if not isinstance(moves, list):
+            raise ValueError("moves must be a list")
+        depth, timeLimit = requestLimits(request)
+        gs = replayRequest(request.get("fen"), moves)
+        fen = gs.getFen()
+        key = (" ".join(fen.split()[:4]), depth, timeLimit)      #move counters do not change the search
+
+        cached = key in self.cache
+        coalesced = False
+        if cached:
+            self.cacheHits += 1
+            self.cache.move_to_end(key)
+            result = self.cache[key]
+        else:
+            self.cacheMisses += 1
+            future = self.inFlight.get(key)
+            if future is None:
+                future = asyncio.ensure_future(self.runSearch(key, fen, depth, timeLimit))
+                self.inFlight[key] = future
+            else:
+                coalesced = True
+                self.coalesced += 1
+            result = await asyncio.shield(future)           #a dropped client does not cancel the others
+        latency = time.perf_counter() - start
+        self.latencies.append(latency)
+        return dict(result, fen=fen, cached=cached, coalesced=coalesced, latency=latency)
+
+    async def runSearch(self, key, fen, depth, timeLimit):
+        try:
+            self.queued += 1
+            async with self.slots:
+                self.queued -= 1
+                self.running += 1
+                self.searches += 1
+                try:
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, analyseFen, fen, depth, timeLimit)
+                finally:
+                    self.running -= 1
+        finally:
+            del self.inFlight[key]
+        self.cache[key] = result
+        if len(self.cache) > self.cacheSize:
+            self.cache.popitem(last=False)
+        return result
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        lookups = self.cacheHits + self.cacheMisses
+        return {"uptime": time.perf_counter() - self.startTime,
+                "workers": self.workers,
+                "requests": self.requests,
+                "errors": self.errors,
+                "searches": self.searches,
+                "coalesced": self.coalesced,
+                "queueDepth": self.queued,
+                "running": self.running,
+                "cacheHits": self.cacheHits,
+                "cacheMisses": self.cacheMisses,
+                "cacheHitRate": self.cacheHits / lookups if lookups else 0.0,
+                "cacheSize": len(self.cache),
+                "latency": {"count": len(latencies),
+                            "p50": percentile(latencies, 0.5),
+                            "p90": percentile(latencies, 0.9),
+                            "p99": percentile(latencies, 0.99),
+                            "max": latencies[-1] if latencies else 0.0}}
+
+    #(status, body dict) of one HTTP request
+    async def route(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if path == "/analyse":
+            if method != "POST":
+                return 405, {"error": "POST a JSON request to /analyse"}
+            try:
+                return 200, await self.analyse(json.loads(body or b"{}"))
+            except ValueError as error:                     #bad JSON, FEN, move or limits
+                self.errors += 1
+                return 400, {"error": str(error)}
+        if path in ("/stats", "/health"):
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.stats() if path == "/stats" else {"status": "ok"}
+        return 404, {"error": "unknown path " + path}
+
+    #HTTP/1.1 with keep-alive, one request at a time per connection
+    async def handleConnection(self, reader, writer):
+        try:
+            while True:
+                request = await readHttpRequest(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if body is None:
+                    status, reply = 413, {"error": "body over %d bytes" % MAX_BODY}
+                else:
+                    status, reply = await self.route(method, path, body)
+                keepAlive = headers.get("connection", "").lower() != "close" and body is not None
+                data = json.dumps(reply).encode()
+                writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                              "Connection: %s\r\n\r\n" % (status, REASONS[status], len(data),
+                                                          "keep-alive" if keepAlive else "close")).encode())
+                writer.write(data)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+#(method, path, headers, body) of the next request, None at the end of the connection
+#body is None when it is over MAX_BODY, ValueError for a request line that is not HTTP
+async def readHttpRequest(reader):
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, path, _ = line.decode("latin-1").split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        return method, path, headers, None
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+#----localhost client and load test----
+
+#(status, reply) of one request to the service, a new connection every time
+async def sendRequest(port, method, path, payload=None, host=DEFAULT_HOST):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        body = json.dumps(payload).encode() if payload is not None else b""
+        writer.write(("%s %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                      "Connection: close\r\n\r\n" % (method, path, host, len(body))).encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await reader.readexactly(length))
+    finally:
+        writer.close()
+
+
+#requests over the benchmark positions, every position asked for more than once
+async def runLoadTest(port, requests, concurrency, depth, timeLimit=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    replies = []
+
+    async def one(i):
+        name, fen = BENCH_POSITIONS[i % len(BENCH_POSITIONS)]
+        payload = {"fen": fen, "depth": depth}
+        if timeLimit is not None:
+            payload["time"] = timeLimit
+        async with semaphore:
+            status, reply = await sendRequest(port, "POST", "/analyse", payload)
+        replies.append((name, status, reply))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    seconds = time.perf_counter() - start
+    _, stats = await sendRequest(port, "GET", "/stats")
+    return replies, stats, seconds
+
+
+async def _serve(args):
+    service = AnalysisService(args.workers, args.cache_size)
+    port = await service.start(args.host, args.port)
+    print("analysis service on http://%s:%d (%d workers)" % (args.host, port, service.workers), flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signalNumber in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signalNumber, stop.set)
+        except (NotImplementedError, RuntimeError):        #no loop signal handlers on Windows
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await service.close()
+
+
+async def _bench(args):
+    service = AnalysisService(args.workers, args.cache_size)
+    port = await service.start(DEFAULT_HOST, 0)
+    try:
+        replies, stats, seconds = await runLoadTest(port, args.requests, args.concurrency, args.depth, args.time)
+    finally:
+        await service.close()
+    for name, status, reply in replies[:len(BENCH_POSITIONS)]:
+        print("%-14s %d  %-6s depth %d score %6d  %s" % (
+            name, status, reply.get("san"), reply.get("depth", 0), reply.get("score", 0),
+            "cached" if reply.get("cached") else "coalesced" if reply.get("coalesced") else "searched"))
+    latency = stats["latency"]
+    print("%d requests in %.2fs (%.1f/s): %d searches, %d coalesced, cache hit rate %.0f%%" % (
+        len(replies), seconds, len(replies) / seconds, stats["searches"], stats["coalesced"],
+        100 * stats["cacheHitRate"]))
+    print("latency p50 %.3fs  p90 %.3fs  p99 %.3fs  max %.3fs" % (
+        latency["p50"], latency["p90"], latency["p99"], latency["max"]))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(stats, file, indent=2)
+    return 0 if all(status == 200 for _, status, _ in replies) else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="asyncio HTTP/JSON position analysis service")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serveParser = commands.add_parser("serve", help="run the service")
+    serveParser.add_argument("--host", default=DEFAULT_HOST, help="address to bind (default %(default)s)")
+    serveParser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    benchParser = commands.add_parser("bench", help="load test against a service on a free localhost port")
+    benchParser.add_argument("--requests", type=int, default=40, help="requests to send (default %(default)s)")
+    benchParser.add_argument("--concurrency", type=int, default=8, help="requests in flight (default %(default)s)")
+    benchParser.add_argument("--depth", type=int, default=3, help="search depth (default %(default)s)")
+    benchParser.add_argument("--time", type=float, help="time limit per search in seconds")
+    benchParser.add_argument("--json", metavar="FILE", help="write the service stats as JSON")
+    for commandParser in (serveParser, benchParser):
+        commandParser.add_argument("--workers", type=int, help="search processes (default: every core)")
+        commandParser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                                   help="results kept in the LRU cache (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
+        except OSError as error:                            #port in use
+            parser.error(str(error))
+        return 0
+    return asyncio.run(_bench(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+vectorised evaluation of many positions at once with NumPy (offline analysis, batched leaves)
+-> boards are encoded as piece planes straight from the bitboards (PIECES order), bit packed as
+   uint8 [N, 12, 8] (96 bytes a position), unpackPlanes gives the dense uint8 [N, 12, 64] form
+-> material, tapered piece-square tables and a mobility proxy for all N boards with lookup tables indexed
+   by 16 (scores) or 8 (attacks) bit chunks of every plane
+-> with mobilityWeight=0 the scores equal GameState.evaluate() (white's point of view, centipawns)
+-> LeafBatch collects positions during a search and scores them in one call
+-> findBestMoveBatch: fixed depth minimax that scores all its leaves in one batch
+-> needs NumPy 2.0 or later (bitwise_count)
+
+usage:
+    python batchEvaluation.py                        #benchmark against SmartMoveFinder.scoreMaterial
+    python batchEvaluation.py --positions 200000 --json batch.json
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+import chessEngine
+import evaluation
+from bitboards import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, RAYS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+from chessEngine import PIECES
+from SmartMoveFinder import CHECKMATE, STALEMATE, DEPTH, scoreMaterial
+
+PLANES = len(PIECES)
+WHITE_PLANES = PLANES // 2              #white pieces come first in PIECES
+MOBILITY_WEIGHT = 2                     #centipawns per attacked square that is not blocked by an own piece
+CHUNK_SIZE = 1 << 16                    #positions encoded at a time by evaluateStates
+
+#the per byte score tables hold three signed sums in one int64: pst + material (mg), the same (eg) and phase
+FIELD_BITS = 21
+FIELD_HALF = 1 << (FIELD_BITS - 1)
+FIELD_MASK = (1 << FIELD_BITS) - 1
+
+_BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder="little")     #[256, 8]
+_scoreTables = None                     #48 tables of 65536 packed sums, one per 16 bit plane chunk, see refreshWeights
+_attackTables = None                    #96 tables of 256 attack bitboards (uint64), one per plane byte
+_materialValues = None                  #[12] material per piece
+
+
+def _sliderAttacks(sq, directions):
+    bb = 0
+    for direction in directions:
+        bb |= RAYS[direction][sq]
+    return bb
+
+
+#empty board attack sets per piece type, sliders see through pieces (x-ray), that is the proxy
+def _pieceAttacks(piece, sq):
+    kind = piece[1]
+    if kind == 'P':
+        return PAWN_ATTACKS[piece[0]][sq]
+    if kind == 'N':
+        return KNIGHT_ATTACKS[sq]
+    if kind == 'K':
+        return KING_ATTACKS[sq]
+    directions = {'R': ROOK_DIRECTIONS, 'B': BISHOP_DIRECTIONS, 'Q': ROOK_DIRECTIONS + BISHOP_DIRECTIONS}[kind]
+    return _sliderAttacks(sq, directions)
+
+
+#rebuilds the lookup tables from evaluation's weights, needed after evaluation.loadWeights
+def refreshWeights():
+    global _scoreTables, _attackTables, _materialValues
+    scoreTables = []
+    attackTables = []
+    for piece in PIECES:
+        #material is added to both tables, the tapering divides it back out exactly
+        mg = np.array(evaluation.MG_TABLES[piece], dtype=np.int64) + evaluation.MATERIAL[piece]
+        eg = np.array(evaluation.EG_TABLES[piece], dtype=np.int64) + evaluation.MATERIAL[piece]
+        packed = mg + (eg << FIELD_BITS) + (evaluation.PHASE[piece] << (2 * FIELD_BITS))
+        attacks = np.array([_pieceAttacks(piece, sq) for sq in range(64)], dtype=np.uint64)
+        byteScores = [_BYTE_BITS @ packed[byte * 8:byte * 8 + 8] for byte in range(8)]
+        for chunk in range(4):                              #little endian: low byte first
+            scoreTables.append((byteScores[2 * chunk + 1][:, None] + byteScores[2 * chunk][None, :]).reshape(-1))
+        for byte in range(8):
+            attackTables.append(np.bitwise_or.reduce(
+                np.where(_BYTE_BITS.astype(bool), attacks[byte * 8:byte * 8 + 8], np.uint64(0)), axis=1))
+    _scoreTables = scoreTables
+    _attackTables = attackTables
+    _materialValues = np.array([evaluation.MATERIAL[piece] for piece in PIECES], dtype=np.int64)
+
+
+#[N, 12] bitboard ints (PIECES order) -> bit packed planes uint8 [N, 12, 8], plane bit sq = row*8 + col
+def encodeBitboards(bitboards):
+    return np.array(bitboards, dtype="<u8").reshape(-1, PLANES).view(np.uint8).reshape(-1, PLANES, 8)
+
+
+def encodeBoards(states):
+    return encodeBitboards([[gs.pieceBitboards[piece] for piece in PIECES] for gs in states])
+
+
+#dense uint8 [N, 12, 64] planes, one byte per square
+def unpackPlanes(packed):
+    return np.unpackbits(packed, axis=2, bitorder="little")
+
+
+def packPlanes(planes):
+    return np.packbits(planes, axis=2, bitorder="little")
+
+
+def _bitboards(packed):
+    return np.ascontiguousarray(packed).reshape(-1, PLANES * 8).view("<u8")        #[N, 12] uint64
+
+
+#contiguous [N, chunks] view of one plane, gathers along a column are much faster than strided ones
+def _planeChunks(boards, plane, dtype, chunks):
+    return np.ascontiguousarray(boards[:, plane]).view(dtype).reshape(-1, chunks)
+
+
+#[N] int64 material from white's point of view, the batched scoreMaterial (in centipawns)
+def materialBatch(packed):
+    if _materialValues is None:
+        refreshWeights()
+    return np.bitwise_count(_bitboards(packed)).astype(np.int64) @ _materialValues
+
+
+#[N, 3] int64 columns: material + middlegame piece-square sum, material + endgame sum, phase
+def evaluationSums(packed):
+    if _scoreTables is None:
+        refreshWeights()
+    boards = _bitboards(packed)
+    total = np.zeros(len(boards), dtype=np.int64)
+    gathered = np.empty(len(boards), dtype=np.int64)
+    for plane in range(PLANES):
+        chunks = _planeChunks(boards, plane, "<u2", 4)
+        for chunk in range(4):
+            np.take(_scoreTables[plane * 4 + chunk], chunks[:, chunk], out=gathered)
+            total += gathered
+    mg = ((total + FIELD_HALF) & FIELD_MASK) - FIELD_HALF
+    total = (total - mg) >> FIELD_BITS
+    eg = ((total + FIELD_HALF) & FIELD_MASK) - FIELD_HALF
+    phase = (total - eg) >> FIELD_BITS
+    return np.stack((mg, eg, phase), axis=1)
+
+
+#[N] int64: squares attacked by white minus squares attacked by black, squares with own pieces excluded
+def mobilityProxy(packed):
+    if _attackTables is None:
+        refreshWeights()
+    boards = _bitboards(packed)
+    gathered = np.empty(len(boards), dtype=np.uint64)
+    counts = []
+    for planes in (range(WHITE_PLANES), range(WHITE_PLANES, PLANES)):
+        attacked = np.zeros(len(boards), dtype=np.uint64)
+        for plane in planes:
+            chunks = _planeChunks(boards, plane, np.uint8, 8)
+            for byte in range(8):
+                np.take(_attackTables[plane * 8 + byte], chunks[:, byte], out=gathered)
+                attacked |= gathered
+        own = np.bitwise_or.reduce(boards[:, planes.start:planes.stop], axis=1)
+        counts.append(np.bitwise_count(attacked & ~own).astype(np.int64))
+    return counts[0] - counts[1]
+
+
+#[N] int64 scores from white's point of view, same tapering as GameState.evaluate
+def evaluateBatch(packed, mobilityWeight=0):
+    if len(packed) == 0:
+        return np.zeros(0, dtype=np.int64)
+    sums = evaluationSums(packed)
+    maxPhase = evaluation.MAX_PHASE
+    phase = np.minimum(sums[:, 2], maxPhase)
+    scores = (sums[:, 0] * phase + sums[:, 1] * (maxPhase - phase)) // maxPhase
+    if mobilityWeight:
+        scores += mobilityWeight * mobilityProxy(packed)
+    return scores
+
+
+#scores any number of GameStates, encoding them CHUNK_SIZE at a time
+def evaluateStates(states, mobilityWeight=0, chunkSize=CHUNK_SIZE):
+    states = list(states)
+    scores = np.zeros(len(states), dtype=np.int64)
+    for start in range(0, len(states), chunkSize):
+        scores[start:start + chunkSize] = evaluateBatch(encodeBoards(states[start:start + chunkSize]), mobilityWeight)
+    return scores
+
+
+class LeafBatch:
+    #positions added during a search, scored together by evaluate()
+    #fixed scores (mates, stalemates) are kept as they are, everything is from white's point of view
+    def __init__(self, mobilityWeight=0):
+        self.mobilityWeight = mobilityWeight
+        self.bitboards = []
+        self.fixed = {}                         #index -> score that replaces the evaluation
+
+    def __len__(self):
+        return len(self.bitboards)
+
+    #index of the position in the batch
+    def add(self, gs, fixedScore=None):
+        boards = gs.pieceBitboards
+        self.bitboards.append([boards[piece] for piece in PIECES])
+        if fixedScore is not None:
+            self.fixed[len(self.bitboards) - 1] = fixedScore
+        return len(self.bitboards) - 1
+
+    def evaluate(self):
+        scores = evaluateBatch(encodeBitboards(self.bitboards), self.mobilityWeight)
+        for index, score in self.fixed.items():
+            scores[index] = score
+        return scores
+
+    def clear(self):
+        self.bitboards = []
+        self.fixed = {}
+
+
+#leaf index, or the list of child nodes of an inner node
+def _collectLeaves(gs, depth, ply, batch):
+    moves = gs.getValidMoves()
+    if not moves:
+        if gs.checkMate:                        #the side to move is mated, faster mates score higher
+            return batch.add(gs, -(CHECKMATE - ply) if gs.whiteToMove else CHECKMATE - ply)
+        return batch.add(gs, STALEMATE)
+    if depth == 0:
+        return batch.add(gs)
+    children = []
+    for move in moves:
+        gs.makeMove(move)
+        children.append(_collectLeaves(gs, depth - 1, ply + 1, batch))
+        gs.undoMove()
+    return children
+
+
+#negamax value of a collected node, sign = 1 when white is to move there
+def _backUp(node, scores, sign):
+    if isinstance(node, int):
+        return sign * int(scores[node])
+    return max(-_backUp(child, scores, -sign) for child in node)
+
+
+#full width minimax to a fixed depth (no alpha beta, every leaf is needed for the batch)
+#returns (best move, score from the side to move's point of view)
+def findBestMoveBatch(gs, validMoves, depth=DEPTH, mobilityWeight=0):
+    batch = LeafBatch(mobilityWeight)
+    children = []
+    for move in validMoves:
+        gs.makeMove(move)
+        children.append(_collectLeaves(gs, depth - 1, 1, batch))
+        gs.undoMove()
+    if not children:
+        return None, 0
+    scores = batch.evaluate()
+    sign = 1 if gs.whiteToMove else -1
+    bestMove, bestScore = None, -CHECKMATE - 1
+    for move, child in zip(validMoves, children):
+        score = -_backUp(child, scores, -sign)
+        if score > bestScore:
+            bestMove, bestScore = move, score
+    return bestMove, bestScore
+
+
+#positions from random playouts, copied so they stay valid
+def randomPositions(count, seed=0, maxPlies=80):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        gs = chessEngine.GameState()
+        for _ in range(rng.randint(1, maxPlies)):
+            moves = gs.getValidMoves()
+            if not moves:
+                break
+            gs.makeMove(rng.choice(moves))
+            positions.append(chessEngine.GameState(gs.getFen()))
+            if len(positions) == count:
+                break
+    return positions
+
+
+#positions per second of the best of a few runs, and the result
+def _rate(count, function, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return count / max(best, 1e-9), result
+
+
+def runBenchmark(count, seed=0, report=None):
+    states = randomPositions(count, seed)
+    boards = [gs.board for gs in states]
+    refreshWeights()
+
+    results = {"positions": count}
+    results["scoreMaterial"], _ = _rate(count, lambda: [scoreMaterial(board) for board in boards])
+    results["computeEvaluation"], _ = _rate(count, lambda: [gs.computeEvaluation() for gs in states])
+    results["encode"], packed = _rate(count, lambda: encodeBoards(states))
+    results["materialBatch"], _ = _rate(count, lambda: materialBatch(packed))
+    results["evaluateBatch"], scores = _rate(count, lambda: evaluateBatch(packed))
+    results["evaluateBatchMobility"], _ = _rate(count, lambda: evaluateBatch(packed, MOBILITY_WEIGHT))
+    results["unpackPlanes"], _ = _rate(count, lambda: unpackPlanes(packed))
+    results["speedupMaterial"] = results["materialBatch"] / results["scoreMaterial"]
+    results["speedupEvaluation"] = results["evaluateBatch"] / results["scoreMaterial"]
+    results["speedupOverComputeEvaluation"] = results["evaluateBatch"] / results["computeEvaluation"]
+    results["mismatches"] = sum(1 for gs, score in zip(states, scores) if gs.evaluate() != score)
+    results["materialMismatches"] = sum(1 for gs, material in zip(states, materialBatch(packed))
+                                        if gs.material != material)
+    if report is not None:
+        report(results)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the batched NumPy evaluation against scoreMaterial")
+    parser.add_argument("--positions", type=int, default=50000, help="random positions (default %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="playout seed (default %(default)s)")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    def report(results):
+        print("%d positions" % results["positions"])
+        for key in ("scoreMaterial", "computeEvaluation", "encode", "materialBatch", "evaluateBatch",
+                    "evaluateBatchMobility", "unpackPlanes"):
+            print("%-22s %12.0f positions/s" % (key, results[key]))
+        print("speedup over scoreMaterial: material %.0fx, full evaluation %.0fx (%.0fx over computeEvaluation)" % (
+            results["speedupMaterial"], results["speedupEvaluation"], results["speedupOverComputeEvaluation"]))
+        print("%d evaluation and %d material mismatches with GameState" % (
+            results["mismatches"], results["materialMismatches"]))
+
+    results = runBenchmark(args.positions, args.seed, report)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(dict(results, time=time.strftime("%Y-%m-%dT%H:%M:%S"), python=platform.python_version(),
+                           numpy=np.__version__), file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+bitboard helpers for the engine
+-> one 64 bit int per piece type and colour
+-> bit index = row*8 + col (row 0 is rank 8, same as GameState.board)
+-> precomputed knight/king/pawn attack tables
+-> sliding piece attacks from ray tables (cached per occupancy)
+"""
+
+FULL = (1 << 64) - 1
+EMPTY = 0
+
+NORTH, SOUTH, WEST, EAST = (-1, 0), (1, 0), (0, -1), (0, 1)
+NORTH_WEST, NORTH_EAST, SOUTH_WEST, SOUTH_EAST = (-1, -1), (-1, 1), (1, -1), (1, 1)
+ROOK_DIRECTIONS = (NORTH, WEST, SOUTH, EAST)
+BISHOP_DIRECTIONS = (NORTH_WEST, NORTH_EAST, SOUTH_WEST, SOUTH_EAST)
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def square(row, col):
+    return row * 8 + col
+
+
+def bit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def lsb(bb):
+    #index of the lowest set bit
+    return (bb & -bb).bit_length() - 1
+
+
+def msb(bb):
+    #index of the highest set bit
+    return bb.bit_length() - 1
+
+
+def popCount(bb):
+    return bin(bb).count("1")
+
+
+def squares(bb):
+    #yields the index of every set bit, lowest first
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _onBoard(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _stepAttacks(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for dRow, dCol in offsets:
+            if _onBoard(row + dRow, col + dCol):
+                bb |= bit(row + dRow, col + dCol)
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _stepAttacks(KNIGHT_OFFSETS)
+KING_ATTACKS = _stepAttacks(KING_OFFSETS)
+PAWN_ATTACKS = {'w': _stepAttacks((NORTH_WEST, NORTH_EAST)),        #squares a white pawn on sq attacks
+                'b': _stepAttacks((SOUTH_WEST, SOUTH_EAST))}
+
+
+def _ray(sq, direction):
+    row, col = divmod(sq, 8)
+    bb = 0
+    row, col = row + direction[0], col + direction[1]
+    while _onBoard(row, col):
+        bb |= bit(row, col)
+        row, col = row + direction[0], col + direction[1]
+    return bb
+
+
+#RAYS[direction][sq] = every square from sq (exclusive) to the edge
+RAYS = {d: [_ray(sq, d) for sq in range(64)] for d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+#directions that walk towards higher bit indexes find their first blocker with lsb, the others with msb
+POSITIVE_DIRECTIONS = (SOUTH, EAST, SOUTH_WEST, SOUTH_EAST)
+
+
+def slidingAttacks(sq, occupied, directions):
+    #attacks of a slider on sq, stopping at (and including) the first blocker in each direction
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            blocker = lsb(blockers) if d in POSITIVE_DIRECTIONS else msb(blockers)
+            ray ^= RAYS[d][blocker]
+        attacks |= ray
+    return attacks
+
+
+def _relevantMask(sq, directions):
+    #squares whose occupancy can change the attack set (edges never matter)
+    mask = 0
+    row, col = divmod(sq, 8)
+    for dRow, dCol in directions:
+        r, c = row + dRow, col + dCol
+        while _onBoard(r + dRow, c + dCol):
+            mask |= bit(r, c)
+            r, c = r + dRow, c + dCol
+    return mask
+
+
+ROOK_MASKS = [_relevantMask(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS = [_relevantMask(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+#attack sets are filled in lazily, keyed by the relevant occupancy of the square
+_rookTables = [{} for _ in range(64)]
+_bishopTables = [{} for _ in range(64)]
+
+
+def rookAttacks(sq, occupied):
+    key = occupied & ROOK_MASKS[sq]
+    table = _rookTables[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = slidingAttacks(sq, key, ROOK_DIRECTIONS)
+    return attacks
+
+
+def bishopAttacks(sq, occupied):
+    key = occupied & BISHOP_MASKS[sq]
+    table = _bishopTables[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = slidingAttacks(sq, key, BISHOP_DIRECTIONS)
+    return attacks
+
+
+def queenAttacks(sq, occupied):
+    return rookAttacks(sq, occupied) | bishopAttacks(sq, occupied)
+
+
+def _betweenTable():
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            targets = list(squares(RAYS[direction][sq]))
+            if direction not in POSITIVE_DIRECTIONS:
+                targets.reverse()                               #walk outward from sq
+            between = 0
+            for target in targets:
+                table[sq][target] = between
+                between |= 1 << target
+    return table
+
+
+#BETWEEN[a][b] = squares strictly between a and b when they share a line, else 0
+BETWEEN = _betweenTable()
@@ -1,14 +1,71 @@
 """
 -> stores all info of current state
--> checks for valid moves
+-> checks for valid moves, all at once (getValidMoves) or in stages for the search (stagedMoves)
 -> keeps move log
+-> board is kept as bitboards, with an 8x8 board view for drawing
+-> keeps an incremental zobrist key of the position
+-> keeps an incremental evaluation (material, piece-square tables, game phase)
+-> keeps what a move cannot give back (castling rights mask, en passant square, captured piece, halfmove clock,
+   zobrist key) in a preallocated undo stack, one flat record per made move
 """
-import numpy as np
+import random
+import re
+
+import evaluation
+from evaluation import MATERIAL, MG_TABLES, EG_TABLES, PHASE
+
+from bitboards import (FULL, BETWEEN, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, rookAttacks, bishopAttacks,
+                       squares, popCount)
+
+PIECES = ("wP", "wR", "wN", "wB", "wQ", "wK", "bP", "bR", "bN", "bB", "bQ", "bK")
+newMove = object.__new__
+
+#zobrist keys, fixed seed so every process hashes positions the same way
+_zobristRandom = random.Random(20240601)
+ZOBRIST_PIECES = {piece: [_zobristRandom.getrandbits(64) for _ in range(64)] for piece in PIECES}
+ZOBRIST_BLACK_TO_MOVE = _zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [_zobristRandom.getrandbits(64) for _ in range(4)]               #wks, bks, wqs, bqs
+ZOBRIST_EN_PASSANT = [_zobristRandom.getrandbits(64) for _ in range(8)]            #one per file
+#key of every combination of castling rights, index = wks | bks << 1 | wqs << 2 | bqs << 3
+ZOBRIST_CASTLING_COMBINED = [0] * 16
+for _rights in range(16):
+    for _i in range(4):
+        if _rights & (1 << _i):
+            ZOBRIST_CASTLING_COMBINED[_rights] ^= ZOBRIST_CASTLING[_i]
+
+
+#castling rights are kept as a 4 bit mask in the same order
+WHITE_KINGSIDE, BLACK_KINGSIDE, WHITE_QUEENSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+#rights kept by a move that starts or ends on a square, king and rook home squares take theirs away
+CASTLING_KEPT = [ALL_CASTLING] * 64
+CASTLING_KEPT[60] ^= WHITE_KINGSIDE | WHITE_QUEENSIDE                              #e1
+CASTLING_KEPT[63] ^= WHITE_KINGSIDE                                                #h1
+CASTLING_KEPT[56] ^= WHITE_QUEENSIDE                                               #a1
+CASTLING_KEPT[4] ^= BLACK_KINGSIDE | BLACK_QUEENSIDE                               #e8
+CASTLING_KEPT[7] ^= BLACK_KINGSIDE                                                 #h8
+CASTLING_KEPT[0] ^= BLACK_QUEENSIDE                                                #a8
+#(row, col) of every square, shared so king and en passant squares need no new tuples
+SQUARE_COORDS = [(sq >> 3, sq & 7) for sq in range(64)]
+
+#undo stack: one record of UNDO_RECORD slots per made move, written in place by makeMove/makeNullMove
+#slots: castling rights mask, en passant square, captured piece, halfmove clock, zobrist key (all before the move)
+UNDO_RECORD = 5
+UNDO_STACK_PLIES = 256                  #preallocated, doubled when a game gets longer
+
+
+def enPassantKey(enPassantPossible):
+    return ZOBRIST_EN_PASSANT[enPassantPossible[1]] if enPassantPossible else 0
+
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+#piece, from file, from rank, target, promotion of a SAN move (check marks and annotations stripped)
+SAN_PATTERN = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?")
 
 class GameState:
-    def __init__(self):
-        self.board = np.array([
-            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],       #8x8 board
+    def __init__(self, fen=None):
+        self.board = [
+            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],       #8x8 board view
             ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],       #1st character color = b,w
             ["--", "--", "--", "--", "--", "--", "--", "--"],       #2nd character piece = P,R,N,B,Q,K
             ["--", "--", "--", "--", "--", "--", "--", "--"],       #empty space = --
@@ -16,7 +73,17 @@ class GameState:
             ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
-        ])
+        ]
+        #bitboards, bit = row*8 + col
+        self.pieceBitboards = {piece: 0 for piece in PIECES}          #one per piece type and colour
+        self.colorBitboards = {'w': 0, 'b': 0}                        #occupancy per colour
+        self.occupied = 0                                             #occupancy of both colours
+        self.zobristKey = 0                                           #updated by putPiece/clearSquare and makeMove
+        self.resetEvaluation()
+        for row in range(8):
+            for col in range(8):
+                if self.board[row][col] != "--":
+                    self.putPiece(row, col, self.board[row][col])
 
         self.moveFunctions = {'P': self.getPawnMoves,                #dictonary for the pieces
                               'R': self.getRookMoves,
@@ -31,134 +98,312 @@ class GameState:
         self.checkMate = False
         self.staleMate = False
         self.enPassantPossible = ()             #cords of square
-        self.currentCastlingRight = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks,
-                                             self.currentCastlingRight.bks,
-                                             self.currentCastlingRight.wqs,
-                                             self.currentCastlingRight.bqs)]
+        self.castlingRights = ALL_CASTLING      #mask of WHITE_KINGSIDE, BLACK_KINGSIDE, ...
+        self.halfmoveClock = 0                  #plies since the last capture or pawn move (fifty move rule)
+        self.fullmoveNumber = 1                 #starts at 1, goes up after every black move
+        self.undoStack = [None] * (UNDO_RECORD * UNDO_STACK_PLIES)     #record of move i at i*UNDO_RECORD
+        self.zobristKey = self.computeZobristKey()
+        if fen is not None:
+            self.loadFen(fen)
+
+    #sets up the position of a FEN string (placement, side to move, castling rights, en passant square,
+    #move counters), the counters may be left out as in EPD
+    def loadFen(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("invalid FEN (needs at least 4 fields): " + fen)
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError("invalid FEN (needs 8 ranks): " + fen)
+
+        self.board = [["--"] * 8 for _ in range(8)]
+        self.pieceBitboards = {piece: 0 for piece in PIECES}
+        self.colorBitboards = {'w': 0, 'b': 0}
+        self.occupied = 0
+        self.resetEvaluation()
+        for row, rowText in enumerate(rows):
+            col = 0
+            for char in rowText:
+                if char.isdigit():
+                    col += int(char)
+                elif char.upper() in "PRNBQK" and col < 8:
+                    piece = ('w' if char.isupper() else 'b') + char.upper()
+                    self.putPiece(row, col, piece)
+                    if piece == 'wK':
+                        self.whiteKingLocation = (row, col)
+                    elif piece == 'bK':
+                        self.blackKingLocation = (row, col)
+                    col += 1
+                else:
+                    raise ValueError("invalid FEN (bad piece placement): " + fen)
+            if col != 8:
+                raise ValueError("invalid FEN (rank without 8 squares): " + fen)
+        if popCount(self.pieceBitboards['wK']) != 1 or popCount(self.pieceBitboards['bK']) != 1:
+            raise ValueError("invalid FEN (needs one king per side): " + fen)
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError("invalid FEN (side to move): " + fen)
+        self.whiteToMove = fields[1] == "w"
+        castling = fields[2]
+        if castling != "-" and (not castling or set(castling) - set("KQkq")):
+            raise ValueError("invalid FEN (castling rights): " + fen)
+        self.castlingRights = ((WHITE_KINGSIDE if 'K' in castling else 0) | (BLACK_KINGSIDE if 'k' in castling else 0)
+                               | (WHITE_QUEENSIDE if 'Q' in castling else 0)
+                               | (BLACK_QUEENSIDE if 'q' in castling else 0))
+        if fields[3] == "-":
+            self.enPassantPossible = ()
+        elif len(fields[3]) == 2 and fields[3][0] in Move.filesToCols and fields[3][1] in ("3", "6"):
+            self.enPassantPossible = SQUARE_COORDS[Move.ranksToRows[fields[3][1]] * 8 + Move.filesToCols[fields[3][0]]]
+        else:
+            raise ValueError("invalid FEN (en passant square): " + fen)
+        try:
+            self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            self.fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("invalid FEN (move counters): " + fen)
+        if self.halfmoveClock < 0 or self.fullmoveNumber < 1:
+            raise ValueError("invalid FEN (move counters): " + fen)
+
+        self.moveLog = []
+        self.checkMate = False
+        self.staleMate = False
+        self.zobristKey = self.computeZobristKey()
+
+    #FEN string of the current position
+    def getFen(self):
+        rows = []
+        for row in self.board:
+            text = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += piece[1] if piece[0] == 'w' else piece[1].lower()
+            rows.append(text + (str(empty) if empty else ""))
+        rights = self.castlingRights
+        castling = ("K" if rights & WHITE_KINGSIDE else "") + ("Q" if rights & WHITE_QUEENSIDE else "") + \
+                   ("k" if rights & BLACK_KINGSIDE else "") + ("q" if rights & BLACK_QUEENSIDE else "")
+        if self.enPassantPossible:
+            enPassant = Move.colsToFiles[self.enPassantPossible[1]] + Move.rowsToRanks[self.enPassantPossible[0]]
+        else:
+            enPassant = "-"
+        return " ".join(("/".join(rows), "w" if self.whiteToMove else "b", castling or "-", enPassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)))
+
+    #full zobrist key from scratch: pieces, side to move, castling rights and en passant file
+    def computeZobristKey(self):
+        key = 0
+        for piece in PIECES:
+            for sq in squares(self.pieceBitboards[piece]):
+                key ^= ZOBRIST_PIECES[piece][sq]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ ZOBRIST_CASTLING_COMBINED[self.castlingRights] ^ enPassantKey(self.enPassantPossible)
+
+    #running evaluation sums, white minus black, kept up to date by putPiece/clearSquare
+    def resetEvaluation(self):
+        self.material = 0
+        self.mgScore = 0                #middlegame piece-square sum
+        self.egScore = 0                #endgame piece-square sum
+        self.phase = 0                  #MAX_PHASE with all pieces on the board, 0 with only pawns and kings
+
+    #evaluation sums from scratch (after evaluation.loadWeights or to check the incremental ones)
+    def computeEvaluation(self):
+        self.resetEvaluation()
+        for piece in PIECES:
+            for sq in squares(self.pieceBitboards[piece]):
+                self.material += MATERIAL[piece]
+                self.mgScore += MG_TABLES[piece][sq]
+                self.egScore += EG_TABLES[piece][sq]
+                self.phase += PHASE[piece]
+        return self.material, self.mgScore, self.egScore, self.phase
+
+    #static evaluation in centipawns from white's point of view, tapered between middlegame and endgame
+    def evaluate(self):
+        maxPhase = evaluation.MAX_PHASE
+        phase = self.phase if self.phase < maxPhase else maxPhase
+        return self.material + (self.mgScore * phase + self.egScore * (maxPhase - phase)) // maxPhase
+
+    #places a piece on an empty square, keeps bitboards and board view in sync
+    def putPiece(self, row, col, piece):
+        sq = row * 8 + col
+        b = 1 << sq
+        self.board[row][col] = piece
+        self.pieceBitboards[piece] |= b
+        self.colorBitboards[piece[0]] |= b
+        self.occupied |= b
+        self.zobristKey ^= ZOBRIST_PIECES[piece][sq]
+        self.material += MATERIAL[piece]
+        self.mgScore += MG_TABLES[piece][sq]
+        self.egScore += EG_TABLES[piece][sq]
+        self.phase += PHASE[piece]
+
+    #empties a square and returns the piece that was on it
+    def clearSquare(self, row, col):
+        piece = self.board[row][col]
+        if piece != "--":
+            sq = row * 8 + col
+            b = 1 << sq
+            self.board[row][col] = "--"
+            self.pieceBitboards[piece] ^= b
+            self.colorBitboards[piece[0]] ^= b
+            self.occupied ^= b
+            self.zobristKey ^= ZOBRIST_PIECES[piece][sq]
+            self.material -= MATERIAL[piece]
+            self.mgScore -= MG_TABLES[piece][sq]
+            self.egScore -= EG_TABLES[piece][sq]
+            self.phase -= PHASE[piece]
+        return piece
 
     #takes a move as a parameter and execute
-    #DO NOT WORK --> castling
+    #the state a move cannot give back (castling rights, en passant square, captured piece, halfmove clock,
+    #zobrist key) goes into the move's undo record, no objects are made per move
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        code = move.code
+        start, end = code & 63, (code >> 6) & 63
+        startRow, startCol = start >> 3, start & 7
+        endRow, endCol = end >> 3, end & 7
+        flag = (code >> 14) & 3
+        pieceMoved = PIECE_NAMES[(code >> 16) & 15]
+
+        stack = self.undoStack
+        top = len(self.moveLog) * UNDO_RECORD
+        if top == len(stack):
+            stack.extend([None] * len(stack))
+        stack[top] = self.castlingRights
+        stack[top + 1] = self.enPassantPossible
+        stack[top + 3] = self.halfmoveClock
+        stack[top + 4] = self.zobristKey
+
+        self.clearSquare(startRow, startCol)
+        captured = self.clearSquare(endRow, endCol)                         #captured piece (if any)
         self.moveLog.append(move)                               #log of moves
+        if not self.whiteToMove:
+            self.fullmoveNumber += 1
         self.whiteToMove = not self.whiteToMove                 #player swap turn
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE
         #update king location
-        if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
+        if pieceMoved == 'wK':
+            self.whiteKingLocation = SQUARE_COORDS[end]
+        elif pieceMoved == 'bK':
+            self.blackKingLocation = SQUARE_COORDS[end]
 
         #pawn promotion
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
+        if flag == PROMOTION:
+            self.putPiece(endRow, endCol, pieceMoved[0] + PROMOTION_PIECES[(code >> 12) & 3])
+        else:
+            self.putPiece(endRow, endCol, pieceMoved)
 
         #enpassant move
-        if move.isEnPassantMove:
-            self.board[move.startRow][move.endCol] = "--"
+        if flag == EN_PASSANT:
+            captured = self.clearSquare(startRow, endCol)
+        stack[top + 2] = captured
+        if pieceMoved[1] == 'P' or captured != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
         #2 square enpassant
-        if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2:
-            self.enPassantPossible = ((move.startRow + move.endRow)//2, move.startCol)
+        if self.enPassantPossible:
+            self.zobristKey ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+        if pieceMoved[1] == 'P' and abs(start - end) == 16:
+            self.enPassantPossible = SQUARE_COORDS[(start + end) >> 1]
+            self.zobristKey ^= ZOBRIST_EN_PASSANT[startCol]
         else:
             self.enPassantPossible = ()
 
         #castle move
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2:                                                       #kingside castle
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1]        #moves rook
-                self.board[move.endRow][move.endCol+1] = "--"                                          #erase old rook
-            else:                                                                                      #queenside castle
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2]        #moves rook
-                self.board[move.endRow][move.endCol-2] = "--"                                          #erase old rook
-
-
+        if flag == CASTLING:
+            if endCol - startCol == 2:                                                             #kingside castle
+                self.putPiece(endRow, endCol-1, self.clearSquare(endRow, endCol+1))                #moves rook
+            else:                                                                                  #queenside castle
+                self.putPiece(endRow, endCol+1, self.clearSquare(endRow, endCol-2))                #moves rook
 
         #update castling rights
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                                  self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
-
-    #undo last move
+        rights = self.castlingRights
+        if rights:
+            kept = rights & CASTLING_KEPT[start] & CASTLING_KEPT[end]
+            if kept != rights:
+                self.zobristKey ^= ZOBRIST_CASTLING_COMBINED[rights ^ kept]
+                self.castlingRights = kept
+
+    #null move ("pass") for null move pruning in the search: the other side moves next, no en passant square
+    #logged as None so undoMove (and the search unwinding an aborted iteration) takes it back like a move
+    def makeNullMove(self):
+        stack = self.undoStack
+        top = len(self.moveLog) * UNDO_RECORD
+        if top == len(stack):
+            stack.extend([None] * len(stack))
+        stack[top] = self.castlingRights
+        stack[top + 1] = self.enPassantPossible
+        stack[top + 2] = "--"
+        stack[top + 3] = self.halfmoveClock
+        stack[top + 4] = self.zobristKey
+        self.moveLog.append(None)
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE ^ enPassantKey(self.enPassantPossible)
+        self.enPassantPossible = ()
+
+    def undoNullMove(self):
+        self.moveLog.pop()
+        top = len(self.moveLog) * UNDO_RECORD
+        self.whiteToMove = not self.whiteToMove
+        self.enPassantPossible = self.undoStack[top + 1]
+        self.zobristKey = self.undoStack[top + 4]
+
+    #undo last move, the irreversible state comes back from its undo record
     def undoMove(self):
-        if len(self.moveLog) != 0:
+        if self.moveLog and self.moveLog[-1] is None:
+            self.undoNullMove()
+        elif len(self.moveLog) != 0:
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            stack = self.undoStack
+            top = len(self.moveLog) * UNDO_RECORD
+            code = move.code
+            start, end = code & 63, (code >> 6) & 63
+            startRow, startCol = start >> 3, start & 7
+            endRow, endCol = end >> 3, end & 7
+            flag = (code >> 14) & 3
+            pieceMoved = PIECE_NAMES[(code >> 16) & 15]
+            pieceCaptured = stack[top + 2]
+
+            self.clearSquare(endRow, endCol)                                    #moved (or promoted) piece
+            self.putPiece(startRow, startCol, pieceMoved)
+            if pieceCaptured != "--":
+                if flag == EN_PASSANT:
+                    self.putPiece(startRow, endCol, pieceCaptured)              #landing square stays blank
+                else:
+                    self.putPiece(endRow, endCol, pieceCaptured)
             self.whiteToMove = not self.whiteToMove
+            if not self.whiteToMove:
+                self.fullmoveNumber -= 1
             # update king position
-            if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.startRow, move.startCol)
-
-            #undo Enpassant
-            if move.isEnPassantMove:
-                self.board[move.endRow][move.endCol] = "--"                         #leave the landing square blank
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enPassantPossible = (move.endRow, move.endCol)
-            #undo 2 square enpassant
-            if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2:
-                self.enPassantPossible = ()
-
-            #undo castle rights
-            self.castleRightsLog.pop()
-            self.currentCastlingRight = self.castleRightsLog[-1]
+            if pieceMoved == 'wK':
+                self.whiteKingLocation = SQUARE_COORDS[start]
+            elif pieceMoved == 'bK':
+                self.blackKingLocation = SQUARE_COORDS[start]
 
             #undo castle move
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2:                                                    #kingside castle
-                    self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1]
-                    self.board[move.endRow][move.endCol-1] = "--"
-                else:                                                                                   #queenside castle
-                    self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1]
-                    self.board[move.endRow][move.endCol+1] = "--"
-
+            if flag == CASTLING:
+                if endCol - startCol == 2:                                                          #kingside castle
+                    self.putPiece(endRow, endCol+1, self.clearSquare(endRow, endCol-1))
+                else:                                                                               #queenside castle
+                    self.putPiece(endRow, endCol-2, self.clearSquare(endRow, endCol+1))
+
+            self.castlingRights = stack[top]
+            self.enPassantPossible = stack[top + 1]
+            self.halfmoveClock = stack[top + 3]
+            self.zobristKey = stack[top + 4]                #the piece updates above only touched a stale key
             self.checkMate = False
             self.staleMate = False
 
 
-    # update castling rights
-    def updateCastleRights(self,move):
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRight.wks = False
-            self.currentCastlingRight.wqs = False
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRight.bks = False
-            self.currentCastlingRight.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0:                          #left rook
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7:                        #right rook
-                    self.currentCastlingRight.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0:                          #left rook
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7:                        #right rook
-                    self.currentCastlingRight.bks = False
-
-
     #all moves considering checks
     def getValidMoves(self):
-        tempEnpassantPossible = self.enPassantPossible
-        tempCastleRight = CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                       self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)
-        moves = self.getAllPossibleMoves()                   #genarates all possible moves
-
-        if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0],self.whiteKingLocation[1],moves)
-        else:
-            self.getCastleMoves(self.blackKingLocation[0],self.blackKingLocation[1],moves)
-
-        for i in range(len(moves) - 1, -1, -1):
-            self.makeMove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                moves.remove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+        moves = self.generateLegalMoves(FULL)
 
         if len(moves) == 0:                 #checkmate or stalemate
             if self.inCheck():
@@ -169,10 +414,254 @@ class GameState:
             self.checkMate = False
             self.staleMate = False
 
-        self.enPassantPossible = tempEnpassantPossible
-        self.currentCastlingRight = tempCastleRight
         return moves
 
+    #legal captures and promotions only, for the quiescence search (checkmate/stalemate flags untouched)
+    def getCaptureMoves(self):
+        if self.whiteToMove:
+            promotionRank = 0xFF                                #row 0
+            targets = self.colorBitboards['b']
+        else:
+            promotionRank = 0xFF << 56                          #row 7
+            targets = self.colorBitboards['w']
+        return self.generateLegalMoves(targets, targets | promotionRank, withCastles=False)
+
+    #legal quiet moves and castles, the moves getCaptureMoves leaves out
+    def getQuietMoves(self):
+        empty = ~self.occupied & FULL
+        promotionRank = 0xFF if self.whiteToMove else 0xFF << 56
+        moves = self.generateLegalMoves(empty, empty & ~promotionRank)
+        if self.enPassantPossible:                                      #en passant comes with every generation
+            moves = [move for move in moves if (move.code >> 14) & 3 != EN_PASSANT]
+        return moves
+
+    #legal moves for the search one stage at a time: the hash move, captures and promotions, killer moves,
+    #then the quiet moves; a stage is only generated once the moves before it are used up (no cutoff yet)
+    #captureKey/quietKey sort a stage, best first; stageCounts counts [nodes, capture stages, quiet stages]
+    def stagedMoves(self, hashMove=None, killers=(), captureKey=None, quietKey=None, stageCounts=None):
+        if stageCounts is not None:
+            stageCounts[0] += 1
+        tried = []                                                      #hash and killer moves already given out
+        if hashMove is not None and self.isLegalMove(hashMove):
+            tried.append(hashMove.code & MOVE_MASK)
+            yield hashMove
+
+        moves = self.getCaptureMoves()
+        if stageCounts is not None:
+            stageCounts[1] += 1
+        if captureKey is not None:
+            moves.sort(key=captureKey, reverse=True)
+        for move in moves:
+            if move.code & MOVE_MASK not in tried:
+                yield move
+
+        for killer in killers:                                          #quiet ones, the rest came with the captures
+            if killer is not None and (killer.code >> 20) & 15 == EMPTY_INDEX and \
+                    (killer.code >> 14) & 3 != PROMOTION and killer.code & MOVE_MASK not in tried and \
+                    self.isLegalMove(killer):
+                tried.append(killer.code & MOVE_MASK)
+                yield killer
+
+        moves = self.getQuietMoves()
+        if stageCounts is not None:
+            stageCounts[2] += 1
+        if quietKey is not None:
+            moves.sort(key=quietKey, reverse=True)
+        for move in moves:
+            if move.code & MOVE_MASK not in tried:
+                yield move
+
+    #whether a move from another position (hash or killer move) is legal here, checked on its own:
+    #the pieces must match the board, the piece must reach the square, and the king must stay safe
+    def isLegalMove(self, move):
+        code = move.code
+        start, end = code & 63, (code >> 6) & 63
+        flag = (code >> 14) & 3
+        pieceMoved = PIECE_NAMES[(code >> 16) & 15]
+        if pieceMoved[0] != ('w' if self.whiteToMove else 'b') or self.board[start >> 3][start & 7] != pieceMoved:
+            return False
+        if flag == CASTLING or flag == EN_PASSANT:                      #rare, generate them
+            return any(other.code == code for other in self.generateLegalMoves(0, 0, flag == CASTLING))
+        if self.board[end >> 3][end & 7] != PIECE_NAMES[(code >> 20) & 15]:
+            return False
+        endBit = 1 << end
+        piece = pieceMoved[1]
+        if piece == 'K':
+            return bool(KING_ATTACKS[start] & endBit) and \
+                not self.attackersTo(end, 'b' if self.whiteToMove else 'w', self.occupied ^ (1 << start))
+        if piece == 'P':
+            pawnMoves = []
+            self.getPawnMoves(start >> 3, start & 7, pawnMoves, endBit)
+            if not any(other.code == code for other in pawnMoves):
+                return False
+        elif not self.pieceAttacks(piece, start) & endBit:
+            return False
+        checkers, pins = self.checkForPinsAndChecks()
+        if checkers:
+            if checkers & (checkers - 1):                               #double check, only the king can move
+                return False
+            kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+            if not (BETWEEN[kingRow * 8 + kingCol][checkers.bit_length() - 1] | checkers) & endBit:
+                return False
+        return bool(pins.get(start, FULL) & endBit)
+
+    #standard algebraic notation of a legal move in the current position (Nbd7, exd5, e8=Q+, O-O#)
+    #checkSuffix=False leaves out + and # (for callers that make the move anyway, see checkSuffix)
+    def getSan(self, move, validMoves=None, checkSuffix=True):
+        if move.isCastleMove:
+            san = "O-O" if move.endCol > move.startCol else "O-O-O"
+        else:
+            piece = move.pieceMoved[1]
+            target = move.getRankFile(move.endRow, move.endCol)
+            capture = "x" if move.pieceCaptured != "--" else ""
+            if piece == 'P':
+                san = (Move.colsToFiles[move.startCol] + capture if capture else "") + target
+                if move.isPawnPromotion:
+                    san += "=" + move.promotionChoice
+            else:
+                endSq = move.endRow * 8 + move.endCol
+                rivals = []
+                if self.pieceBitboards[move.pieceMoved] & self.pieceAttacks(piece, endSq) & ~(
+                        1 << (move.startRow * 8 + move.startCol)):
+                    if validMoves is None:              #only moves to the same square can be rivals
+                        validMoves = self.generateLegalMoves(1 << endSq, 0, withCastles=False)
+                    rivals = [other for other in validMoves if other.pieceMoved == move.pieceMoved and
+                              other.endRow == move.endRow and other.endCol == move.endCol and other != move]
+                disambiguation = ""
+                if rivals:
+                    if all(other.startCol != move.startCol for other in rivals):
+                        disambiguation = Move.colsToFiles[move.startCol]
+                    elif all(other.startRow != move.startRow for other in rivals):
+                        disambiguation = Move.rowsToRanks[move.startRow]
+                    else:
+                        disambiguation = move.getRankFile(move.startRow, move.startCol)
+                san = piece + disambiguation + capture + target
+        if checkSuffix:
+            self.makeMove(move)
+            san += self.checkSuffix()
+            self.undoMove()
+        return san
+
+    #"+" or "#" when the side to move is in check (mated), "" otherwise
+    def checkSuffix(self):
+        if not self.inCheck():
+            return ""
+        return "#" if not self.generateLegalMoves(FULL) else "+"
+
+    #squares a piece of this kind (R, N, B, Q, K) on sq attacks
+    def pieceAttacks(self, piece, sq):
+        if piece == 'N':
+            return KNIGHT_ATTACKS[sq]
+        if piece == 'K':
+            return KING_ATTACKS[sq]
+        attacks = 0
+        if piece in "RQ":
+            attacks |= rookAttacks(sq, self.occupied)
+        if piece in "BQ":
+            attacks |= bishopAttacks(sq, self.occupied)
+        return attacks
+
+    #legal move of a SAN string (also 0-0 castles, e8Q and trailing +#!?), None if illegal or ambiguous
+    def parseSan(self, san):
+        san = san.rstrip("+#!?")
+        if san in ("O-O", "O-O-O", "0-0", "0-0-0"):
+            long = len(san) == 5
+            return next((move for move in self.generateLegalMoves(0, 0) if move.isCastleMove and
+                         (move.endCol < move.startCol) == long), None)
+        match = SAN_PATTERN.fullmatch(san)
+        if match is None:
+            return None
+        piece, fromFile, fromRank, target, promotion = match.groups()
+        piece = piece or 'P'
+        endRow, endCol = Move.ranksToRows[target[1]], Move.filesToCols[target[0]]
+        targetBit = 1 << (endRow * 8 + endCol)
+        if piece == 'P':
+            candidates = self.generateLegalMoves(0, targetBit, withCastles=False)
+        else:
+            candidates = self.generateLegalMoves(targetBit, 0, withCastles=False)
+        found = None
+        for move in candidates:
+            if move.pieceMoved[1] != piece or move.endRow != endRow or move.endCol != endCol:
+                continue
+            if fromFile is not None and move.startCol != Move.filesToCols[fromFile]:
+                continue
+            if fromRank is not None and move.startRow != Move.ranksToRows[fromRank]:
+                continue
+            if move.isPawnPromotion and move.promotionChoice != (promotion or 'Q'):
+                continue
+            if found is not None:
+                return None
+            found = move
+        return found
+
+    #legal moves ending on targets (pawnTargets for pawns, en passant always included), generated directly
+    #from the checkers and pinned pieces, no make/undo filter
+    def generateLegalMoves(self, targets, pawnTargets=FULL, withCastles=True):
+        moves = []
+        if self.whiteToMove:
+            color, enemyColor = 'w', 'b'
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            color, enemyColor = 'b', 'w'
+            kingRow, kingCol = self.blackKingLocation
+        kingSq = kingRow * 8 + kingCol
+        checkers, pins = self.checkForPinsAndChecks()
+
+        if not checkers & (checkers - 1):                       #double check -> only the king can move
+            if checkers:                                        #single check -> capture or block the checker
+                checkerSq = checkers.bit_length() - 1
+                evasionMask = BETWEEN[kingSq][checkerSq] | checkers
+            else:
+                evasionMask = FULL
+            for piece in "PRNBQ":
+                targetMask = evasionMask & (pawnTargets if piece == 'P' else targets)
+                for sq in squares(self.pieceBitboards[color + piece]):
+                    self.moveFunctions[piece](sq >> 3, sq & 7, moves, targetMask & pins.get(sq, FULL))
+            if self.enPassantPossible:                          #en passant can uncover the king, test it on the board
+                moves = [move for move in moves if not move.isEnPassantMove or self.enPassantIsLegal(move)]
+
+        #king moves, the king itself is removed so it cannot hide behind its own square
+        occupied = self.occupied ^ (1 << kingSq)
+        kingTargets = KING_ATTACKS[kingSq] & ~self.colorBitboards[color] & targets
+        kingMove = kingSq | PIECE_INDEX[color + 'K'] << 16
+        for sq in squares(kingTargets):
+            if not self.attackersTo(sq, enemyColor, occupied):
+                moves.append(Move.fromCode(kingMove | sq << 6 | PIECE_INDEX[self.board[sq >> 3][sq & 7]] << 20))
+        if withCastles:
+            self.getCastleMoves(kingRow, kingCol, moves)
+
+        return moves
+
+    #returns (bitboard of pieces giving check, {pinned square: squares it may still move to})
+    def checkForPinsAndChecks(self):
+        if self.whiteToMove:
+            color, enemyColor = 'w', 'b'
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            color, enemyColor = 'b', 'w'
+            kingRow, kingCol = self.blackKingLocation
+        kingSq = kingRow * 8 + kingCol
+        checkers = self.attackersTo(kingSq, enemyColor, self.occupied)
+
+        pins = {}
+        enemyQueens = self.pieceBitboards[enemyColor + 'Q']
+        snipers = ((rookAttacks(kingSq, 0) & (self.pieceBitboards[enemyColor + 'R'] | enemyQueens))
+                   | (bishopAttacks(kingSq, 0) & (self.pieceBitboards[enemyColor + 'B'] | enemyQueens)))
+        for sniperSq in squares(snipers):
+            blockers = BETWEEN[kingSq][sniperSq] & self.occupied
+            if blockers and not blockers & (blockers - 1) and blockers & self.colorBitboards[color]:   #one own piece
+                pins[blockers.bit_length() - 1] = BETWEEN[kingSq][sniperSq] | (1 << sniperSq)
+        return checkers, pins
+
+    #plays an en passant capture on the occupancy only and checks that the king is safe
+    def enPassantIsLegal(self, move):
+        color, enemyColor = move.pieceMoved[0], move.pieceCaptured[0]
+        kingRow, kingCol = self.whiteKingLocation if color == 'w' else self.blackKingLocation
+        capturedBit = 1 << (move.startRow * 8 + move.endCol)
+        occupied = (self.occupied ^ (1 << (move.startRow * 8 + move.startCol)) ^ capturedBit) \
+                   | (1 << (move.endRow * 8 + move.endCol))
+        return not self.attackersTo(kingRow * 8 + kingCol, enemyColor, occupied) & ~capturedBit
+
     #check if the current player is in check
     def inCheck(self):
         if self.whiteToMove:
@@ -183,180 +672,143 @@ class GameState:
 
     #check if the enemy can attack
     def squareUnderAttack(self, row, col):
-        self.whiteToMove = not self.whiteToMove                 # opponent's turn
-        oppoMoves = self.getAllPossibleMoves()                  # generates all possible moves for the opponent
-        self.whiteToMove = not self.whiteToMove                 #switch back turn
-
-        for move in oppoMoves:
-            if move.endRow == row and move.endCol == col:       #square under attack
-                #self.whiteToMove = not self.whiteToMove        #-----BUG-----
-                return True
-        return False
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        return bool(self.attackersTo(row * 8 + col, enemyColor, self.occupied))
+
+    #bitboard of the pieces of one colour attacking sq, found by looking outward from sq
+    def attackersTo(self, sq, color, occupied):
+        pieces = self.pieceBitboards
+        queens = pieces[color + 'Q']
+        return ((PAWN_ATTACKS['b' if color == 'w' else 'w'][sq] & pieces[color + 'P'])
+                | (KNIGHT_ATTACKS[sq] & pieces[color + 'N'])
+                | (KING_ATTACKS[sq] & pieces[color + 'K'])
+                | (bishopAttacks(sq, occupied) & (pieces[color + 'B'] | queens))
+                | (rookAttacks(sq, occupied) & (pieces[color + 'R'] | queens)))
 
 
     #all moves without considering checks
     def getAllPossibleMoves(self):
         moves = []
-        #moves = [Move((6,4),(4,4),self.board),]             #testing case
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                turn = self.board[row][col][0]
-
-                if (turn == "w" and self.whiteToMove) or (turn == "b" and not self.whiteToMove):
-                    piece = self.board[row][col][1]
-
-                    self.moveFunctions[piece](row, col, moves)
+        color = 'w' if self.whiteToMove else 'b'
+        for piece in "PRNBQK":
+            for sq in squares(self.pieceBitboards[color + piece]):
+                self.moveFunctions[piece](sq >> 3, sq & 7, moves)
 
         return moves
 
-
-    #all chess pieces movement(Not Complete)
-    def getPawnMoves(self, row, col, moves):
-        #white's move
+    #adds a move from (row, col) to every square in targets
+    def addMoves(self, row, col, targets, moves):
+        board = self.board
+        start = row * 8 + col | PIECE_INDEX[board[row][col]] << 16
+        while targets:
+            low = targets & -targets
+            sq = low.bit_length() - 1
+            targets ^= low
+            move = newMove(Move)                                        #Move.fromCode inlined, hottest loop
+            move.code = start | sq << 6 | PIECE_INDEX[board[sq >> 3][sq & 7]] << 20
+            moves.append(move)
+
+
+    #all chess pieces movement
+    #allowed limits the target squares (check evasions and pins), en passant is left to the caller
+    def getPawnMoves(self, row, col, moves, allowed=FULL):
+        sq = row * 8 + col
         if self.whiteToMove:
-            if self.board[row-1][col] == "--":                                             #1 square move
-                moves.append(Move((row, col), (row-1, col), self.board))
-                if row == 6 and self.board[row-2][col] == "--":                            #2 square move
-                    moves.append(Move((row, col), (row-2, col), self.board))
-
-            if col-1 >= 0:                                                                 #left capture
-                if self.board[row-1][col-1][0] == 'b':
-                    moves.append(Move((row, col), (row-1, col-1), self.board))
-                elif (row -1, col-1) == self.enPassantPossible:
-                    moves.append(Move((row, col), (row-1, col-1), self.board, isEnpassantMove=True))
-            if col+1 <= 7:
-                if self.board[row-1][col+1][0] == 'b':                                      #right capture
-                    moves.append(Move((row, col), (row-1, col+1), self.board))
-                elif (row -1, col+1) == self.enPassantPossible:
-                    moves.append(Move((row, col), (row-1, col+1), self.board, isEnpassantMove=True))
-        #black's move
+            color, enemyColor, step, startRow = 'w', 'b', -1, 6
         else:
-            if self.board[row+1][col] == "--":                                             #1 square move
-                moves.append(Move((row, col), (row+1, col), self.board))
-                if row == 1 and self.board[row+2][col] == "--":                            #2 square move
-                    moves.append(Move((row, col), (row+2, col), self.board))
-
-            if col-1 >= 0:                                                                 #left capture
-                if self.board[row+1][col-1][0] == 'w':
-                    moves.append(Move((row, col), (row+1, col-1), self.board))
-                elif (row +1, col-1) == self.enPassantPossible:
-                    moves.append(Move((row, col), (row+1, col-1), self.board, isEnpassantMove=True))
-            if col+1 <= 7:
-                if self.board[row+1][col+1][0] == 'w':                                      #right capture
-                    moves.append(Move((row, col), (row+1, col+1), self.board))
-                elif (row +1, col+1) == self.enPassantPossible:
-                    moves.append(Move((row, col), (row+1, col+1), self.board, isEnpassantMove=True))
-
-
-    def getRookMoves(self, row, col, moves):
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        if self.whiteToMove:
-            enemyColor = 'b'
-        else:
-            enemyColor = 'w'
-
-        for d in directions:
-            for i in range(1,8):
-                endRow = row + d[0] * i
-                endCol = col + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:                     #on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":                                    #empty space
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor:                         #enemy space
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                        break
-                    else:                                                   #friendly space
-                        break
-                else:                                                       #off board
-                    break
-
-
-    def getKnightMoves(self, row, col, moves):
-        knightMoves = ((-2,-1), (-2,1), (-1,-2), (-1,2), (1,-2), (1,2), (2,-1), (2,1))
-        if self.whiteToMove:
-            allyColor = 'w'
-        else:
-            allyColor = 'b'
-
-        for m in knightMoves:
-            endRow = row + m[0]
-            endCol = col + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:                 #on board
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
-
-    def getBishopMoves(self, row, col, moves):
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        if self.whiteToMove:
-            enemyColor = 'b'
+            color, enemyColor, step, startRow = 'b', 'w', 1, 1
+
+        promotes = row + step in (0, 7)
+        start = sq | PIECE_INDEX[color + 'P'] << 16 | EMPTY_INDEX << 20                    #quiet pawn move
+        oneStep = 1 << (sq + 8 * step)
+        if not self.occupied & oneStep:                                                    #1 square move
+            if allowed & oneStep:
+                if promotes:
+                    self.addPromotions(row, col, row + step, col, moves)
+                else:
+                    moves.append(Move.fromCode(start | (sq + 8 * step) << 6))
+            if row == startRow:                                                            #2 square move
+                twoStep = 1 << (sq + 16 * step)
+                if not self.occupied & twoStep and allowed & twoStep:
+                    moves.append(Move.fromCode(start | (sq + 16 * step) << 6))
+
+        attacks = PAWN_ATTACKS[color][sq]
+        captures = attacks & self.colorBitboards[enemyColor] & allowed
+        if promotes:
+            for target in squares(captures):
+                self.addPromotions(row, col, target >> 3, target & 7, moves)
         else:
-            enemyColor = 'w'
-
-        for d in directions:
-            for i in range(1, 8):
-                endRow = row + d[0] * i
-                endCol = col + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:                        # on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":  # empty space
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor:  # enemy space
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                        break
-                    else:  # friendly space
-                        break
-                else:  # off board
-                    break
-
-    def getQueenMoves(self, row, col, moves):
-        self.getRookMoves(row, col, moves)                  #for horizontal and vertical moves
-        self.getBishopMoves(row, col, moves)                #for diagonal moves
-
-    def getKingMoves(self, row, col, moves):
-        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
-        if self.whiteToMove:
-            allyColor = 'w'
-        else:
-            allyColor = 'b'
-
-        for i in range(8):
-            endRow = row + kingMoves[i][0]
-            endCol = col + kingMoves[i][1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:                # on board
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
+            self.addMoves(row, col, captures, moves)                                      #captures
+        if self.enPassantPossible:
+            epRow, epCol = self.enPassantPossible
+            if attacks & (1 << (epRow * 8 + epCol)):
+                moves.append(Move.fromCode(sq | (epRow * 8 + epCol) << 6 | EN_PASSANT << 14 |
+                                           PIECE_INDEX[color + 'P'] << 16 | PIECE_INDEX[enemyColor + 'P'] << 20))
+
+    #one move per promotion piece, queen first
+    def addPromotions(self, row, col, endRow, endCol, moves):
+        base = row * 8 + col | (endRow * 8 + endCol) << 6 | PROMOTION << 14 | \
+            PIECE_INDEX[self.board[row][col]] << 16 | PIECE_INDEX[self.board[endRow][endCol]] << 20
+        for promotion in (3, 2, 1, 0):                                                     #Q, R, B, N
+            moves.append(Move.fromCode(base | promotion << 12))
+
+    def getRookMoves(self, row, col, moves, allowed=FULL):
+        allyColor = 'w' if self.whiteToMove else 'b'
+        targets = rookAttacks(row * 8 + col, self.occupied) & ~self.colorBitboards[allyColor] & allowed
+        self.addMoves(row, col, targets, moves)
+
+    def getKnightMoves(self, row, col, moves, allowed=FULL):
+        allyColor = 'w' if self.whiteToMove else 'b'
+        targets = KNIGHT_ATTACKS[row * 8 + col] & ~self.colorBitboards[allyColor] & allowed
+        self.addMoves(row, col, targets, moves)
+
+    def getBishopMoves(self, row, col, moves, allowed=FULL):
+        allyColor = 'w' if self.whiteToMove else 'b'
+        targets = bishopAttacks(row * 8 + col, self.occupied) & ~self.colorBitboards[allyColor] & allowed
+        self.addMoves(row, col, targets, moves)
+
+    def getQueenMoves(self, row, col, moves, allowed=FULL):
+        self.getRookMoves(row, col, moves, allowed)                  #for horizontal and vertical moves
+        self.getBishopMoves(row, col, moves, allowed)                #for diagonal moves
+
+    def getKingMoves(self, row, col, moves, allowed=FULL):
+        allyColor = 'w' if self.whiteToMove else 'b'
+        targets = KING_ATTACKS[row * 8 + col] & ~self.colorBitboards[allyColor] & allowed
+        self.addMoves(row, col, targets, moves)
 
         #self.getCastleMoves(row, col, moves, allyColor)
 
 
     def getCastleMoves(self, row, col, moves):
-        if self.squareUnderAttack(row, col):                                 #cant castle if in check
+        rights = self.castlingRights & ((WHITE_KINGSIDE | WHITE_QUEENSIDE) if self.whiteToMove
+                                        else (BLACK_KINGSIDE | BLACK_QUEENSIDE))
+        if not rights or self.squareUnderAttack(row, col):                   #cant castle if in check
             return
-        if (self.whiteToMove and self.currentCastlingRight.wks) or (not self.whiteToMove and self.currentCastlingRight.bks):
+        if rights & (WHITE_KINGSIDE | BLACK_KINGSIDE):
             self.getKingsideCastleMoves(row, col, moves)
-        if (self.whiteToMove and self.currentCastlingRight.wqs) or (not self.whiteToMove and self.currentCastlingRight.bqs):
+        if rights & (WHITE_QUEENSIDE | BLACK_QUEENSIDE):
             self.getQueensideCastleMoves(row, col, moves)
 
     def getKingsideCastleMoves(self, row, col, moves):
         if self.board[row][col+1] == "--" and self.board[row][col+2] == "--" :
-            if not self.squareUnderAttack(row, col+1) or not self.squareUnderAttack(row, col+2):
+            if not self.squareUnderAttack(row, col+1) and not self.squareUnderAttack(row, col+2):
                 moves.append(Move((row, col), (row, col+2), self.board, isCastleMove=True))
 
     def getQueensideCastleMoves(self, row, col, moves):
-        if self.board[row][col-1] == "--" and self.board[row][col-2] == "--" and self.board[row][col-3]:
-            if not self.squareUnderAttack(row, col - 1) or not self.squareUnderAttack(row, col - 2):
+        if self.board[row][col-1] == "--" and self.board[row][col-2] == "--" and self.board[row][col-3] == "--":
+            if not self.squareUnderAttack(row, col - 1) and not self.squareUnderAttack(row, col - 2):
                 moves.append(Move((row, col), (row, col-2), self.board, isCastleMove=True))
 
 
-class CastleRights():
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
+#Move.code bit layout, the low 16 bits are the from/to/promotion/flag code of the move
+#bits 0-5 start square, 6-11 end square (row*8 + col), 12-13 promotion piece (N, B, R, Q),
+#14-15 flag, 16-19 piece moved, 20-23 piece captured (index into PIECE_NAMES)
+NORMAL_MOVE, PROMOTION, EN_PASSANT, CASTLING = 0, 1, 2, 3
+PROMOTION_PIECES = "NBRQ"
+PIECE_NAMES = PIECES + ("--",)
+PIECE_INDEX = {piece: i for i, piece in enumerate(PIECE_NAMES)}
+EMPTY_INDEX = PIECE_INDEX["--"]
+MOVE_MASK = 0x3FFF                  #start, end and promotion piece identify a move (flag follows from the board)
 
 class Move:
     #maps keys to value
@@ -367,29 +819,91 @@ class Move:
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
-    def __init__(self, startSQ, endSQ, board, isEnpassantMove=False, isCastleMove=False):
-        self.startRow = startSQ[0]
-        self.startCol = startSQ[1]
-        self.endRow = endSQ[0]
-        self.endCol = endSQ[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        self.isPawnPromotion = (self.pieceMoved == 'wP' and self.endRow == 0) or (self.pieceMoved == 'bP' and self.endRow == 7)
-        #self.isEnPassantMove = (self.pieceMoved[1] == 'P' and (self.endRow, self.endCol) == enpassantPossible)
-        self.isEnPassantMove = isEnpassantMove
-        if self.isEnPassantMove:
-            self.pieceCaptured = "wP" if self.pieceMoved == "bP" else "bP"
-        self.isCastleMove = isCastleMove
-        self.moveId = (self.startRow * 1000) + (self.startCol * 100) + (self.endRow * 10) + self.endCol
-        print(self.moveId)                    #testing for move id
+    __slots__ = ("code",)            #everything else is unpacked from the code when asked for
+
+    def __init__(self, startSQ, endSQ, board, isEnpassantMove=False, isCastleMove=False, promotionChoice='Q'):
+        startRow, startCol = startSQ
+        endRow, endCol = endSQ
+        pieceMoved = board[startRow][startCol]
+        pieceCaptured = board[endRow][endCol]
+        promotion = 0
+        if isEnpassantMove:
+            flag = EN_PASSANT
+            pieceCaptured = "wP" if pieceMoved == "bP" else "bP"
+        elif isCastleMove:
+            flag = CASTLING
+        elif (pieceMoved == 'wP' and endRow == 0) or (pieceMoved == 'bP' and endRow == 7):
+            flag = PROMOTION
+            promotion = PROMOTION_PIECES.index(promotionChoice)
+        else:
+            flag = NORMAL_MOVE
+        self.code = (startRow * 8 + startCol) | (endRow * 8 + endCol) << 6 | promotion << 12 | flag << 14 | \
+            PIECE_INDEX[pieceMoved] << 16 | PIECE_INDEX[pieceCaptured] << 20
+
+    #builds a move straight from its packed code (used by the move generators)
+    @classmethod
+    def fromCode(cls, code):
+        move = newMove(cls)
+        move.code = code
+        return move
+
+    @property
+    def startRow(self):
+        return (self.code >> 3) & 7
+
+    @property
+    def startCol(self):
+        return self.code & 7
+
+    @property
+    def endRow(self):
+        return (self.code >> 9) & 7
+
+    @property
+    def endCol(self):
+        return (self.code >> 6) & 7
+
+    @property
+    def pieceMoved(self):
+        return PIECE_NAMES[(self.code >> 16) & 15]
+
+    @property
+    def pieceCaptured(self):
+        return PIECE_NAMES[(self.code >> 20) & 15]
+
+    @property
+    def isPawnPromotion(self):
+        return (self.code >> 14) & 3 == PROMOTION
+
+    @property
+    def isEnPassantMove(self):
+        return (self.code >> 14) & 3 == EN_PASSANT
+
+    @property
+    def isCastleMove(self):
+        return (self.code >> 14) & 3 == CASTLING
+
+    @property
+    def promotionChoice(self):
+        return PROMOTION_PIECES[(self.code >> 12) & 3] if (self.code >> 14) & 3 == PROMOTION else 'Q'
+
+    @property
+    def moveId(self):
+        return (self.startRow * 1000) + (self.startCol * 100) + (self.endRow * 10) + self.endCol
 
     def __eq__(self, other):
         if isinstance(other, Move):
-            return self.moveId == other.moveId
+            return self.code & MOVE_MASK == other.code & MOVE_MASK
         return False
 
+    def __hash__(self):
+        return self.code & MOVE_MASK
+
     def getChessNotation(self):
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += self.promotionChoice.lower()
+        return notation
 
     def getRankFile(self, row, col):
         return  self.colsToFiles[col] + self.rowsToRanks[row]
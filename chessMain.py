@@ -2,18 +2,35 @@
 main driver file
 -> takes user input
 -> displays current GameState object
+-> renders only the squares that changed since the last frame, nothing at all on idle frames
+-> move animation over a cached background, --no-animation turns it off
+
+usage:
+    python chessMain.py
+    python chessMain.py --no-animation
 """
+import argparse
+import os
+import time
 
 import pygame as pg
 
 import SmartMoveFinder
 import chessEngine
+from aiWorker import AIWorker
+from polyglotBook import PolyglotBook
 
 WIDTH = HEIGHT = 400
 DIMENSION = 8
 SQ_SIZE = WIDTH // DIMENSION
 MAX_FPS = 15
+ANIMATION_FPS = 60
+SECONDS_PER_SQUARE = 0.06       #animation speed, capped by MAX_ANIMATION_TIME however far the piece goes
+MAX_ANIMATION_TIME = 0.25
+BOOK_FILE = "book.bin"          #polyglot opening book, used when the file exists
 IMAGES = {}
+COLORS = [pg.Color("white"), pg.Color("gray")]
+NO_HIGHLIGHT, SELECTED, TARGET = 0, 1, 2            #square highlights
 
 #loads all images once
 def loadImages():
@@ -22,78 +39,149 @@ def loadImages():
     for piece in pieces:
         IMAGES[piece] = pg.transform.scale(pg.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
 
-#graphics for the current game state
-def drawGameState(screen, gs, validMoves, sqSelected):
-    drawBoard(screen)
-    highlightSquares(screen, gs, validMoves, sqSelected)
-    drawPieces(screen, gs.board)
-
 # draw squares on the board
-def drawBoard(screen):
-    global colors
-    colors = [pg.Color("white"), pg.Color("gray")]
-
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-            color = colors[((row+col)%2)]
-            pg.draw.rect(screen, color, pg.Rect(col*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-
-# draw pieces on those square
-def drawPieces(screen, board):
+def drawBoard(surface):
     for row in range(DIMENSION):
         for col in range(DIMENSION):
-            piece = board[row][col]
-
-            if piece != "--":
-                screen.blit(IMAGES[piece], pg.Rect(col*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+            color = COLORS[((row+col)%2)]
+            pg.draw.rect(surface, color, pg.Rect(col*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    return surface
 
-#highlights the squares that can be selected by the user
-def highlightSquares(screen, gs, validMoves,sqSelected):
+#squares highlighted for the user: the selected piece and where it can go, {(row, col): highlight}
+def highlightSquares(gs, validMoves, sqSelected):
+    highlights = {}
     if sqSelected != ():
         row, col = sqSelected
         if gs.board[row][col][0] == ("w" if gs.whiteToMove else "b"):
-            #selected square
-            s = pg.Surface((SQ_SIZE,SQ_SIZE))
-            s.set_alpha(100)                               #transparancy value
-            s.fill(pg.Color('blue'))
-            screen.blit(s, (col*SQ_SIZE, row*SQ_SIZE))
-            #highlight valid moves
-            s.fill(pg.Color('yellow'))
+            highlights[(row, col)] = SELECTED
             for move in validMoves:
                 if move.startRow == row and move.startCol == col:
-                    screen.blit(s, (move.endCol*SQ_SIZE, move.endRow*SQ_SIZE))
+                    highlights[(move.endRow, move.endCol)] = TARGET
+    return highlights
+
+def makeOverlay(color):
+    s = pg.Surface((SQ_SIZE,SQ_SIZE))
+    s.set_alpha(100)                               #transparancy value
+    s.fill(pg.Color(color))
+    return s
+
+class BoardRenderer:
+    #keeps what is on screen per square and redraws only the squares that differ from the game state
+    def __init__(self, screen):
+        self.screen = screen
+        self.board = drawBoard(pg.Surface((WIDTH, HEIGHT)))            #empty board, built once
+        self.overlays = {SELECTED: makeOverlay('blue'), TARGET: makeOverlay('yellow')}
+        self.font = pg.font.SysFont("Helvicta", 32, True, False)
+        self.texts = {}                                                 #text -> (shadow, text) surfaces
+        self.shown = [[None] * DIMENSION for _ in range(DIMENSION)]     #(piece, highlight) on screen
+        self.text = None
+
+    #the screen was drawn over (animation, window exposed), the next render draws every square
+    def invalidate(self):
+        self.shown = [[None] * DIMENSION for _ in range(DIMENSION)]
+
+    def drawSquare(self, surface, row, col, piece, highlight=NO_HIGHLIGHT):
+        rect = pg.Rect(col*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        surface.blit(self.board, rect, rect)
+        if highlight != NO_HIGHLIGHT:
+            surface.blit(self.overlays[highlight], rect)
+        if piece != "--":
+            surface.blit(IMAGES[piece], rect)
+        return rect
+
+    #every square of board without highlights, returns the (piece, highlight) grid that was drawn
+    def drawPosition(self, surface, board):
+        shown = []
+        for row in range(DIMENSION):
+            shown.append([])
+            for col in range(DIMENSION):
+                self.drawSquare(surface, row, col, board[row][col])
+                shown[row].append((board[row][col], NO_HIGHLIGHT))
+        return shown
+
+    #draws the changes onto the screen, returns the rects for pg.display.update (empty when nothing changed)
+    def render(self, gs, validMoves, sqSelected, text=None):
+        textChanged = text != self.text
+        if textChanged:
+            if self.text is not None:                                   #squares under the old text
+                self.invalidate()
+            self.text = text
+        highlights = highlightSquares(gs, validMoves, sqSelected)
+        dirty = []
+        for row in range(DIMENSION):
+            shownRow = self.shown[row]
+            boardRow = gs.board[row]
+            for col in range(DIMENSION):
+                state = (boardRow[col], highlights.get((row, col), NO_HIGHLIGHT))
+                if state != shownRow[col]:
+                    dirty.append(self.drawSquare(self.screen, row, col, *state))
+                    shownRow[col] = state
+        if text is not None and (dirty or textChanged):                 #redrawn squares may cut the text
+            dirty.append(self.drawText(text))
+        return dirty
+
+    def drawText(self, text):
+        if text not in self.texts:
+            self.texts[text] = (self.font.render(text, 0, pg.Color("Gray")), self.font.render(text, 0, pg.Color("Black")))
+        shadow, textObject = self.texts[text]
+        textLocation = pg.Rect(0,0, WIDTH, HEIGHT).move(WIDTH/2 - textObject.get_width()/2, HEIGHT/2 - textObject.get_height()/2)
+        self.screen.blit(shadow, textLocation)
+        self.screen.blit(textObject, textLocation.move(2,2))
+        return pg.Rect(textLocation.topleft, (textObject.get_width() + 2, textObject.get_height() + 2))
+
+#text shown over the board when the game is over, None while it goes on
+def gameOverText(gs):
+    if gs.checkMate:
+        return "Black wins by checkmate" if gs.whiteToMove else "White wins by checkmate"
+    if gs.staleMate:
+        return "stalemate"
+    return None
 
 #animations
-def animateMove(move, screen, board, clock):
-    global colors
+#slides the moved piece to its end square, board is the position after the move
+#the position is drawn once into a background, every frame only restores the background under the old
+#sprite and blits the sprite again
+def animateMove(move, screen, renderer, board, clock):
+    background = pg.Surface((WIDTH, HEIGHT))
+    shown = renderer.drawPosition(background, board)
+    captured = move.pieceCaptured
+    if move.isEnPassantMove:                                #the pawn is taken from beside the end square
+        renderer.drawSquare(background, move.startRow, move.endCol, captured)
+        shown[move.startRow][move.endCol] = None
+        captured = "--"
+    renderer.drawSquare(background, move.endRow, move.endCol, captured)
+    shown[move.endRow][move.endCol] = None                  #the sprite stops on top of the captured piece
+    screen.blit(background, (0, 0))
+    pg.display.update()
+
     dR = move.endRow - move.startRow
     dC = move.endCol - move.startCol
-    framesPerSquare = 10
-    frameCount = (abs(dR) + abs(dC)) * framesPerSquare
-    for frame in range(frameCount+1):
-        row, col = (move.startRow + dR*frame/frameCount, move.startCol + dC*frame/frameCount)
-        drawBoard(screen)
-        drawPieces(screen, board)
-
-        color = colors[(move.endRow+move.endCol)%2]
-        endSquare = pg.Rect(move.endCol*SQ_SIZE, move.endRow*SQ_SIZE, SQ_SIZE, SQ_SIZE)
-        pg.draw.rect(screen, color, endSquare)
-
-        if move.pieceCaptured != '--':
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
-        screen.blit(IMAGES[move.pieceMoved], pg.Rect(col*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        pg.display.flip()
-        clock.tick(60)
-
-def drawText(screen, text):
-    font = pg.font.SysFont("Helvicta", 32, True, False)
-    textObject = font.render(text, 0, pg.Color("Gray"))
-    textLocation = pg.Rect(0,0, WIDTH, HEIGHT).move(WIDTH/2 - textObject.get_width()/2, HEIGHT/2 - textObject.get_height()/2)
-    screen.blit(textObject, textLocation)
-    textObject = font.render(text, 0, pg.Color("Black"))
-    screen.blit(textObject, textLocation.move(2,2))
-
-def main():
+    duration = min(max(abs(dR), abs(dC)) * SECONDS_PER_SQUARE, MAX_ANIMATION_TIME)
+    sprite = IMAGES[move.pieceMoved]
+    start = time.perf_counter()
+    previous = None
+    while True:
+        progress = min((time.perf_counter() - start) / duration, 1.0)
+        rect = pg.Rect(round((move.startCol + dC*progress)*SQ_SIZE), round((move.startRow + dR*progress)*SQ_SIZE),
+                       SQ_SIZE, SQ_SIZE)
+        dirty = [rect]
+        if previous is not None:
+            screen.blit(background, previous, previous)
+            dirty.append(previous)
+        screen.blit(sprite, rect)
+        pg.display.update(dirty)
+        if progress >= 1.0:
+            break
+        previous = rect
+        clock.tick(ANIMATION_FPS)
+    renderer.shown = shown                                  #the screen now shows the background
+    renderer.text = None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="play chess against the AI")
+    parser.add_argument("--no-animation", action="store_true", help="show moves without animating them")
+    args = parser.parse_args(argv)
+
     pg.init()
     screen = pg.display.set_mode((WIDTH, HEIGHT))
     clock = pg.time.Clock()
@@ -103,21 +191,30 @@ def main():
     validMoves = gs.getValidMoves()
     moveMade = False                       #flag move made
     animate = False                         #flag for animation
+    animateMoves = not args.no_animation    #off for batch and AI vs AI runs
 
     loadImages()
+    renderer = BoardRenderer(screen)
+    needsRender = True             #only frames with an event, a move or an AI result draw anything
 
     sqSelected = ()                #selects empty square, last click of user
     playerClicks = []              #playerclick tracker
     gameOver = False
     PlayerOne = True              #if player white == true, Ai white == false
     PlayerTwo = False             #if player black == true, Ai black == false
+    aiWorker = AIWorker()         #searches in its own process, polled every frame
+    aiWorker.start()
+    book = PolyglotBook(BOOK_FILE) if os.path.exists(BOOK_FILE) else None
 
     running = True
     while running:
         humanTurn = (gs.whiteToMove and PlayerOne) or (not gs.whiteToMove and PlayerTwo)
         for event in pg.event.get():
+            needsRender = True
             if event.type == pg.QUIT:                #exit game
                 running = False
+            elif event.type in (pg.VIDEOEXPOSE, pg.WINDOWEXPOSED):
+                renderer.invalidate()
             #mouse handler
             elif event.type == pg.MOUSEBUTTONDOWN:   #mouse click gameplay
                 if not gameOver and humanTurn:
@@ -147,11 +244,13 @@ def main():
             #key handler
             elif event.type == pg.KEYDOWN:
                 if event.key == pg.K_z:             #undo a move
+                    aiWorker.cancel()
                     gs.undoMove()
                     moveMade = True
                     animate = False
                     gameOver = False
                 if event.key == pg.K_r:             #reset the board
+                    aiWorker.cancel()
                     gs = chessEngine.GameState()
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
@@ -160,36 +259,50 @@ def main():
                     animate = False
                     gameOver = False
 
-        #AI move finder
-        if not gameOver and not humanTurn:
-            AIMove = SmartMoveFinder.findBestMove(gs, validMoves)
-            if AIMove is None:
-                AIMove = SmartMoveFinder.findRandomMove(validMoves)
-            gs.makeMove(AIMove)
-            moveMade = True
-            animate = True
+        #AI move finder, never waits for the search
+        if not gameOver and not humanTurn and not moveMade:
+            bookMove = book.chooseMove(gs) if book is not None and not aiWorker.running else None
+            if bookMove is not None:
+                gs.makeMove(bookMove)
+                moveMade = True
+                animate = True
+            elif not aiWorker.running or aiWorker.pondering:
+                aiWorker.requestMove(gs)                #picks up the ponder search if the guess was right
+            result = aiWorker.poll() if not moveMade else None
+            if result is not None:
+                AIMove = next((move for move in validMoves if move == result.bestMove), None)
+                if AIMove is None:
+                    AIMove = SmartMoveFinder.findRandomMove(validMoves)
+                gs.makeMove(AIMove)
+                moveMade = True
+                animate = True
+                humanNext = (gs.whiteToMove and PlayerOne) or (not gs.whiteToMove and PlayerTwo)
+                if humanNext and AIMove == result.bestMove and len(result.pv) > 1:
+                    aiWorker.startPonder(gs, result.pv[1])      #think on the expected reply
 
         if moveMade:
-            if animate:
-                animateMove(gs.moveLog[-1], screen, gs.board, clock)
+            if animate and animateMoves:
+                animateMove(gs.moveLog[-1], screen, renderer, gs.board, clock)
             validMoves = gs.getValidMoves()
             moveMade = False
+            needsRender = True
 
-        drawGameState(screen, gs, validMoves, sqSelected)
-
-        if gs.checkMate:
-            gameOver = True
-            if gs.whiteToMove:
-                drawText(screen, "Black wins by checkmate")
-            else:
-                drawText(screen, "White wins by checkmate")
-        elif gs.staleMate:
-            gameOver = True
-            drawText(screen, "stalemate")
+        if needsRender:
+            if (gs.checkMate or gs.staleMate) and aiWorker.running:
+                aiWorker.cancel()
+            text = gameOverText(gs)
+            if text is not None:
+                gameOver = True
+            dirty = renderer.render(gs, validMoves, sqSelected, text)
+            if dirty:
+                pg.display.update(dirty)
+            needsRender = False
 
         clock.tick(MAX_FPS)
-        pg.display.flip()
 
+    aiWorker.stop()
+    if book is not None:
+        book.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,286 @@
+"""
+win/draw bitbases for the 3 piece endings KQK, KRK and KPK
+-> generated by retrograde analysis over the move graph of chessEngine (its own move rules)
+-> one bit per position: the side with the extra piece wins, or not (draw)
+-> symmetry reduction: pawnless endings put the strong king in the a1-d1-d4 triangle,
+   KPK mirrors the pawn onto files a-d, black strong sides are flipped to white
+-> files are loaded lazily with mmap the first time an ending is probed
+
+usage:
+    python endgameBitbases.py                    #generate all endings into bitbases/, report time and size
+    python endgameBitbases.py KPK --output-dir /tmp/bb
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+import chessEngine
+from bitboards import lsb
+
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+MAGIC = b"CHESSBB1"
+HEADER = struct.Struct("<8sII")                 #magic, number of positions, reserved
+WIN, DRAW, LOSS = 1, 0, -1                      #probe results for the side to move
+
+ENDINGS = ("KQK", "KRK", "KPK")                 #generation order, KPK promotes into the other two
+
+
+def _transform(flipRows, flipCols, transpose):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        if transpose:
+            row, col = col, row
+        if flipRows:
+            row = 7 - row
+        if flipCols:
+            col = 7 - col
+        table.append(row * 8 + col)
+    return table
+
+
+#the 8 symmetries of the board as square permutations
+SYMMETRIES = [_transform(r, c, t) for t in (False, True) for r in (False, True) for c in (False, True)]
+#a1, b1, c1, d1, b2, c2, d2, c3, d3, d4 (row 7 is rank 1)
+TRIANGLE = [sq for sq in range(64) if 7 - sq // 8 <= sq % 8 <= 3]
+TRIANGLE_INDEX = {sq: i for i, sq in enumerate(TRIANGLE)}
+#symmetry that brings a strong king on sq into the triangle
+KING_SYMMETRY = [next(s for s in SYMMETRIES if s[sq] in TRIANGLE_INDEX) for sq in range(64)]
+
+SIZES = {"KQK": 2 * len(TRIANGLE) * 64 * 64, "KRK": 2 * len(TRIANGLE) * 64 * 64, "KPK": 2 * 24 * 64 * 64}
+
+
+#index of a position with the strong side as white: king, lone king, extra piece square, white to move
+def positionIndex(ending, whiteKing, blackKing, piece, whiteToMove):
+    side = 0 if whiteToMove else 1
+    if ending == "KPK":
+        if piece % 8 > 3:                                   #mirror the pawn onto files a-d
+            whiteKing ^= 7
+            blackKing ^= 7
+            piece ^= 7
+        return ((side * 24 + (piece // 8 - 1) * 4 + piece % 8) * 64 + whiteKing) * 64 + blackKing
+    symmetry = KING_SYMMETRY[whiteKing]
+    return ((side * 10 + TRIANGLE_INDEX[symmetry[whiteKing]]) * 64 + symmetry[blackKing]) * 64 + symmetry[piece]
+
+
+def _positions(ending):
+    pieceSquares = range(8, 56) if ending == "KPK" else range(64)
+    kingSquares = TRIANGLE if ending != "KPK" else range(64)
+    for whiteToMove in (True, False):
+        for piece in pieceSquares:
+            if ending == "KPK" and piece % 8 > 3:
+                continue
+            for whiteKing in kingSquares:
+                for blackKing in range(64):
+                    yield whiteKing, blackKing, piece, whiteToMove
+
+
+def _kingsTouch(a, b):
+    return max(abs(a // 8 - b // 8), abs(a % 8 - b % 8)) <= 1
+
+
+class _Board:
+    #one GameState reused for every position of the generator
+    def __init__(self):
+        self.gs = chessEngine.GameState("4k3/8/8/8/8/8/8/4K3 w - - 0 1")
+        self.gs.clearSquare(0, 4)
+        self.gs.clearSquare(7, 4)
+        self.placed = []
+
+    def setup(self, pieces, whiteToMove):
+        gs = self.gs
+        for sq in self.placed:
+            gs.clearSquare(sq // 8, sq % 8)
+        self.placed = []
+        for piece, sq in pieces:
+            gs.putPiece(sq // 8, sq % 8, piece)
+            self.placed.append(sq)
+            if piece == "wK":
+                gs.whiteKingLocation = (sq // 8, sq % 8)
+            elif piece == "bK":
+                gs.blackKingLocation = (sq // 8, sq % 8)
+        gs.whiteToMove = whiteToMove
+        return gs
+
+
+#bytearray with one bit per index, set when white (the strong side) wins
+def generate(ending, tables=None):
+    tables = tables or {}
+    size = SIZES[ending]
+    pieceName = "w" + ending[1]
+    board = _Board()
+    legal = bytearray(size)
+    predecessors = [None] * size
+    remaining = [0] * size                          #black to move: moves not yet known to lose
+    won = bytearray(size)
+    queue = []
+
+    for whiteKing, blackKing, piece, whiteToMove in _positions(ending):
+        if whiteKing == blackKing or piece in (whiteKing, blackKing) or _kingsTouch(whiteKing, blackKing):
+            continue
+        index = positionIndex(ending, whiteKing, blackKing, piece, whiteToMove)
+        if legal[index]:                                    #symmetric twin already done
+            continue
+        gs = board.setup((("wK", whiteKing), ("bK", blackKing), (pieceName, piece)), whiteToMove)
+        gs.whiteToMove = not whiteToMove
+        if gs.inCheck():                                    #side that just moved is in check
+            continue
+        gs.whiteToMove = whiteToMove
+        legal[index] = 1
+        moves = gs.getValidMoves()
+        if not moves:
+            if gs.checkMate and not whiteToMove:
+                won[index] = 1
+                queue.append(index)
+            continue
+        external = None                                     #best (white) / worst (black) result leaving the table
+        internal = []
+        for move in moves:
+            gs.makeMove(move)
+            if move.pieceCaptured != "--":
+                result = False                              #KK
+            elif move.isPawnPromotion:
+                promoted = "K" + move.promotionChoice + "K"         #KBK and KNK are draws
+                result = promoted in tables and \
+                    bool(_bit(tables[promoted], positionIndex(promoted, *_squares(gs, "w" + move.promotionChoice))))
+            else:
+                result = None
+                internal.append(positionIndex(ending, *_squares(gs, pieceName)))
+            gs.undoMove()
+            if result is not None:
+                if whiteToMove:
+                    external = external or result
+                else:
+                    external = result if external is None else external and result
+        for child in internal:
+            if predecessors[child] is None:
+                predecessors[child] = []
+            predecessors[child].append(index)
+        if whiteToMove:
+            if external:
+                won[index] = 1
+                queue.append(index)
+        else:
+            #a drawing exit means black can never be forced into a loss
+            remaining[index] = len(internal) + (1 if external is False else 0)
+
+    while queue:                                            #retrograde: walk back from the known wins
+        index = queue.pop()
+        for parent in predecessors[index] or ():
+            if won[parent]:
+                continue
+            if parent < size // 2:                          #white to move: one winning move is enough
+                won[parent] = 1
+                queue.append(parent)
+            else:
+                remaining[parent] -= 1
+                if remaining[parent] == 0:
+                    won[parent] = 1
+                    queue.append(parent)
+
+    bits = bytearray((size + 7) // 8)
+    for index in range(size):
+        if won[index]:
+            bits[index >> 3] |= 1 << (index & 7)
+    return bits
+
+
+def _bit(bits, index):
+    return (bits[index >> 3] >> (index & 7)) & 1
+
+
+#(white king, black king, extra piece, white to move) of a gs holding exactly these 3 pieces
+def _squares(gs, pieceName):
+    boards = gs.pieceBitboards
+    return lsb(boards["wK"]), lsb(boards["bK"]), lsb(boards[pieceName]), gs.whiteToMove
+
+
+def save(ending, bits, directory=BITBASE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, ending + ".bb")
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, SIZES[ending], 0))
+        file.write(bits)
+    return path
+
+
+_loaded = {}                        #ending -> mmap (None when the file is missing or broken)
+
+
+def loadTable(ending, directory=BITBASE_DIR):
+    if ending not in _loaded:
+        table = None
+        path = os.path.join(directory, ending + ".bb")
+        try:
+            with open(path, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, size, _ = HEADER.unpack_from(data, 0)
+            if magic == MAGIC and size == SIZES[ending] and len(data) >= HEADER.size + (size + 7) // 8:
+                table = memoryview(data)[HEADER.size:]
+        except (OSError, ValueError, struct.error):
+            table = None
+        _loaded[ending] = table
+    return _loaded[ending]
+
+
+#the ending name and strong colour of gs, or (None, None) if no bitbase covers it
+def classify(gs):
+    if bin(gs.occupied).count("1") != 3:
+        return None, None
+    boards = gs.pieceBitboards
+    for piece in ("Q", "R", "P"):
+        if boards["w" + piece]:
+            return "K" + piece + "K", "w"
+        if boards["b" + piece]:
+            return "K" + piece + "K", "b"
+    return None, None
+
+
+#WIN/DRAW/LOSS for the side to move, None when no bitbase covers the position
+def probe(gs):
+    ending, strong = classify(gs)
+    if ending is None:
+        return None
+    table = loadTable(ending)
+    if table is None:
+        return None
+    whiteKing, blackKing, piece, whiteToMove = _squares(gs, strong + ending[1])
+    if ending == "KPK" and not 8 <= piece < 56:             #pawn on a back rank, set up by hand
+        return None
+    if strong == "b":                                       #flip ranks and colours so the strong side is white
+        whiteKing, blackKing, piece, whiteToMove = blackKing ^ 56, whiteKing ^ 56, piece ^ 56, not whiteToMove
+    if not _bit(table, positionIndex(ending, whiteKing, blackKing, piece, whiteToMove)):
+        return DRAW
+    return WIN if whiteToMove else LOSS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="generate the endgame bitbases by retrograde analysis")
+    parser.add_argument("endings", nargs="*", default=list(ENDINGS), help="endings to build (default: all)")
+    parser.add_argument("--output-dir", default=BITBASE_DIR, help="where the .bb files go (default %(default)s)")
+    args = parser.parse_args(argv)
+    for ending in args.endings:
+        if ending not in SIZES:
+            parser.error("unknown ending %s (choose from %s)" % (ending, ", ".join(ENDINGS)))
+
+    tables = {}
+    for ending in ENDINGS:
+        if ending not in args.endings and not (ending != "KPK" and "KPK" in args.endings):
+            continue
+        start = time.perf_counter()
+        bits = generate(ending, tables)
+        seconds = time.perf_counter() - start
+        tables[ending] = bits
+        wins = sum(bin(byte).count("1") for byte in bits)
+        if ending in args.endings:
+            path = save(ending, bits, args.output_dir)
+            print("%s: %d positions, %d won, %.1fs, %s %d bytes" % (
+                ending, SIZES[ending], wins, seconds, path, os.path.getsize(path)), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+EPD test suite runner (WAC, STS, ...)
+-> reads EPD lines: 4 FEN fields followed by operations (bm, am, id, c0, hmvc, fmvn)
+-> searches every position with a time (or depth) limit, optionally over a process pool
+-> a position is solved when the final move is a best move (bm) / not an avoid move (am)
+-> STS style points are read from c0 ("Nf3=10, e4=5")
+-> reports solved percentage, time to solution and nodes per second per position
+-> --selective picks the selective search techniques (default all, none given = full width search)
+
+usage:
+    python epd.py wac.epd --time 1
+    python epd.py sts1.epd --time 0.5 --workers 8 --json sts1.json
+    python epd.py wac.epd --depth 5 --selective lmr futility
+"""
+import argparse
+import concurrent.futures
+import json
+import platform
+import re
+import sys
+import time
+
+import chessEngine
+from SmartMoveFinder import NegaMaxSearch, MAX_DEPTH, SELECTIVE
+from transpositionTable import TranspositionTable
+
+DEFAULT_TIME_LIMIT = 1.0
+_OPERATION = re.compile(r'\s*([A-Za-z][A-Za-z0-9_]*)((?:\s+(?:"[^"]*"|[^\s;"]+))*)\s*;')
+_OPERAND = re.compile(r'"([^"]*)"|([^\s;"]+)')
+_POINTS = re.compile(r'([^\s,=]+)\s*=\s*(\d+)')
+
+
+#{"fen": ..., "operations": {opcode: [operands]}, "id": ...} or None for blank and comment lines
+def parseEpd(line):
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("invalid EPD (needs 4 FEN fields): " + line)
+    operations = {}
+    for match in _OPERATION.finditer(fields[4] if len(fields) > 4 else ""):
+        operations[match.group(1)] = [quoted or plain for quoted, plain in _OPERAND.findall(match.group(2))]
+    fen = " ".join(fields[:4])
+    if "hmvc" in operations and "fmvn" in operations:
+        fen += " %s %s" % (operations["hmvc"][0], operations["fmvn"][0])
+    chessEngine.GameState(fen)                              #raises ValueError for a bad position
+    return {"fen": fen, "operations": operations, "id": " ".join(operations.get("id", [])) or None}
+
+
+def readEpd(path):
+    positions = []
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            try:
+                position = parseEpd(line)
+            except ValueError as error:
+                raise ValueError("%s:%d: %s" % (path, number, error))
+            if position is not None:
+                if position["id"] is None:
+                    position["id"] = "%s:%d" % (path, number)
+                positions.append(position)
+    return positions
+
+
+def _strip(san):
+    return san.rstrip("+#!?")
+
+
+#the legal move that a SAN (or coordinate) operand names, None if there is none
+def findMove(gs, text, validMoves=None):
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    text = _strip(text).replace("0-0-0", "O-O-O").replace("0-0", "O-O")
+    for move in validMoves:
+        if _strip(gs.getSan(move, validMoves)) == text or move.getChessNotation() == text.lower():
+            return move
+    return None
+
+
+#searches one position; solved is None when the position has neither bm nor am
+def solvePosition(position, timeLimit=DEFAULT_TIME_LIMIT, maxDepth=None, selective=SELECTIVE):
+    gs = chessEngine.GameState(position["fen"])
+    validMoves = gs.getValidMoves()
+    operations = position["operations"]
+    bestMoves = [findMove(gs, san, validMoves) for san in operations.get("bm", [])]
+    avoidMoves = [findMove(gs, san, validMoves) for san in operations.get("am", [])]
+    points = {}
+    for san, value in _POINTS.findall(" ".join(operations.get("c0", []))):
+        move = findMove(gs, san, validMoves)
+        if move is not None:
+            points[move] = int(value)
+
+    def isSolution(move):
+        if bestMoves and move not in bestMoves:
+            return False
+        return move not in avoidMoves
+
+    solvedSince = [None]                                    #elapsed time from which every iteration was right
+
+    def onIteration(result):
+        if isSolution(result.bestMove):
+            if solvedSince[0] is None:
+                solvedSince[0] = result.elapsed
+        else:
+            solvedSince[0] = None
+
+    search = NegaMaxSearch(gs, maxDepth or MAX_DEPTH, timeLimit if maxDepth is None else None,
+                           tt=TranspositionTable(), onIteration=onIteration, selective=selective)
+    result = search.search(validMoves)
+    nodes = result.nodes + result.qNodes
+    solved = isSolution(result.bestMove) if bestMoves or avoidMoves else None
+    return {"id": position["id"],
+            "fen": position["fen"],
+            "bm": operations.get("bm", []),
+            "am": operations.get("am", []),
+            "move": gs.getSan(result.bestMove, validMoves) if result.bestMove is not None else None,
+            "score": result.score,
+            "depth": result.depth,
+            "solved": solved,
+            "timeToSolution": solvedSince[0] if solved else None,
+            "points": points.get(result.bestMove, 0),
+            "maxPoints": max(points.values()) if points else 0,
+            "nodes": nodes,
+            "seconds": result.elapsed,
+            "nps": nodes / result.elapsed if result.elapsed > 0 else 0.0}
+
+
+def _solveTask(task):
+    return solvePosition(*task)
+
+
+#results come back in suite order
+def runSuite(positions, timeLimit=DEFAULT_TIME_LIMIT, maxDepth=None, workers=1, report=None, selective=SELECTIVE):
+    tasks = [(position, timeLimit, maxDepth, selective) for position in positions]
+    if workers == 1:
+        finished = map(_solveTask, tasks)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+        finished = executor.map(_solveTask, tasks)
+    results = []
+    try:
+        for result in finished:
+            results.append(result)
+            if report is not None:
+                report(result)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return results
+
+
+def formatResult(result):
+    status = {True: "ok", False: "FAIL", None: "--"}[result["solved"]]
+    expected = " ".join(result["bm"]) if result["bm"] else ("am " + " ".join(result["am"]) if result["am"] else "")
+    solution = "%6.2fs" % result["timeToSolution"] if result["timeToSolution"] is not None else "     - "
+    return "%-16s %-10s %-10s %-4s %s  depth %2d  nodes %8d  %7.0f nps" % (
+        result["id"], expected, result["move"], status, solution, result["depth"], result["nodes"], result["nps"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="solve an EPD test suite and report solved positions and speed")
+    parser.add_argument("files", nargs="+", help="EPD files")
+    parser.add_argument("--time", type=float, default=DEFAULT_TIME_LIMIT,
+                        help="seconds per position (default %(default)s)")
+    parser.add_argument("--depth", type=int, help="fixed depth per position instead of a time limit")
+    parser.add_argument("--workers", type=int, default=1, help="positions searched in parallel (default 1)")
+    parser.add_argument("--selective", nargs="*", choices=SELECTIVE, default=list(SELECTIVE), metavar="TECHNIQUE",
+                        help="selective search techniques to use (default all: %s)" % " ".join(SELECTIVE))
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    positions = []
+    for path in args.files:
+        try:
+            positions.extend(readEpd(path))
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+
+    start = time.perf_counter()
+    results = runSuite(positions, args.time, args.depth, args.workers,
+                       lambda result: print(formatResult(result), flush=True), args.selective)
+    wall = time.perf_counter() - start
+
+    scored = [result for result in results if result["solved"] is not None]
+    solved = [result for result in scored if result["solved"]]
+    nodes = sum(result["nodes"] for result in results)
+    seconds = sum(result["seconds"] for result in results)
+    print("solved %d/%d (%.1f%%)" % (len(solved), len(scored), 100.0 * len(solved) / len(scored) if scored else 0.0))
+    if solved:
+        print("mean time to solution %.2fs" % (sum(result["timeToSolution"] for result in solved) / len(solved)))
+    maxPoints = sum(result["maxPoints"] for result in results)
+    if maxPoints:
+        print("points %d/%d" % (sum(result["points"] for result in results), maxPoints))
+    print("total: %d nodes in %.2fs search time (%.2fs wall), %.0f nps" %
+          (nodes, seconds, wall, nodes / seconds if seconds else 0.0))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python": platform.python_version(),
+                       "timeLimit": None if args.depth else args.time,
+                       "depth": args.depth,
+                       "selective": args.selective,
+                       "solved": len(solved),
+                       "positions": len(scored),
+                       "results": results}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
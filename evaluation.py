@@ -0,0 +1,55 @@
+"""
+evaluation weights for the incremental evaluation kept by GameState
+-> material values, middlegame/endgame piece-square tables and game phase weights
+-> loaded from evalWeights.json so they can be tuned without editing code
+-> tables are signed (black pieces count negative) and already mirrored for black
+"""
+import json
+import os
+
+DEFAULT_WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evalWeights.json")
+PIECE_TYPES = "PRNBQK"
+
+#filled by loadWeights, keyed by piece ("wP", "bK", ...), the dicts are updated in place on reload
+MATERIAL = {}               #signed material value
+MG_TABLES = {}              #64 signed middlegame piece-square values, index = row*8 + col
+EG_TABLES = {}              #64 signed endgame piece-square values
+PHASE = {}                  #game phase weight, the same for both colours
+PIECE_VALUES = {}           #piece letter -> unsigned material value
+MAX_PHASE = 24              #phase of the starting position, recomputed by loadWeights
+
+
+def _readTable(tables, pieceType, path):
+    rows = tables.get(pieceType)
+    if not isinstance(rows, list) or len(rows) != 8 or any(len(row) != 8 for row in rows):
+        raise ValueError("%s: piece-square table %s needs 8 rows of 8 values" % (path, pieceType))
+    return [int(value) for row in rows for value in row]
+
+
+#reads a weights file; GameStates created before a reload have to call computeEvaluation
+def loadWeights(path=DEFAULT_WEIGHTS_FILE):
+    global MAX_PHASE
+    with open(path) as file:
+        weights = json.load(file)
+    try:
+        material = {p: int(weights["material"][p]) for p in PIECE_TYPES}
+        phase = {p: int(weights["phase"][p]) for p in PIECE_TYPES}
+        mgTables = {p: _readTable(weights["pst"]["mg"], p, path) for p in PIECE_TYPES}
+        egTables = {p: _readTable(weights["pst"]["eg"], p, path) for p in PIECE_TYPES}
+    except (KeyError, TypeError) as error:
+        raise ValueError("%s: missing or malformed evaluation weight %s" % (path, error))
+
+    PIECE_VALUES.clear()
+    PIECE_VALUES.update(material)
+    for p in PIECE_TYPES:
+        MATERIAL['w' + p] = material[p]
+        MATERIAL['b' + p] = -material[p]
+        PHASE['w' + p] = PHASE['b' + p] = phase[p]
+        MG_TABLES['w' + p] = mgTables[p]
+        EG_TABLES['w' + p] = egTables[p]
+        MG_TABLES['b' + p] = [-mgTables[p][sq ^ 56] for sq in range(64)]      #sq ^ 56 flips the rank
+        EG_TABLES['b' + p] = [-egTables[p][sq ^ 56] for sq in range(64)]
+    MAX_PHASE = max(1, 2 * (8 * phase['P'] + 2 * (phase['R'] + phase['N'] + phase['B']) + phase['Q'] + phase['K']))
+
+
+loadWeights()
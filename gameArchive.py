@@ -0,0 +1,505 @@
+"""
+game records: compact binary archive and streaming PGN
+-> GameRecord: tags, moves as 16-bit codes (start, end, promotion, flag = the low bits of Move.code) and result
+-> binary archive (.cga): header, game records back to back, offset index at the end
+   every game is read by offset through mmap, the file is never read into memory
+-> PGN is read and written by generators, one game at a time (SAN moves, comments/variations/NAGs skipped)
+-> bulk conversion both ways, games that do not replay are skipped and counted
+-> benchmark: games per second and bytes per game of PGN and the archive (random playouts or a PGN file)
+
+usage:
+    python gameArchive.py convert games.pgn games.cga
+    python gameArchive.py convert games.cga games.pgn
+    python gameArchive.py bench --games 2000
+    python gameArchive.py bench --pgn games.pgn --json bench.json
+"""
+import argparse
+import json
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+import time
+from array import array
+
+import chessEngine
+from chessEngine import Move, PIECE_INDEX, EN_PASSANT
+
+MAGIC = b"CHESSGA1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQ")                #magic, version, number of games, index offset
+GAME_HEADER = struct.Struct("<BBHH")            #result, reserved, plies, tag bytes
+OFFSET = struct.Struct("<Q")
+CODE_MASK = 0xFFFF                              #from, to, promotion and flag bits of Move.code
+
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+RESULT_INDEX = {result: i for i, result in enumerate(RESULTS)}
+#the seven tag roster, written first and in this order
+ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+ROSTER_DEFAULTS = {"Date": "????.??.??"}
+
+DEFAULT_BENCH_GAMES = 1000
+DEFAULT_BENCH_PLIES = 200
+
+
+class GameRecord:
+    def __init__(self, tags=None, codes=(), result="*"):
+        self.tags = dict(tags or {})                #without Result, the result is kept on its own
+        self.tags.pop("Result", None)
+        self.codes = codes if isinstance(codes, array) else array("H", codes)
+        self.result = result
+
+    def __len__(self):
+        return len(self.codes)
+
+    def startFen(self):
+        return self.tags.get("FEN")
+
+    #(gs, move) before every move, the move is made when the generator resumes
+    def replay(self, gs=None):
+        gs = gs or chessEngine.GameState(self.startFen())
+        for code in self.codes:
+            move = decodeMove(gs, code)
+            yield gs, move
+            gs.makeMove(move)
+
+    #GameState with every move made (moveLog filled)
+    def toGameState(self):
+        gs = chessEngine.GameState(self.startFen())
+        for _ in self.replay(gs):
+            pass
+        return gs
+
+
+def encodeMove(move):
+    return move.code & CODE_MASK
+
+
+#Move of a 16-bit code in the position gs, the pieces are read from the board (no legality check)
+def decodeMove(gs, code):
+    board = gs.board
+    start, end = code & 63, (code >> 6) & 63
+    pieceMoved = board[start >> 3][start & 7]
+    if (code >> 14) & 3 == EN_PASSANT:
+        pieceCaptured = "bP" if pieceMoved == "wP" else "wP"
+    else:
+        pieceCaptured = board[end >> 3][end & 7]
+    return Move.fromCode(code | PIECE_INDEX[pieceMoved] << 16 | PIECE_INDEX[pieceCaptured] << 20)
+
+
+#record of a played game (from the start of gs.moveLog)
+def recordFromGameState(gs, tags=None, result="*", startFen=None):
+    tags = dict(tags or {})
+    if startFen is not None and startFen != chessEngine.START_FEN:
+        tags.setdefault("SetUp", "1")
+        tags.setdefault("FEN", startFen)
+    return GameRecord(tags, [encodeMove(move) for move in gs.moveLog], result)
+
+
+#----binary archive----
+
+def _encodeTags(tags):
+    return "".join("%s\0%s\0" % item for item in tags.items()).encode("utf-8")
+
+
+def _decodeTags(data):
+    fields = bytes(data).decode("utf-8").split("\0")
+    return dict(zip(fields[0:-1:2], fields[1:-1:2]))
+
+
+class ArchiveWriter:
+    #games are appended as they come, the index and the header are written by close()
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        self.offsets = array("Q")
+        self.position = HEADER.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, record):
+        tags = _encodeTags(record.tags)
+        codes = record.codes
+        if len(codes) > 0xFFFF or len(tags) > 0xFFFF:
+            raise ValueError("game too long for the archive (%d plies, %d tag bytes)" % (len(codes), len(tags)))
+        if sys.byteorder != "little":
+            codes = array("H", codes)
+            codes.byteswap()
+        self.offsets.append(self.position)
+        self.file.write(GAME_HEADER.pack(RESULT_INDEX.get(record.result, 0), 0, len(codes), len(tags)))
+        self.file.write(tags)
+        self.file.write(codes.tobytes())
+        self.position += GAME_HEADER.size + len(tags) + 2 * len(codes)
+
+    def close(self):
+        if self.file.closed:
+            return
+        offsets = self.offsets
+        if sys.byteorder != "little":
+            offsets = array("Q", offsets)
+            offsets.byteswap()
+        self.file.write(offsets.tobytes())
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(self.offsets), self.position))
+        self.file.close()
+
+
+def writeArchive(path, records):
+    with ArchiveWriter(path) as writer:
+        for record in records:
+            writer.add(record)
+    return len(writer.offsets)
+
+
+class ArchiveReader:
+    #memory mapped archive, archive[i] reads one game through the index
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:                                  #empty file cannot be mapped
+            self.data = b""
+        if len(self.data) < HEADER.size:
+            self.close()
+            raise ValueError("%s is not a game archive" % path)
+        magic, version, self.size, self.indexOffset = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION or self.indexOffset + 8 * self.size > len(self.data):
+            self.close()
+            raise ValueError("%s is not a game archive (or was not closed)" % path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __len__(self):
+        return self.size
+
+    def offset(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("game %d not in archive of %d games" % (index, self.size))
+        return OFFSET.unpack_from(self.data, self.indexOffset + 8 * index)[0]
+
+    #move codes of one game without decoding the tags
+    def codes(self, index):
+        offset = self.offset(index)
+        _, _, plies, tagBytes = GAME_HEADER.unpack_from(self.data, offset)
+        start = offset + GAME_HEADER.size + tagBytes
+        codes = array("H", self.data[start:start + 2 * plies])
+        if sys.byteorder != "little":
+            codes.byteswap()
+        return codes
+
+    def __getitem__(self, index):
+        offset = self.offset(index)
+        result, _, plies, tagBytes = GAME_HEADER.unpack_from(self.data, offset)
+        start = offset + GAME_HEADER.size
+        codes = array("H", self.data[start + tagBytes:start + tagBytes + 2 * plies])
+        if sys.byteorder != "little":
+            codes.byteswap()
+        return GameRecord(_decodeTags(self.data[start:start + tagBytes]), codes, RESULTS[result])
+
+    def __iter__(self):
+        for index in range(self.size):
+            yield self[index]
+
+
+#----PGN----
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN = re.compile(r"[{}();]|[^\s{}();]+")
+_MOVE_NUMBER = re.compile(r"\d+\.*")
+
+
+#(tags, SAN moves, result) of every game of a PGN text file, read line by line
+def iterPgn(file):
+    tags, sans, result = {}, [], None
+    commentDepth = variationDepth = 0
+    inMoves = False
+    for line in file:
+        if commentDepth == 0:
+            if line.startswith("%"):                        #escaped line
+                continue
+            stripped = line.strip()
+            if stripped.startswith("[") and variationDepth == 0:
+                if inMoves:                                 #new game without a termination marker
+                    yield tags, sans, result or tags.get("Result", "*")
+                    tags, sans, result, inMoves = {}, [], None, False
+                match = _TAG.match(stripped)
+                if match:
+                    tags[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                continue
+        for token in _TOKEN.findall(line):
+            if commentDepth:
+                if token == "}":
+                    commentDepth = 0
+                continue
+            if token == "{":
+                commentDepth = 1
+            elif token == ";":
+                break
+            elif token == "(":
+                variationDepth += 1
+            elif token == ")":
+                variationDepth = max(0, variationDepth - 1)
+            elif variationDepth:
+                continue
+            elif token in RESULT_INDEX:
+                yield tags, sans, token
+                tags, sans, result, inMoves = {}, [], None, False
+            elif token[0] == "$":
+                continue
+            else:
+                inMoves = True
+                move = _MOVE_NUMBER.sub("", token, count=1) if token[0].isdigit() else token
+                if move and move[0] not in "!?":
+                    sans.append(move)
+    if inMoves or tags:
+        yield tags, sans, result or tags.get("Result", "*")
+
+
+#GameRecord of parsed PGN, ValueError on an illegal or ambiguous move
+def recordFromPgn(tags, sans, result="*"):
+    gs = chessEngine.GameState(tags.get("FEN"))
+    codes = array("H")
+    for ply, san in enumerate(sans):
+        move = gs.parseSan(san)
+        if move is None:
+            raise ValueError("illegal move %s at ply %d" % (san, ply + 1))
+        codes.append(move.code & CODE_MASK)
+        gs.makeMove(move)
+    return GameRecord(tags, codes, result)
+
+
+#GameRecords of a PGN file; skipErrors drops the games that do not replay instead of raising
+def readPgn(file, skipErrors=False, errors=None):
+    for number, (tags, sans, result) in enumerate(iterPgn(file), 1):
+        try:
+            yield recordFromPgn(tags, sans, result)
+        except ValueError as error:
+            if not skipErrors:
+                raise ValueError("game %d: %s" % (number, error))
+            if errors is not None:
+                errors.append((number, str(error)))
+
+
+#SAN of every move, replayed from the start position of the record
+def sanMoves(record):
+    gs = chessEngine.GameState(record.startFen())
+    sans = []
+    for code in record.codes:
+        move = decodeMove(gs, code)
+        san = gs.getSan(move, checkSuffix=False)
+        gs.makeMove(move)
+        sans.append(san + gs.checkSuffix())
+    return sans
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def formatPgn(record):
+    gs = chessEngine.GameState(record.startFen())
+    tags = dict(record.tags, Result=record.result)
+    if "FEN" in tags:
+        tags.setdefault("SetUp", "1")
+    lines = ['[%s "%s"]' % (name, _escape(tags.get(name, ROSTER_DEFAULTS.get(name, "?")))) for name in ROSTER]
+    lines += ['[%s "%s"]' % (name, _escape(value)) for name, value in tags.items() if name not in ROSTER]
+    lines.append("")
+    tokens = []
+    for code in record.codes:
+        move = decodeMove(gs, code)
+        if gs.whiteToMove:
+            tokens.append("%d." % gs.fullmoveNumber)
+        elif not tokens:
+            tokens.append("%d..." % gs.fullmoveNumber)
+        san = gs.getSan(move, checkSuffix=False)
+        gs.makeMove(move)                                   #check marks from the position after the move
+        tokens.append(san + gs.checkSuffix())
+    tokens.append(record.result)
+    line = ""
+    for token in tokens:                                    #PGN lines stay under 80 characters
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+#writes the records as they come, returns the number of games
+def writePgn(file, records):
+    count = 0
+    for record in records:
+        file.write(formatPgn(record))
+        count += 1
+    return count
+
+
+#----conversion----
+
+def isArchive(path):
+    try:
+        with open(path, "rb") as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+#PGN -> archive or archive -> PGN by the source format, returns (games written, [(game number, error)])
+def convert(source, destination):
+    errors = []
+    if isArchive(source):
+        with ArchiveReader(source) as reader, open(destination, "w", encoding="utf-8") as file:
+            return writePgn(file, reader), errors
+    with open(source, encoding="utf-8", errors="replace") as file:
+        return writeArchive(destination, readPgn(file, skipErrors=True, errors=errors)), errors
+
+
+#----benchmark----
+
+#random playouts from the start position, seeded
+def randomGames(count, maxPlies=DEFAULT_BENCH_PLIES, seed=0):
+    rng = random.Random(seed)
+    for number in range(1, count + 1):
+        gs = chessEngine.GameState()
+        result = "*"
+        while len(gs.moveLog) < maxPlies:
+            validMoves = gs.getValidMoves()
+            if not validMoves:
+                result = ("0-1" if gs.whiteToMove else "1-0") if gs.checkMate else "1/2-1/2"
+                break
+            gs.makeMove(rng.choice(validMoves))
+        tags = {"Event": "random playout", "Site": "gameArchive.py", "Round": str(number),
+                "White": "random", "Black": "random"}
+        yield recordFromGameState(gs, tags, result)
+
+
+def _timed(function):
+    start = time.perf_counter()
+    value = function()
+    return value, time.perf_counter() - start
+
+
+def runBenchmark(records, directory=None):
+    directory = directory or tempfile.mkdtemp(prefix="gameArchive")
+    pgnPath = os.path.join(directory, "bench.pgn")
+    archivePath = os.path.join(directory, "bench.cga")
+    games = len(records)
+    plies = sum(len(record) for record in records)
+
+    def writePgnFile():
+        with open(pgnPath, "w", encoding="utf-8") as file:
+            return writePgn(file, records)
+
+    def readPgnFile():
+        with open(pgnPath, encoding="utf-8") as file:
+            return sum(1 for _ in readPgn(file))
+
+    def scanPgnFile():
+        with open(pgnPath, encoding="utf-8") as file:
+            return sum(1 for _ in iterPgn(file))
+
+    def readArchive():
+        with ArchiveReader(archivePath) as reader:
+            return sum(1 for _ in reader)
+
+    def randomAccess():
+        rng = random.Random(1)
+        with ArchiveReader(archivePath) as reader:
+            return sum(len(reader.codes(rng.randrange(games))) for _ in range(games))
+
+    def replayArchive():
+        with ArchiveReader(archivePath) as reader:
+            return sum(len(record.toGameState().moveLog) for record in reader)
+
+    timings = {}
+    for name, function in (("pgnWrite", writePgnFile), ("pgnScan", scanPgnFile), ("pgnRead", readPgnFile),
+                           ("archiveWrite", lambda: writeArchive(archivePath, records)),
+                           ("archiveRead", readArchive), ("archiveRandomAccess", randomAccess),
+                           ("archiveReplay", replayArchive)):
+        _, seconds = _timed(function)
+        timings[name] = {"seconds": seconds, "gamesPerSecond": games / seconds if seconds > 0 else 0.0}
+    pgnBytes, archiveBytes = os.path.getsize(pgnPath), os.path.getsize(archivePath)
+    return {"games": games,
+            "plies": plies,
+            "pgnBytesPerGame": pgnBytes / games,
+            "archiveBytesPerGame": archiveBytes / games,
+            "archiveMoveBytesPerGame": 2 * plies / games,
+            "timings": timings}
+
+
+def formatBenchmark(report):
+    lines = ["%d games, %.1f plies per game" % (report["games"], report["plies"] / report["games"]),
+             "bytes per game: PGN %.0f, archive %.0f (moves %.0f)" % (
+                 report["pgnBytesPerGame"], report["archiveBytesPerGame"], report["archiveMoveBytesPerGame"])]
+    for name, timing in report["timings"].items():
+        lines.append("%-20s %8.3fs %10.0f games/s" % (name, timing["seconds"], timing["gamesPerSecond"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="binary game archive and streaming PGN")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convertParser = commands.add_parser("convert", help="PGN -> archive or archive -> PGN (by the source format)")
+    convertParser.add_argument("source")
+    convertParser.add_argument("destination")
+    benchParser = commands.add_parser("bench", help="games per second and bytes per game of both formats")
+    benchParser.add_argument("--games", type=int, default=DEFAULT_BENCH_GAMES,
+                             help="random playouts to benchmark (default %(default)s)")
+    benchParser.add_argument("--max-plies", type=int, default=DEFAULT_BENCH_PLIES,
+                             help="length limit of the playouts (default %(default)s)")
+    benchParser.add_argument("--seed", type=int, default=0)
+    benchParser.add_argument("--pgn", help="benchmark the games of this PGN file instead")
+    benchParser.add_argument("--json", metavar="FILE", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        start = time.perf_counter()
+        try:
+            games, errors = convert(args.source, args.destination)
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+        seconds = time.perf_counter() - start
+        for number, error in errors:
+            print("skipped game %d: %s" % (number, error), file=sys.stderr)
+        print("%d games in %.2fs (%.0f games/s), %d skipped, %s %d bytes" % (
+            games, seconds, games / seconds if seconds > 0 else 0.0, len(errors), args.destination,
+            os.path.getsize(args.destination)))
+        return 0
+
+    if args.pgn:
+        with open(args.pgn, encoding="utf-8", errors="replace") as file:
+            records = list(readPgn(file, skipErrors=True))
+    else:
+        records = list(randomGames(args.games, args.max_plies, args.seed))
+    if not records:
+        parser.error("no games to benchmark")
+    with tempfile.TemporaryDirectory(prefix="gameArchive") as directory:
+        report = runBenchmark(records, directory)
+    print(formatBenchmark(report))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
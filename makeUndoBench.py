@@ -0,0 +1,121 @@
+"""
+make/undo micro-benchmark of GameState
+-> times makeMove + undoMove pairs over every legal move of the perft.py positions (no move generation)
+-> memory per made move: bytes still held after a long line of makeMove calls, divided by the plies
+-> transient allocation per pair: tracemalloc peak above the current size while one move is made and undone
+-> --json writes the numbers to compare runs across releases
+
+usage:
+    python makeUndoBench.py
+    python makeUndoBench.py --repeat 200 --json makeundo.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import chessEngine
+from perft import POSITIONS
+
+DEFAULT_REPEAT = 1000
+LINE_PLIES = 2000               #length of the line played for the memory per move figure
+BENCH_POSITIONS = 6             #the perft.py positions with a full middlegame, the edge cases are tiny
+
+
+def positionMoves(count=BENCH_POSITIONS):
+    positions = []
+    for name, fen, _ in POSITIONS[:count]:
+        gs = chessEngine.GameState(fen)
+        positions.append((name, gs, gs.getValidMoves()))
+    return positions
+
+
+#seconds for repeat rounds of makeMove/undoMove over every move of every position, and the pairs played
+def timeMakeUndo(positions, repeat):
+    pairs = 0
+    start = time.perf_counter()
+    for _, gs, moves in positions:
+        makeMove, undoMove = gs.makeMove, gs.undoMove
+        for _ in range(repeat):
+            for move in moves:
+                makeMove(move)
+                undoMove()
+        pairs += repeat * len(moves)
+    return time.perf_counter() - start, pairs
+
+
+#average and largest tracemalloc peak above the current size while one move is made and undone
+def transientBytes(positions):
+    sizes = []
+    tracemalloc.start()
+    try:
+        for _, gs, moves in positions:
+            for move in moves:
+                gs.makeMove(move)                           #warm up, a first push may grow a stack
+                gs.undoMove()
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                gs.makeMove(move)
+                gs.undoMove()
+                sizes.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return sum(sizes) / len(sizes), max(sizes)
+
+
+#knights going back and forth: no captures or pawn moves, so nothing but the undo state piles up
+def retainedBytes(plies=LINE_PLIES):
+    gs = chessEngine.GameState()
+    shuffle = []
+    for start, end in ((7, 6), (5, 5)), ((0, 6), (2, 5)), ((5, 5), (7, 6)), ((2, 5), (0, 6)):
+        shuffle.append(chessEngine.Move(start, end, gs.board))
+        gs.makeMove(shuffle[-1])
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for ply in range(plies):
+            gs.makeMove(shuffle[ply % 4])
+        retained = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return retained / plies
+
+
+def runBench(repeat=DEFAULT_REPEAT):
+    positions = positionMoves()
+    timeMakeUndo(positions, 1)                              #warm up
+    seconds, pairs = timeMakeUndo(positions, repeat)
+    averageTransient, maxTransient = transientBytes(positions)
+    return {"pairs": pairs,
+            "seconds": seconds,
+            "nsPerPair": 1e9 * seconds / pairs,
+            "pairsPerSecond": pairs / seconds,
+            "transientBytes": averageTransient,
+            "maxTransientBytes": maxTransient,
+            "bytesPerPly": retainedBytes()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="makeMove/undoMove time and memory")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="rounds over the moves of every position (default %(default)s)")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    result = runBench(args.repeat)
+    print("make/undo: %d pairs in %.2fs, %.0f ns per pair, %.0f pairs/s" % (
+        result["pairs"], result["seconds"], result["nsPerPair"], result["pairsPerSecond"]))
+    print("allocated while a move is made and undone: %.0f bytes on average, %d at most" % (
+        result["transientBytes"], result["maxTransientBytes"]))
+    print("held per made move: %.1f bytes" % result["bytesPerPly"])
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(dict(result, time=time.strftime("%Y-%m-%dT%H:%M:%S"), python=platform.python_version()),
+                      file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+move ordering for the AI search, sits between GameState.getValidMoves and the search
+-> hash move first, then promotions, captures (MVV-LVA), killer moves
+-> quiet moves ordered by a history table kept across iterations
+-> the same scores sort the stages of GameState.stagedMoves (captureScore, quietScore)
+-> counts how often the first move searched gives the cutoff
+"""
+from chessEngine import PIECE_NAMES, EMPTY_INDEX, PROMOTION, PROMOTION_PIECES, MOVE_MASK
+
+HASH_MOVE_SCORE = 1000000
+PROMOTION_SCORE = 900000
+CAPTURE_SCORE = 800000
+KILLER_SCORE = 700000           #first killer, the second one gets one less
+
+
+class MoveOrderer:
+    #pieceValues maps piece letter -> value (SmartMoveFinder.pieceScore), maxPly bounds the killer table
+    def __init__(self, pieceValues, maxPly):
+        self.pieceValues = pieceValues
+        self.indexValues = [pieceValues[piece[1]] if piece != "--" else 0 for piece in PIECE_NAMES]
+        self.killers = [[None, None] for _ in range(maxPly + 1)]                  #2 quiet cutoff moves per ply
+        self.history = [[0] * 64 for _ in PIECE_NAMES]                           #[piece moved][end square]
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+
+    #sorts moves in place, best candidates first
+    def orderMoves(self, moves, hashMove=None, ply=0):
+        killer1, killer2 = self.killers[ply] if ply < len(self.killers) else (None, None)
+        hashCode = hashMove.code & MOVE_MASK if hashMove is not None else -1
+        killer1 = killer1.code & MOVE_MASK if killer1 is not None else -1
+        killer2 = killer2.code & MOVE_MASK if killer2 is not None else -1
+        history = self.history
+        values = self.indexValues
+        pieceScore = self.pieceValues
+
+        def moveScore(move):
+            code = move.code
+            key = code & MOVE_MASK
+            if key == hashCode:
+                return HASH_MOVE_SCORE
+            captured = (code >> 20) & 15
+            if (code >> 14) & 3 == PROMOTION:                           #queen first, underpromotions last
+                return PROMOTION_SCORE + 100 * pieceScore[PROMOTION_PIECES[(code >> 12) & 3]] + values[captured]
+            if captured != EMPTY_INDEX:                                 #most valuable victim, least valuable attacker
+                return CAPTURE_SCORE + 100 * values[captured] - values[(code >> 16) & 15]
+            if key == killer1:
+                return KILLER_SCORE
+            if key == killer2:
+                return KILLER_SCORE - 1
+            return history[(code >> 16) & 15][(code >> 6) & 63]
+
+        moves.sort(key=moveScore, reverse=True)
+        return moves
+
+    #sort keys of the capture and quiet stages of GameState.stagedMoves, same scores as orderMoves
+    def captureScore(self, move):
+        code = move.code
+        values = self.indexValues
+        captured = (code >> 20) & 15
+        if (code >> 14) & 3 == PROMOTION:
+            return PROMOTION_SCORE + 100 * self.pieceValues[PROMOTION_PIECES[(code >> 12) & 3]] + values[captured]
+        return CAPTURE_SCORE + 100 * values[captured] - values[(code >> 16) & 15]
+
+    def quietScore(self, move):
+        code = move.code
+        return self.history[(code >> 16) & 15][(code >> 6) & 63]
+
+    #called when move caused a beta cutoff, index is its position in the ordered list
+    def recordCutoff(self, move, depth, ply, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.firstMoveCutoffs += 1
+        code = move.code
+        if (code >> 20) & 15 != EMPTY_INDEX or (code >> 14) & 3 == PROMOTION:   #captures are already ordered well
+            return
+        self.history[(code >> 16) & 15][(code >> 6) & 63] += depth * depth
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+    def stats(self):
+        return {"cutoffs": self.cutoffs,
+                "firstMoveCutoffs": self.firstMoveCutoffs,
+                "firstMoveCutoffRate": self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0}
@@ -0,0 +1,231 @@
+"""
+root split parallel search over a process pool (the GIL keeps threads on one core)
+-> every iteration searches the first root move with a full window to get alpha
+-> the other root moves go to the workers with a null window around alpha, the first move
+   that fails high is searched again with an open window for the new alpha and the other
+   fail highs go back to the workers against it
+-> every task gets its own transposition table, so the result does not depend on
+   which worker ran what: same position + depth + seed gives the same move and score
+-> seed shuffles the root moves before ordering (variety between games, like findBestMove)
+-> speedup benchmark over fixed middlegame positions
+
+usage:
+    python parallelSearch.py                     #benchmark 1, 2, 4, ... workers up to the core count
+    python parallelSearch.py --workers 1 4 16 --depth 5 --json parallel.json
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import chessEngine
+from chessEngine import Move
+from SmartMoveFinder import (NegaMaxSearch, SearchResult, SearchAborted, CHECKMATE, MATE_BOUND, DEPTH,
+                             MAX_DEPTH)
+from transpositionTable import TranspositionTable
+
+TASK_TT_SIZE = 1 << 16
+
+#name, FEN, all middlegames with plenty of moves to split
+BENCH_POSITIONS = [
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"),
+    ("italian", "r1bq1rk1/pppp1ppp/2n2n2/2b1p3/2B1P3/2PP1N2/PP3PPP/RNBQ1RK1 b - - 0 6"),
+    ("queensGambit", "r1bq1rk1/pp1nbppp/2p1pn2/3p2B1/2PP4/2NBPN2/PP3PPP/R2QK2R w KQ - 0 8"),
+    ("sicilian", "r1b1kb1r/1pqp1ppp/p1n1pn2/8/3NP3/2N1B3/PPP1BPPP/R2QK2R w KQkq - 0 8"),
+]
+DEFAULT_BENCH_DEPTH = 4
+
+
+#one root move searched with the window alpha, beta (root's point of view)
+#returns (score, pv codes, nodes, qNodes) or None if the deadline passed
+def searchRootMove(gs, code, depth, alpha, beta, deadline=None):
+    search = NegaMaxSearch(gs, depth, tt=TranspositionTable(TASK_TT_SIZE))
+    search.rootDepth = depth                                #bounds the check extensions like searchRoot does
+    if deadline is not None:
+        search.deadline = time.perf_counter() + (deadline - time.time())
+    logLength = len(gs.moveLog)
+    gs.makeMove(Move.fromCode(code))
+    try:
+        for d in range(1, depth - 1):                       #shallow iterations fill the table for ordering
+            search.negaMax(d, -beta, -alpha, 1, [])
+        pv = []
+        score = -search.negaMax(depth - 1, -beta, -alpha, 1, pv)
+    except SearchAborted:
+        return None
+    finally:
+        while len(gs.moveLog) > logLength:
+            gs.undoMove()
+    return score, [code] + [m.code for m in pv], search.nodes, search.qNodes
+
+
+def _searchTask(task):
+    return searchRootMove(*task)
+
+
+class ParallelSearch:
+    #workers=None uses every core, workers=1 searches in this process without a pool
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+        self.nodes = 0
+        self.qNodes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def mapTasks(self, tasks):
+        if self.workers == 1:
+            return [_searchTask(task) for task in tasks]
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        return list(self.executor.map(_searchTask, tasks))
+
+    def search(self, gs, validMoves, maxDepth=DEPTH, timeLimit=None, seed=None):
+        startTime = time.perf_counter()
+        deadline = time.time() + timeLimit if timeLimit is not None else None
+        rootMoves = list(validMoves)
+        random.Random(seed).shuffle(rootMoves)
+        NegaMaxSearch(gs, 1).orderer.orderMoves(rootMoves)
+        byCode = {move.code: move for move in rootMoves}
+        result = SearchResult(rootMoves[0] if rootMoves else None, 0, 0, rootMoves[:1], 0, 0.0)
+        self.nodes = self.qNodes = 0
+
+        for depth in range(1, min(maxDepth, MAX_DEPTH) + 1):
+            if not rootMoves:
+                break
+            best = self.searchIteration(gs, rootMoves, depth, deadline)
+            if best is None:                                    #out of time, keep the last full iteration
+                break
+            alpha, bestPv = best
+            pv = [byCode[bestPv[0]]] + [Move.fromCode(code) for code in bestPv[1:]]
+            result = SearchResult(pv[0], alpha, depth, pv, self.nodes, time.perf_counter() - startTime,
+                                  qNodes=self.qNodes)
+            rootMoves.remove(pv[0])                             #best move first next iteration
+            rootMoves.insert(0, pv[0])
+            if abs(alpha) > MATE_BOUND:
+                break
+
+        result.nodes = self.nodes
+        result.qNodes = self.qNodes
+        result.elapsed = time.perf_counter() - startTime
+        return result
+
+    #(score, pv codes) of the best root move at depth, None when the deadline passed
+    #only the order of rootMoves decides ties, not which worker finishes first
+    def searchIteration(self, gs, rootMoves, depth, deadline):
+        candidate = rootMoves[0]
+        pending = rootMoves[1:]
+        alpha = -CHECKMATE - 1
+        bestPv = None
+        while True:
+            reply = self.countNodes([_searchTask((gs, candidate.code, depth, alpha, CHECKMATE + 1, deadline))])
+            if reply is None:
+                return None
+            if reply[0][0] > alpha:
+                alpha, bestPv = reply[0][0], reply[0][1]
+            replies = self.countNodes(self.mapTasks([(gs, move.code, depth, alpha, alpha + 1, deadline)
+                                                     for move in pending]))
+            if replies is None:
+                return None
+            failHigh = [move for move, reply in zip(pending, replies) if reply[0] > alpha]
+            if not failHigh:
+                return alpha, bestPv
+            candidate = failHigh[0]                             #open window search for the new alpha
+            pending = failHigh[1:]
+
+    #adds up the nodes of finished tasks, None if any of them ran out of time
+    def countNodes(self, replies):
+        for reply in replies:
+            if reply is not None:
+                self.nodes += reply[2]
+                self.qNodes += reply[3]
+        return None if any(reply is None for reply in replies) else replies
+
+
+#one shot search with its own pool, see ParallelSearch to keep the workers between moves
+def findBestMoveParallel(gs, validMoves, maxDepth=None, timeLimit=None, workers=None, seed=None):
+    if maxDepth is None:
+        maxDepth = MAX_DEPTH if timeLimit is not None else DEPTH
+    with ParallelSearch(workers) as search:
+        return search.search(gs, validMoves, maxDepth, timeLimit, seed)
+
+
+def runBenchmark(workerCounts, depth=DEFAULT_BENCH_DEPTH, seed=0, report=None):
+    results = []
+    for workers in workerCounts:
+        with ParallelSearch(workers) as search:
+            gs = chessEngine.GameState()
+            search.search(gs, gs.getValidMoves(), 2)                        #start the pool outside the timing
+            for name, fen in BENCH_POSITIONS:
+                gs = chessEngine.GameState(fen)
+                searchResult = search.search(gs, gs.getValidMoves(), depth, seed=seed)
+                result = {"name": name,
+                          "workers": workers,
+                          "depth": searchResult.depth,
+                          "bestMove": searchResult.bestMove.getChessNotation(),
+                          "score": searchResult.score,
+                          "nodes": searchResult.nodes + searchResult.qNodes,
+                          "seconds": searchResult.elapsed}
+                results.append(result)
+                if report is not None:
+                    report(result)
+    return results
+
+
+def main(argv=None):
+    cores = os.cpu_count() or 1
+    defaultWorkers = [1]
+    while defaultWorkers[-1] * 2 <= cores:
+        defaultWorkers.append(defaultWorkers[-1] * 2)
+    parser = argparse.ArgumentParser(description="speedup of the root split parallel search per worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=defaultWorkers,
+                        help="worker counts to compare (default: powers of 2 up to %d cores)" % cores)
+    parser.add_argument("--depth", type=int, default=DEFAULT_BENCH_DEPTH, help="search depth (default %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="root move shuffle seed (default %(default)s)")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = runBenchmark(args.workers, args.depth, args.seed, lambda result: print(
+        "%-14s workers %2d  depth %d  %-6s %6d  nodes %8d  %6.2fs" % (
+            result["name"], result["workers"], result["depth"], result["bestMove"], result["score"],
+            result["nodes"], result["seconds"]), flush=True))
+
+    seconds = {}
+    for result in results:
+        seconds[result["workers"]] = seconds.get(result["workers"], 0.0) + result["seconds"]
+    base = seconds[args.workers[0]]
+    for workers in args.workers:
+        print("workers %2d: %7.2fs  speedup %.2fx" % (workers, seconds[workers], base / seconds[workers]))
+    moves = {}
+    for result in results:
+        moves.setdefault(result["name"], set()).add((result["bestMove"], result["score"]))
+    mismatched = sorted(name for name in moves if len(moves[name]) > 1)
+    if mismatched:
+        print("results differ between worker counts: " + ", ".join(mismatched))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python": platform.python_version(),
+                       "cores": cores,
+                       "depth": args.depth,
+                       "seconds": seconds,
+                       "results": results}, file, indent=2)
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+perft: counts the leaf nodes of the move tree to a fixed depth
+-> correctness check of getValidMoves/makeMove/undoMove against published counts
+-> benchmark of raw move generation speed (nodes per second)
+-> divide output per root move, optional JSON report for tracking regressions
+
+usage:
+    python perft.py                              #whole suite, every depth up to --max-nodes leaves
+    python perft.py --position kiwipete --depth 3 --divide
+    python perft.py --fen "<fen>" --depth 4
+    python perft.py --json perft.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import chessEngine
+
+#name, FEN, {depth: leaf nodes}
+POSITIONS = [
+    ("start", chessEngine.START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    #en passant and castling edge cases, shallow depths so the default run checks them too
+    ("illegalEnPassant1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {1: 18, 2: 92, 3: 1670, 4: 10138, 6: 1134888}),
+    ("illegalEnPassant2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", {1: 13, 2: 102, 3: 1266, 4: 10276, 6: 1015133}),
+    ("enPassantGivesCheck", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", {1: 15, 2: 126, 3: 1928, 4: 13931, 6: 1440467}),
+    ("shortCastleGivesCheck", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", {1: 15, 2: 66, 3: 1198, 4: 6399, 6: 661072}),
+    ("longCastleGivesCheck", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", {1: 16, 2: 71, 3: 1286, 4: 7418, 6: 803711}),
+    ("castleRights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", {1: 26, 2: 1141, 3: 27826, 4: 1274206}),
+    ("castlingPrevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {1: 44, 2: 1494, 3: 50509, 4: 1720476}),
+    ("promoteOutOfCheck", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", {1: 11, 2: 133, 3: 1442, 4: 19174, 6: 3821001}),
+    ("discoveredCheck", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", {1: 29, 2: 165, 3: 5160, 4: 31961, 5: 1004658}),
+    ("promoteToGiveCheck", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", {1: 9, 2: 40, 3: 472, 4: 2661, 6: 217342}),
+    ("underpromoteToGiveCheck", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", {1: 6, 2: 27, 3: 273, 4: 1329, 6: 92683}),
+    ("selfStalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", {1: 2, 2: 6, 3: 13, 4: 63, 6: 2217}),
+    ("stalemateAndCheckmate1", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", {1: 10, 2: 25, 3: 268, 4: 926, 7: 567584}),
+    ("stalemateAndCheckmate2", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {1: 37, 2: 183, 3: 6559, 4: 23527}),
+]
+POSITIONS_BY_NAME = {name: (fen, counts) for name, fen, counts in POSITIONS}
+
+DEFAULT_MAX_NODES = 100000
+
+
+#number of leaf nodes depth plies below gs (the last ply is counted, not played)
+def perft(gs, depth):
+    if depth <= 0:
+        return 1
+    moves = gs.getValidMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+#leaf nodes below every root move, keyed by its notation
+def divide(gs, depth):
+    counts = {}
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts[move.getChessNotation()] = perft(gs, depth - 1)
+        gs.undoMove()
+    return counts
+
+
+def runPerft(fen, depth, name=None, expected=None, withDivide=False):
+    gs = chessEngine.GameState(fen)
+    start = time.perf_counter()
+    if withDivide:
+        counts = divide(gs, depth)
+        nodes = sum(counts.values())
+    else:
+        counts = None
+        nodes = perft(gs, depth)
+    seconds = time.perf_counter() - start
+    return {"name": name,
+            "fen": fen,
+            "depth": depth,
+            "nodes": nodes,
+            "expected": expected,
+            "ok": None if expected is None else nodes == expected,
+            "seconds": seconds,
+            "nps": nodes / seconds if seconds > 0 else 0.0,
+            "divide": counts}
+
+
+#every known depth of every position whose leaf count stays within maxNodes
+def runSuite(maxNodes=DEFAULT_MAX_NODES, names=None, report=None):
+    results = []
+    for name, fen, counts in POSITIONS:
+        if names and name not in names:
+            continue
+        for depth in sorted(counts):
+            if counts[depth] > maxNodes:
+                break
+            result = runPerft(fen, depth, name, counts[depth])
+            results.append(result)
+            if report is not None:
+                report(result)
+    return results
+
+
+def formatResult(result):
+    status = {True: "ok", False: "FAIL", None: "--"}[result["ok"]]
+    line = "%-24s depth %d  nodes %10d  %6.2fs  %9.0f nps  %s" % (
+        result["name"] or "fen", result["depth"], result["nodes"], result["seconds"], result["nps"], status)
+    if result["ok"] is False:
+        line += " (expected %d)" % result["expected"]
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="perft correctness suite and move generation benchmark")
+    parser.add_argument("--position", choices=sorted(POSITIONS_BY_NAME), help="named test position")
+    parser.add_argument("--fen", help="position to walk instead of a named one")
+    parser.add_argument("--depth", type=int, help="single depth to run (default: suite depths)")
+    parser.add_argument("--divide", action="store_true", help="print the leaf count below every root move")
+    parser.add_argument("--max-nodes", type=int, default=DEFAULT_MAX_NODES,
+                        help="suite mode: skip depths with more expected leaves (default %(default)s)")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.fen or args.depth:
+        if args.fen:
+            name, fen, counts = None, args.fen, {}
+            try:
+                chessEngine.GameState(fen)
+            except ValueError as error:
+                parser.error(str(error))
+        else:
+            name = args.position or "start"
+            fen, counts = POSITIONS_BY_NAME[name]
+        depth = args.depth or 3
+        results = [runPerft(fen, depth, name, counts.get(depth), args.divide)]
+        if args.divide:
+            for notation, nodes in sorted(results[0]["divide"].items()):
+                print("%s: %d" % (notation, nodes))
+        print(formatResult(results[0]))
+    else:
+        names = [args.position] if args.position else None
+        results = runSuite(args.max_nodes, names, lambda result: print(formatResult(result), flush=True))
+
+    totalNodes = sum(result["nodes"] for result in results)
+    totalSeconds = sum(result["seconds"] for result in results)
+    failed = [result for result in results if result["ok"] is False]
+    print("total: %d nodes in %.2fs, %.0f nps, %d failed" %
+          (totalNodes, totalSeconds, totalNodes / totalSeconds if totalSeconds else 0.0, len(failed)))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python": platform.python_version(),
+                       "totalNodes": totalNodes,
+                       "totalSeconds": totalSeconds,
+                       "results": results}, file, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
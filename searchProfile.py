@@ -0,0 +1,81 @@
+"""
+search instrumentation report over fixed middlegame positions
+-> runs NegaMaxSearch on the benchmark positions of parallelSearch.py and prints its SearchStats
+-> --profile timing|cprofile|sample adds where the time goes (see searchStats.py)
+-> --json writes every position's stats, --csv appends one row per position (trends across releases)
+
+usage:
+    python searchProfile.py --depth 4 --profile timing
+    python searchProfile.py --depth 5 --csv trend.csv --label 1.4.0
+    python searchProfile.py --fen "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3" --profile cprofile
+"""
+import argparse
+import sys
+
+import chessEngine
+from parallelSearch import BENCH_POSITIONS, DEFAULT_BENCH_DEPTH
+from SmartMoveFinder import NegaMaxSearch
+from searchStats import PROFILES, TIMED_METHODS, writeJson, appendCsv
+from transpositionTable import TranspositionTable
+
+
+#SearchStats of one position searched with a fresh table
+def profilePosition(fen, depth, profile=None):
+    gs = chessEngine.GameState(fen)
+    search = NegaMaxSearch(gs, depth, tt=TranspositionTable(), profile=profile)
+    return search.search(gs.getValidMoves()).stats
+
+
+def formatStats(name, stats):
+    lines = ["%-14s depth %2d  nodes %8d  qnodes %8d  %6.2fs  %7.0f nps" % (
+        name, stats.depth, stats.nodes, stats.qNodes, stats.elapsed, stats.nps())]
+    lines.append("    branching %.2f (%s)  cutoffs %.1f%% (first move %.1f%%)  tt hits %.1f%%" % (
+        stats.branchingFactor(), " ".join("%.1f" % factor for factor in stats.branchingFactors()),
+        100 * stats.cutoffRate(), 100 * stats.firstMoveCutoffRate(), 100 * stats.ttHitRate()))
+    if stats.timings:
+        lines.append("    " + "  ".join("%s %.3fs (%.0f%%, %d calls)" % (
+            name, stats.timings[name], 100 * stats.timings[name] / stats.elapsed if stats.elapsed else 0,
+            stats.calls[name]) for name in TIMED_METHODS))
+    for function in stats.functions[:10]:
+        if "cumulativeTime" in function:
+            lines.append("    %8.3fs cum %8.3fs own %9d calls  %s" % (
+                function["cumulativeTime"], function["time"], function["calls"], function["function"]))
+        else:
+            lines.append("    %5.1f%% of samples  %s" % (100 * function["share"], function["function"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="search statistics and profiling over fixed positions")
+    parser.add_argument("--depth", type=int, default=DEFAULT_BENCH_DEPTH, help="search depth (default %(default)s)")
+    parser.add_argument("--profile", choices=PROFILES, help="profile the searches")
+    parser.add_argument("--fen", action="append", help="position to search instead of the benchmark set")
+    parser.add_argument("--json", metavar="FILE", help="write the stats of every position as JSON")
+    parser.add_argument("--csv", metavar="FILE", help="append one row per position")
+    parser.add_argument("--label", default="", help="label of the CSV/JSON rows, e.g. a release")
+    args = parser.parse_args(argv)
+
+    positions = [("fen%d" % i, fen) for i, fen in enumerate(args.fen, 1)] if args.fen else BENCH_POSITIONS
+    names, statsList = [], []
+    for name, fen in positions:
+        try:
+            stats = profilePosition(fen, args.depth, args.profile)
+        except ValueError as error:
+            parser.error(str(error))
+        print(formatStats(name, stats), flush=True)
+        names.append(name)
+        statsList.append(stats)
+
+    nodes = sum(stats.nodes + stats.qNodes for stats in statsList)
+    seconds = sum(stats.elapsed for stats in statsList)
+    print("total: %d nodes in %.2fs, %.0f nps" % (nodes, seconds, nodes / seconds if seconds else 0.0))
+    if args.json:
+        writeJson(args.json, statsList, ["%s %s" % (args.label, name) if args.label else name for name in names])
+    if args.csv:
+        for name, stats in zip(names, statsList):
+            appendCsv(args.csv, [stats], "%s %s" % (args.label, name) if args.label else name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
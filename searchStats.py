@@ -0,0 +1,290 @@
+"""
+search statistics returned with every NegaMaxSearch result (SearchResult.stats)
+-> nodes, quiescence nodes, cutoff and transposition table hit rates
+-> branching factor from the nodes per ply of the last completed iteration (horizon nodes included),
+   effective branching factor from the nodes of the last two iterations
+-> how often each selective search technique fired (null move cutoffs, reductions, pruned moves, ...)
+-> how many nodes got by without generating their captures or quiet moves (GameState.stagedMoves)
+-> opt-in profiling of one search (NegaMaxSearch(..., profile=...)):
+   "timing"  time spent in getValidMoves, getCaptureMoves, makeMove, undoMove and evaluate
+   "cprofile" cProfile over the search, the slowest functions end up in the stats
+   "sample"  a sampling profiler thread, counts the functions seen on the search thread's stack
+-> toDict/JSON and CSV export to chart trends across releases
+-> without a profile only plain counters are kept, the search itself is not wrapped
+-> stats come from NegaMaxSearch only, the greedy and minimax searches (findBestMove/findBestMoveMinMax) keep none
+"""
+import cProfile
+import csv
+import json
+import os
+import sys
+import threading
+import time
+import types
+
+PROFILES = ("timing", "cprofile", "sample")
+TIMED_METHODS = ("getValidMoves", "getCaptureMoves", "makeMove", "undoMove", "evaluate", "getQuietMoves")
+TOP_FUNCTIONS = 25                  #functions kept from a cProfile or sampling run
+SAMPLE_INTERVAL = 0.001             #seconds between samples (the GIL switch interval limits the real rate)
+
+#the flat summary written as one CSV row
+CSV_FIELDS = ("label", "time", "depth", "nodes", "qNodes", "elapsed", "nps", "branchingFactor", "cutoffRate",
+              "firstMoveCutoffRate", "ttHitRate") + tuple(name + "Time" for name in TIMED_METHODS)
+
+
+class SearchStats:
+    def __init__(self, maxPly):
+        self.nodes = 0
+        self.qNodes = 0
+        self.depth = 0                          #last completed iteration
+        self.elapsed = 0.0
+        self.nodesPerPly = [0] * (maxPly + 1)   #main search nodes at each distance from the root, last iteration
+        self.iterationNodes = []                #main and quiescence nodes of every completed iteration
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.ttStores = 0
+        self.selective = ()                     #selective search techniques that were switched on
+        self.nullMoveCutoffs = 0
+        self.lmrReductions = 0
+        self.lmrResearches = 0                  #reduced moves that beat alpha and were searched again
+        self.futilityPrunes = 0
+        self.razorCutoffs = 0
+        self.checkExtensions = 0
+        self.stagedNodes = 0                    #nodes whose moves came from GameState.stagedMoves
+        self.captureStages = 0                  #of those, nodes that generated their captures
+        self.quietStages = 0                    #and their quiet moves
+        self.profile = None                     #name of the profile that ran, if any
+        self.timings = {}                       #method -> seconds ("timing" profile)
+        self.calls = {}                         #method -> number of calls ("timing" profile)
+        self.functions = []                     #slowest/most sampled functions ("cprofile" and "sample")
+
+    #nodes at ply + 1 per node at ply in the last completed iteration, up to its depth (check extensions left out)
+    def branchingFactors(self):
+        factors = []
+        for ply in range(min(len(self.nodesPerPly) - 1, self.depth)):
+            if not self.nodesPerPly[ply] or not self.nodesPerPly[ply + 1]:
+                break
+            factors.append(self.nodesPerPly[ply + 1] / self.nodesPerPly[ply])
+        return factors
+
+    #geometric mean of the per ply factors
+    def branchingFactor(self):
+        factors = self.branchingFactors()
+        if not factors:
+            return 0.0
+        return (self.nodesPerPly[len(factors)] / self.nodesPerPly[0]) ** (1.0 / len(factors))
+
+    #nodes of the last iteration per node of the one before
+    def effectiveBranchingFactor(self):
+        if len(self.iterationNodes) < 2 or not self.iterationNodes[-2]:
+            return 0.0
+        return self.iterationNodes[-1] / self.iterationNodes[-2]
+
+    #cutoffs per interior main search node
+    def cutoffRate(self):
+        return self.cutoffs / self.nodes if self.nodes else 0.0
+
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def ttHitRate(self):
+        return self.ttHits / self.ttProbes if self.ttProbes else 0.0
+
+    #staged nodes that never generated their quiet moves, and those that generated nothing (hash move cutoff)
+    def quietGenerationsAvoided(self):
+        return self.stagedNodes - self.quietStages
+
+    def generationsAvoided(self):
+        return self.stagedNodes - self.captureStages
+
+    def nps(self):
+        return (self.nodes + self.qNodes) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def toDict(self):
+        plies = len(self.branchingFactors()) + 1
+        return {"depth": self.depth,
+                "nodes": self.nodes,
+                "qNodes": self.qNodes,
+                "elapsed": self.elapsed,
+                "nps": self.nps(),
+                "nodesPerPly": self.nodesPerPly[:plies],
+                "branchingFactors": self.branchingFactors(),
+                "branchingFactor": self.branchingFactor(),
+                "iterationNodes": list(self.iterationNodes),
+                "effectiveBranchingFactor": self.effectiveBranchingFactor(),
+                "cutoffs": self.cutoffs,
+                "cutoffRate": self.cutoffRate(),
+                "firstMoveCutoffs": self.firstMoveCutoffs,
+                "firstMoveCutoffRate": self.firstMoveCutoffRate(),
+                "ttProbes": self.ttProbes,
+                "ttHits": self.ttHits,
+                "ttStores": self.ttStores,
+                "ttHitRate": self.ttHitRate(),
+                "selective": list(self.selective),
+                "nullMoveCutoffs": self.nullMoveCutoffs,
+                "lmrReductions": self.lmrReductions,
+                "lmrResearches": self.lmrResearches,
+                "futilityPrunes": self.futilityPrunes,
+                "razorCutoffs": self.razorCutoffs,
+                "checkExtensions": self.checkExtensions,
+                "stagedNodes": self.stagedNodes,
+                "captureStages": self.captureStages,
+                "quietStages": self.quietStages,
+                "quietGenerationsAvoided": self.quietGenerationsAvoided(),
+                "generationsAvoided": self.generationsAvoided(),
+                "profile": self.profile,
+                "timings": dict(self.timings),
+                "calls": dict(self.calls),
+                "functions": list(self.functions)}
+
+    def toJson(self, indent=2):
+        return json.dumps(self.toDict(), indent=indent)
+
+    def csvRow(self, label=""):
+        row = {"label": label,
+               "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "depth": self.depth,
+               "nodes": self.nodes,
+               "qNodes": self.qNodes,
+               "elapsed": "%.4f" % self.elapsed,
+               "nps": "%.0f" % self.nps(),
+               "branchingFactor": "%.3f" % self.branchingFactor(),
+               "cutoffRate": "%.4f" % self.cutoffRate(),
+               "firstMoveCutoffRate": "%.4f" % self.firstMoveCutoffRate(),
+               "ttHitRate": "%.4f" % self.ttHitRate()}
+        for name in TIMED_METHODS:
+            row[name + "Time"] = "%.4f" % self.timings[name] if name in self.timings else ""
+        return row
+
+
+def writeJson(path, statsList, labels=None):
+    labels = labels or [""] * len(statsList)
+    with open(path, "w") as file:
+        json.dump([dict(stats.toDict(), label=label) for stats, label in zip(statsList, labels)], file, indent=2)
+
+
+#appends one row per stats object, the header is written when the file is new
+def appendCsv(path, statsList, label=""):
+    newFile = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as file:
+        writer = csv.DictWriter(file, CSV_FIELDS, lineterminator="\n")
+        if newFile:
+            writer.writeheader()
+        for stats in statsList:
+            writer.writerow(stats.csvRow(label))
+
+
+class TimedGameState:
+    #stands in for the GameState during a "timing" search, the timed methods add to stats.timings
+    #everything else is read through from the wrapped state
+    def __init__(self, gs, stats):
+        self.__dict__["gs"] = gs
+        self.__dict__["stats"] = stats
+        for name in TIMED_METHODS:
+            stats.timings.setdefault(name, 0.0)
+            stats.calls.setdefault(name, 0)
+            self.__dict__[name] = self._timed(name, getattr(gs, name))
+        #the staged generator runs on the wrapper so its getCaptureMoves/getQuietMoves calls are timed too
+        self.__dict__["stagedMoves"] = types.MethodType(type(gs).stagedMoves, self)
+
+    def _timed(self, name, method):
+        timings = self.stats.timings
+        calls = self.stats.calls
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            result = method(*args)
+            timings[name] += clock() - start
+            calls[name] += 1
+            return result
+        return timed
+
+    def __getattr__(self, name):
+        return getattr(self.gs, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.gs, name, value)
+
+
+class SamplingProfiler:
+    #samples the stack of one thread from a background thread, counts every function seen (inclusive)
+    def __init__(self, threadId=None, interval=SAMPLE_INTERVAL):
+        self.threadId = threading.get_ident() if threadId is None else threadId
+        self.interval = interval
+        self.samples = 0
+        self.counts = {}                        #"file:line function" -> samples with it on the stack
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.threadId)
+            if frame is not None:
+                self.samples += 1
+                seen = set()
+                while frame is not None:
+                    code = frame.f_code
+                    name = "%s:%d %s" % (os.path.basename(code.co_filename), code.co_firstlineno, code.co_name)
+                    if name not in seen:
+                        seen.add(name)
+                        self.counts[name] = self.counts.get(name, 0) + 1
+                    frame = frame.f_back
+            time.sleep(self.interval)
+
+    def top(self, count=TOP_FUNCTIONS):
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:count]
+        return [{"function": name, "samples": samples, "share": samples / self.samples}
+                for name, samples in ranked]
+
+
+#functions with the most cumulative time of a finished cProfile run
+def cProfileTop(profiler, count=TOP_FUNCTIONS):
+    entries = []
+    for entry in profiler.getstats():
+        code = entry.code
+        name = code if isinstance(code, str) else "%s:%d %s" % (
+            os.path.basename(code.co_filename), code.co_firstlineno, code.co_name)
+        entries.append({"function": name,
+                        "calls": entry.callcount,
+                        "time": entry.inlinetime,
+                        "cumulativeTime": entry.totaltime})
+    entries.sort(key=lambda entry: entry["cumulativeTime"], reverse=True)
+    return entries[:count]
+
+
+#starts the requested profiler for the search running on this thread, returns a stop function
+def startProfile(profile, stats):
+    if profile is not None and profile not in PROFILES:
+        raise ValueError("unknown profile %r (choose from %s)" % (profile, ", ".join(PROFILES)))
+    stats.profile = profile
+    if profile == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def stop():
+            profiler.disable()
+            stats.functions = cProfileTop(profiler)
+        return stop
+    if profile == "sample":
+        sampler = SamplingProfiler()
+        sampler.start()
+
+        def stop():
+            sampler.stop()
+            stats.functions = sampler.top()
+        return stop
+    return lambda: None
@@ -0,0 +1,170 @@
+"""
+node count and solve rate benchmark of the selective search techniques (SmartMoveFinder.SELECTIVE)
+-> every configuration searches the benchmark positions of parallelSearch.py to a fixed depth:
+   nodes, time and effective branching factor (nodes of the last iteration / nodes of the one before)
+-> and solves a tactical suite (built-in WAC positions or EPD files) at a fixed depth or time
+-> configurations: "none" (full width), "all", a technique alone ("lmr") or all but one ("-lmr")
+   default: none, all and every technique alone; --ablation adds all but each one
+
+usage:
+    python selectiveBench.py --depth 5
+    python selectiveBench.py --configs none all -nullMove -lmr --solve-depth 5 --json selective.json
+    python selectiveBench.py --epd wac.epd --solve-time 1 --ablation
+"""
+import argparse
+import json
+import sys
+import time
+
+import chessEngine
+import epd
+from parallelSearch import BENCH_POSITIONS
+from SmartMoveFinder import NegaMaxSearch, SELECTIVE
+from transpositionTable import TranspositionTable
+
+DEFAULT_DEPTH = 5
+DEFAULT_SOLVE_DEPTH = 5
+
+#the first Win At Chess positions, enough to see a technique miss tactics
+WAC_POSITIONS = [
+    '2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - bm Qg6; id "WAC.001";',
+    '8/7p/5k2/5p2/p1p2P2/Pr1pPK2/1P1R3P/8 b - - bm Rxb2; id "WAC.002";',
+    '5rk1/1ppb3p/p1pb4/6q1/3P1p1r/2P1R2P/PP1BQ1P1/5RKN w - - bm Rg3; id "WAC.003";',
+    'r1bq2rk/pp3pbp/2p1p1pQ/7P/3P4/2PB1N2/PP3PPR/2KR4 w - - bm Qxh7+; id "WAC.004";',
+    '5k2/6pp/p1qN4/1p1p4/3P4/2PKP2Q/PP3r2/3R4 b - - bm Qc4+; id "WAC.005";',
+    '7k/p7/1R5K/6r1/6p1/6P1/8/8 w - - bm Rb7; id "WAC.006";',
+    'rnbqkb1r/pppp1ppp/8/4P3/6n1/7P/PPPNPPP1/R1BQKBNR b KQkq - bm Ne3; id "WAC.007";',
+    'r4q1k/p2bR1rp/2p2Q1N/5p2/5p2/2P5/PP3PPP/R5K1 w - - bm Rf7; id "WAC.008";',
+    '3q1rk1/p4pp1/2pb3p/3p4/6Pr/1PNQ4/P1PB1PP1/4RRK1 b - - bm Bh2+; id "WAC.009";',
+    '2br2k1/2q3rn/p2NppQ1/2p1P3/Pp5R/4P3/1P3PPP/3R2K1 w - - bm Rxh7; id "WAC.010";',
+    'r1b1kb1r/3q1ppp/pBp1pn2/8/Np3P2/5B2/PPP3PP/R2Q1RK1 w kq - bm Bxc6; id "WAC.011";',
+    '4k1r1/2p3r1/1pR1p3/3pP2p/3P2qP/P4N2/1PQ4P/5R1K b - - bm Qxf3+; id "WAC.012";',
+    '5rk1/pp4p1/2n1p2p/2Npq3/2p5/6P1/P3P1BP/R4Q1K w - - bm Qxf8+; id "WAC.013";',
+    'r2rb1k1/pp1q1p1p/2n1p1p1/2bp4/5P2/PP1BPR1Q/1BPN2PP/R5K1 w - - bm Qxh7+; id "WAC.014";',
+    '1R6/1brk2p1/4p2p/p1P1Pp2/P7/6P1/1P4P1/2R3K1 w - - bm Rxb7; id "WAC.015";',
+    'r4rk1/ppp2ppp/2n5/2bqp3/8/P2PB3/1PP1NPPP/R2Q1RK1 w - - bm Nc3; id "WAC.016";',
+    'R7/P4k2/8/8/8/8/r7/6K1 w - - bm Rh8; id "WAC.018";',
+    'r1b2rk1/ppbn1ppp/4p3/1QP4q/3P4/N4N2/5PPP/R1B2RK1 w - - bm c6; id "WAC.019";',
+    'r2qkb1r/1ppb1ppp/p7/4p3/P1Q1P3/2P5/5PPP/R1B2KNR b kq - bm Bb5; id "WAC.020";',
+]
+
+
+#"none", "all", "lmr" (alone) or "-lmr" (all but) -> tuple of technique names
+def parseConfig(name):
+    if name == "none":
+        return ()
+    if name == "all":
+        return SELECTIVE
+    technique = name[1:] if name.startswith("-") else name
+    if technique not in SELECTIVE:
+        raise ValueError("unknown configuration %r (none, all, a technique or -technique; techniques: %s)" % (
+            name, ", ".join(SELECTIVE)))
+    if name.startswith("-"):
+        return tuple(other for other in SELECTIVE if other != technique)
+    return (technique,)
+
+
+#fixed depth search of one position: nodes, seconds, effective branching factor and the selective counters
+def searchPosition(fen, depth, selective):
+    gs = chessEngine.GameState(fen)
+    iterationNodes = []
+    search = NegaMaxSearch(gs, depth, tt=TranspositionTable(), selective=selective,
+                           onIteration=lambda result: iterationNodes.append(result.nodes + result.qNodes))
+    result = search.search(gs.getValidMoves())
+    perIteration = [nodes - previous for nodes, previous in zip(iterationNodes, [0] + iterationNodes)]
+    stats = result.stats.toDict()
+    return {"move": gs.getSan(result.bestMove),
+            "score": result.score,
+            "nodes": result.nodes + result.qNodes,
+            "seconds": result.elapsed,
+            "ebf": perIteration[-1] / perIteration[-2] if len(perIteration) > 1 and perIteration[-2] else 0.0,
+            "counters": {name: stats[name] for name in ("nullMoveCutoffs", "lmrReductions", "lmrResearches",
+                                                        "futilityPrunes", "razorCutoffs", "checkExtensions")}}
+
+
+def runConfig(name, depth, positions, solveDepth, solveTime, report=None):
+    selective = parseConfig(name)
+    searches = {}
+    for positionName, fen in BENCH_POSITIONS:
+        searches[positionName] = searchPosition(fen, depth, selective)
+    suite = [epd.solvePosition(position, solveTime, solveDepth if solveTime is None else None, selective)
+             for position in positions]
+    scored = [result for result in suite if result["solved"] is not None]
+    nodes = sum(search["nodes"] for search in searches.values())
+    seconds = sum(search["seconds"] for search in searches.values())
+    ebfs = [search["ebf"] for search in searches.values() if search["ebf"]]
+    summary = {"config": name,
+               "selective": list(selective),
+               "depth": depth,
+               "nodes": nodes,
+               "seconds": seconds,
+               "nps": nodes / seconds if seconds > 0 else 0.0,
+               "ebf": sum(ebfs) / len(ebfs) if ebfs else 0.0,
+               "solved": sum(1 for result in scored if result["solved"]),
+               "suitePositions": len(scored),
+               "suiteNodes": sum(result["nodes"] for result in suite),
+               "suiteSeconds": sum(result["seconds"] for result in suite),
+               "positions": searches,
+               "suite": [{key: result[key] for key in ("id", "move", "solved", "depth", "nodes", "seconds")}
+                         for result in suite]}
+    if report is not None:
+        report(summary)
+    return summary
+
+
+def formatSummary(summary, baseline=None):
+    line = "%-18s nodes %9d  %6.1fs  %6.0f nps  EBF %5.2f  solved %2d/%d (%7d nodes, %5.1fs)" % (
+        summary["config"], summary["nodes"], summary["seconds"], summary["nps"], summary["ebf"],
+        summary["solved"], summary["suitePositions"], summary["suiteNodes"], summary["suiteSeconds"])
+    if baseline is not None and baseline["nodes"] and baseline["seconds"]:
+        line += "  nodes %+4.0f%% time %+4.0f%%" % (100.0 * summary["nodes"] / baseline["nodes"] - 100,
+                                                   100.0 * summary["seconds"] / baseline["seconds"] - 100)
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="node count and solve rate of the selective search techniques")
+    parser.add_argument("--configs", nargs="+", help="configurations (default: none, all and each technique alone)")
+    parser.add_argument("--ablation", action="store_true", help="add all-but-one configurations")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH,
+                        help="depth of the node count searches (default %(default)s)")
+    parser.add_argument("--solve-depth", type=int, default=DEFAULT_SOLVE_DEPTH,
+                        help="depth of the tactical suite searches (default %(default)s)")
+    parser.add_argument("--solve-time", type=float, help="seconds per suite position instead of a fixed depth")
+    parser.add_argument("--epd", action="append", help="EPD suite instead of the built-in WAC positions")
+    parser.add_argument("--json", metavar="FILE", help="write every configuration's results as JSON")
+    args = parser.parse_args(argv)
+
+    configs = args.configs or ["none", "all"] + list(SELECTIVE)
+    if args.ablation:
+        configs += ["-" + name for name in SELECTIVE]
+    try:
+        for name in configs:
+            parseConfig(name)
+        if args.epd:
+            positions = [position for path in args.epd for position in epd.readEpd(path)]
+        else:
+            positions = [epd.parseEpd(line) for line in WAC_POSITIONS]
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+
+    summaries = []
+    baseline = []
+
+    def report(summary):
+        print(formatSummary(summary, baseline[0] if baseline else None), flush=True)
+        if not baseline:
+            baseline.append(summary)
+
+    start = time.perf_counter()
+    for name in configs:
+        summaries.append(runConfig(name, args.depth, positions, args.solve_depth, args.solve_time, report))
+    print("%d configurations in %.1fs" % (len(configs), time.perf_counter() - start))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(summaries, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+move generations avoided by staged move generation (GameState.stagedMoves)
+-> searches the benchmark positions of parallelSearch.py to a fixed depth twice:
+   all moves generated up front (getValidMoves + orderMoves), and in stages (hash move, captures, killers, quiets)
+-> per search: main search nodes, capture and quiet stages generated, nodes that skipped the quiet moves
+   (cutoff by the hash move, a capture or a killer) or every generation (cutoff by the hash move), and time
+-> the staged quiet moves are sorted when they are reached, with the history of the siblings already searched,
+   so node counts can differ a little between the two runs
+-> --json writes every search
+
+usage:
+    python stagedBench.py --depth 5
+    python stagedBench.py --depth 4 --selective --json staged.json
+"""
+import argparse
+import json
+import sys
+
+import chessEngine
+from parallelSearch import BENCH_POSITIONS, DEFAULT_BENCH_DEPTH
+from SmartMoveFinder import NegaMaxSearch, SELECTIVE
+from transpositionTable import TranspositionTable
+
+
+def searchPosition(fen, depth, staged, selective):
+    gs = chessEngine.GameState(fen)
+    search = NegaMaxSearch(gs, depth, tt=TranspositionTable(), selective=selective, staged=staged)
+    stats = search.search(gs.getValidMoves()).stats
+    return {"nodes": stats.nodes,
+            "qNodes": stats.qNodes,
+            "seconds": stats.elapsed,
+            "stagedNodes": stats.stagedNodes,
+            "captureStages": stats.captureStages,
+            "quietStages": stats.quietStages,
+            "quietGenerationsAvoided": stats.quietGenerationsAvoided(),
+            "generationsAvoided": stats.generationsAvoided()}
+
+
+def runBench(depth, selective=(), report=None):
+    results = []
+    for name, fen in BENCH_POSITIONS:
+        result = {"name": name,
+                  "upfront": searchPosition(fen, depth, False, selective),
+                  "staged": searchPosition(fen, depth, True, selective)}
+        results.append(result)
+        if report is not None:
+            report(result)
+    return results
+
+
+def formatResult(result):
+    upfront, staged = result["upfront"], result["staged"]
+    nodes = staged["stagedNodes"]
+    return "%-14s nodes %6d/%6d  quiet moves skipped %5d (%4.1f%%)  nothing generated %4d (%4.1f%%)  " \
+           "%5.2fs -> %5.2fs" % (
+               result["name"], upfront["nodes"], staged["nodes"],
+               staged["quietGenerationsAvoided"], 100.0 * staged["quietGenerationsAvoided"] / nodes if nodes else 0,
+               staged["generationsAvoided"], 100.0 * staged["generationsAvoided"] / nodes if nodes else 0,
+               upfront["seconds"], staged["seconds"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="move generations avoided by staged move generation")
+    parser.add_argument("--depth", type=int, default=DEFAULT_BENCH_DEPTH, help="search depth (default %(default)s)")
+    parser.add_argument("--selective", action="store_true", help="search with the selective techniques on")
+    parser.add_argument("--json", metavar="FILE", help="write every search as JSON")
+    args = parser.parse_args(argv)
+
+    results = runBench(args.depth, SELECTIVE if args.selective else (),
+                       lambda result: print(formatResult(result), flush=True))
+    staged = [result["staged"] for result in results]
+    nodes = sum(search["stagedNodes"] for search in staged)
+    upfrontSeconds = sum(result["upfront"]["seconds"] for result in results)
+    stagedSeconds = sum(search["seconds"] for search in staged)
+    print("total: %d staged nodes, %d capture and %d quiet generations instead of %d of each" % (
+        nodes, sum(search["captureStages"] for search in staged), sum(search["quietStages"] for search in staged),
+        nodes))
+    print("       %.2f quiet generations avoided per node, %.2fs -> %.2fs (%+.1f%%)" % (
+        sum(search["quietGenerationsAvoided"] for search in staged) / nodes if nodes else 0.0,
+        upfrontSeconds, stagedSeconds, 100.0 * stagedSeconds / upfrontSeconds - 100 if upfrontSeconds else 0.0))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"depth": args.depth, "selective": bool(args.selective), "results": results}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
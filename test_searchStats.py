@@ -0,0 +1,48 @@
+"""
+checks of the search statistics (searchStats.py)
+-> nodes per ply of a full width fixed depth search never shrink from one ply to the next
+-> the stats describe the last completed iteration
+
+usage:
+    python -m pytest test_searchStats.py
+    python -m unittest test_searchStats
+"""
+import unittest
+
+import chessEngine
+from parallelSearch import BENCH_POSITIONS
+from SmartMoveFinder import NegaMaxSearch
+from transpositionTable import TranspositionTable
+
+DEPTH = 3
+
+
+def searchStats(fen, depth=DEPTH):
+    gs = chessEngine.GameState(fen)
+    search = NegaMaxSearch(gs, depth, tt=TranspositionTable(), selective=())
+    return search.search(gs.getValidMoves()).stats
+
+
+class NodesPerPlyTest(unittest.TestCase):
+    def testEveryPlyHasAtLeastTheNodesOfTheOneBefore(self):
+        for name, fen in BENCH_POSITIONS:
+            stats = searchStats(fen)
+            plies = stats.nodesPerPly[:stats.depth + 1]
+            for ply in range(stats.depth):
+                self.assertGreaterEqual(plies[ply + 1], plies[ply], "%s ply %d: %s" % (name, ply, plies))
+            self.assertTrue(all(factor >= 1.0 for factor in stats.branchingFactors()), name)
+
+    def testStatsDescribeTheLastIteration(self):
+        name, fen = BENCH_POSITIONS[0]
+        stats = searchStats(fen)
+        gs = chessEngine.GameState(fen)
+        self.assertEqual(stats.depth, DEPTH)
+        self.assertEqual(stats.nodesPerPly[0], 1)                           #the root, once
+        self.assertEqual(stats.nodesPerPly[1], len(gs.getValidMoves()))     #every root move
+        self.assertEqual(len(stats.iterationNodes), DEPTH)
+        self.assertEqual(sum(stats.iterationNodes), stats.nodes + stats.qNodes)
+        self.assertGreater(stats.effectiveBranchingFactor(), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
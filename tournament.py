@@ -0,0 +1,299 @@
+"""
+headless engine-vs-engine tournament runner (no pygame)
+-> plays games between two SmartMoveFinder strategies over a process pool
+-> openings randomised with a few random plies, every opening played with both colours
+-> per-move time or depth limits, draw/win adjudication
+-> streams results (one JSON line per game), PGN and a binary game archive (gameArchive.py) to disk as games finish
+-> reports the Elo difference with a 95% error bar and games per second
+
+engines are given as name[:option=value,...], for example
+    random  greedy  minimax  negamax:depth=3  negamax:time=0.1  negamax:time=0.2,quiescence=0
+
+usage:
+    python tournament.py negamax:depth=3 greedy --games 200 --workers 8
+    python tournament.py negamax:time=0.1 negamax:time=0.1,quiescence=0 --pgn games.pgn --results games.jsonl
+    python tournament.py negamax:depth=2 random --games 1000 --archive selfplay.cga
+"""
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import chessEngine
+import gameArchive
+import SmartMoveFinder
+from bitboards import popCount
+from transpositionTable import TranspositionTable
+
+DEFAULT_GAMES = 100
+DEFAULT_RANDOM_PLIES = 4
+DEFAULT_MAX_PLIES = 300             #adjudicated as a draw after this many plies
+DEFAULT_RESIGN_SCORE = 1000         #centipawns, white's point of view
+DEFAULT_RESIGN_PLIES = 8            #plies in a row beyond the resign score to adjudicate a win
+
+
+def randomMove(gs, validMoves, options, tt):
+    return SmartMoveFinder.findRandomMove(validMoves)
+
+
+def greedyMove(gs, validMoves, options, tt):
+    return SmartMoveFinder.findBestMove(gs, validMoves, tt)
+
+
+def minimaxMove(gs, validMoves, options, tt):
+    return SmartMoveFinder.findBestMoveMinMax(gs, validMoves, tt)
+
+
+def negamaxMove(gs, validMoves, options, tt):
+    return SmartMoveFinder.findBestMoveNegaMax(gs, validMoves, options.get("depth"), options.get("time"),
+                                               options.get("nodes"), bool(options.get("ordering", 1)),
+                                               bool(options.get("quiescence", 1)), tt=tt).bestMove
+
+
+#name -> function(gs, validMoves, options, tt) returning a move, tt is the engine's own transposition table
+STRATEGIES = {"random": randomMove,
+              "greedy": greedyMove,
+              "minimax": minimaxMove,
+              "negamax": negamaxMove}
+
+
+#"negamax:depth=3,time=0.5" -> ("negamax", {"depth": 3, "time": 0.5})
+def parseEngine(spec):
+    name, _, optionText = spec.partition(":")
+    if name not in STRATEGIES:
+        raise ValueError("unknown engine %r (choose from %s)" % (name, ", ".join(sorted(STRATEGIES))))
+    options = {}
+    for option in filter(None, optionText.split(",")):
+        key, _, value = option.partition("=")
+        try:
+            options[key] = int(value)
+        except ValueError:
+            try:
+                options[key] = float(value)
+            except ValueError:
+                raise ValueError("bad engine option %r in %r" % (option, spec))
+    return name, options
+
+
+def insufficientMaterial(gs):
+    pieces = [p for p in chessEngine.PIECES if gs.pieceBitboards[p] and p[1] != 'K']
+    if not pieces:
+        return True
+    return len(pieces) == 1 and pieces[0][1] in "NB" and popCount(gs.pieceBitboards[pieces[0]]) == 1
+
+
+#plays one game, engines = (white spec, black spec); returns the result dict (with "san" moves and 16-bit "codes")
+def playGame(white, black, openingSeed, randomPlies=DEFAULT_RANDOM_PLIES, maxPlies=DEFAULT_MAX_PLIES,
+             resignScore=DEFAULT_RESIGN_SCORE, resignPlies=DEFAULT_RESIGN_PLIES):
+    engines = {True: parseEngine(white), False: parseEngine(black)}
+    #a fresh table per engine and game, so paired games and the two engines do not share what they learnt
+    tables = {True: TranspositionTable(), False: TranspositionTable()}
+    random.seed(openingSeed)                                #strategies that shuffle get repeatable too
+    opening = random.Random(openingSeed)
+    gs = chessEngine.GameState()
+    sanMoves = []
+    codes = []
+    keys = {gs.zobristKey: 1}
+    resignCount = 0
+    result, termination = None, None
+    start = time.perf_counter()
+
+    while result is None:
+        validMoves = gs.getValidMoves()
+        if gs.checkMate:
+            result, termination = ("0-1" if gs.whiteToMove else "1-0"), "checkmate"
+            break
+        if gs.staleMate:
+            result, termination = "1/2-1/2", "stalemate"
+            break
+        if len(gs.moveLog) < randomPlies:
+            move = opening.choice(validMoves)
+        else:
+            name, options = engines[gs.whiteToMove]
+            move = STRATEGIES[name](gs, validMoves, options, tables[gs.whiteToMove])
+            if move is None:
+                move = SmartMoveFinder.findRandomMove(validMoves)
+        sanMoves.append(gs.getSan(move, validMoves))
+        codes.append(gameArchive.encodeMove(move))
+        gs.makeMove(move)
+
+        keys[gs.zobristKey] = keys.get(gs.zobristKey, 0) + 1
+        score = gs.evaluate()
+        resignCount = resignCount + 1 if abs(score) >= resignScore and len(gs.moveLog) > randomPlies else 0
+        if keys[gs.zobristKey] >= 3:
+            result, termination = "1/2-1/2", "threefold repetition"
+        elif gs.halfmoveClock >= 100:
+            result, termination = "1/2-1/2", "fifty move rule"
+        elif insufficientMaterial(gs):
+            result, termination = "1/2-1/2", "insufficient material"
+        elif resignCount >= resignPlies:
+            result, termination = ("1-0" if score > 0 else "0-1"), "adjudication"
+        elif len(gs.moveLog) >= maxPlies:
+            result, termination = "1/2-1/2", "max plies"
+
+    return {"white": white,
+            "black": black,
+            "result": result,
+            "termination": termination,
+            "plies": len(sanMoves),
+            "openingSeed": openingSeed,
+            "seconds": time.perf_counter() - start,
+            "san": sanMoves,
+            "codes": codes}
+
+
+def _playTask(task):
+    return playGame(*task)
+
+
+def pgnTags(game, roundNumber):
+    return [("Event", "engine match"),
+            ("Site", "tournament.py"),
+            ("Date", time.strftime("%Y.%m.%d")),
+            ("Round", str(roundNumber)),
+            ("White", game["white"]),
+            ("Black", game["black"]),
+            ("Result", game["result"]),
+            ("Termination", game["termination"]),
+            ("PlyCount", str(game["plies"]))]
+
+
+def formatPgn(game, roundNumber):
+    lines = ['[%s "%s"]' % tag for tag in pgnTags(game, roundNumber)]
+    lines.append("")
+    tokens = []
+    for i, san in enumerate(game["san"]):
+        if i % 2 == 0:
+            tokens.append("%d." % (i // 2 + 1))
+        tokens.append(san)
+    tokens.append(game["result"])
+    line = ""
+    for token in tokens:                                    #PGN lines stay under 80 characters
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+#Elo difference of engine one from its score, with the 95% interval from the per game score spread
+def eloDifference(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+
+    def elo(p):
+        p = min(max(p, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / p - 1)
+
+    return elo(score), (elo(min(score + margin, 1.0)) - elo(max(score - margin, 0.0))) / 2
+
+
+#every opening seed is played twice, engine one has white in even games
+def runMatch(engine1, engine2, games=DEFAULT_GAMES, workers=None, seed=0, randomPlies=DEFAULT_RANDOM_PLIES,
+             maxPlies=DEFAULT_MAX_PLIES, resignScore=DEFAULT_RESIGN_SCORE, resignPlies=DEFAULT_RESIGN_PLIES,
+             pgnFile=None, resultsFile=None, report=None, archive=None):
+    parseEngine(engine1)                                    #bad specs fail before the pool starts
+    parseEngine(engine2)
+    tasks = []
+    for game in range(games):
+        white, black = (engine1, engine2) if game % 2 == 0 else (engine2, engine1)
+        tasks.append((white, black, seed * 1000003 + game // 2, randomPlies, maxPlies, resignScore, resignPlies))
+
+    totals = {"wins": 0, "draws": 0, "losses": 0}           #from engine one's point of view
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        finished = map(_playTask, tasks)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+        finished = (future.result() for future in
+                    concurrent.futures.as_completed([executor.submit(_playTask, task) for task in tasks]))
+    try:
+        for played, game in enumerate(finished, 1):
+            if game["result"] == "1/2-1/2":
+                totals["draws"] += 1
+            elif (game["result"] == "1-0") == (game["white"] == engine1):
+                totals["wins"] += 1
+            else:
+                totals["losses"] += 1
+            if pgnFile is not None:
+                pgnFile.write(formatPgn(game, played))
+                pgnFile.flush()
+            if archive is not None:                         #gameArchive.ArchiveWriter
+                archive.add(gameArchive.GameRecord(pgnTags(game, played), game["codes"], game["result"]))
+            if resultsFile is not None:
+                resultsFile.write(json.dumps({key: game[key] for key in game if key not in ("san", "codes")}) + "\n")
+                resultsFile.flush()
+            if report is not None:
+                report(played, game, totals, time.perf_counter() - start)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    seconds = time.perf_counter() - start
+    elo, margin = eloDifference(totals["wins"], totals["draws"], totals["losses"])
+    return dict(totals, games=games, elo=elo, eloMargin=margin, seconds=seconds,
+                gamesPerSecond=games / seconds if seconds > 0 else 0.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="headless engine-vs-engine match between SmartMoveFinder strategies")
+    parser.add_argument("engine1", help="engine spec, e.g. negamax:depth=3")
+    parser.add_argument("engine2", help="opponent spec, e.g. greedy")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES, help="number of games (default %(default)s)")
+    parser.add_argument("--workers", type=int, help="processes (default: every core)")
+    parser.add_argument("--seed", type=int, default=0, help="opening seed (default %(default)s)")
+    parser.add_argument("--random-plies", type=int, default=DEFAULT_RANDOM_PLIES,
+                        help="random opening plies (default %(default)s)")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES,
+                        help="draw adjudication length (default %(default)s)")
+    parser.add_argument("--resign-score", type=int, default=DEFAULT_RESIGN_SCORE,
+                        help="win adjudication score in centipawns (default %(default)s)")
+    parser.add_argument("--resign-plies", type=int, default=DEFAULT_RESIGN_PLIES,
+                        help="plies in a row beyond the resign score (default %(default)s)")
+    parser.add_argument("--pgn", metavar="FILE", help="append the games as PGN")
+    parser.add_argument("--results", metavar="FILE", help="append one JSON line per game")
+    parser.add_argument("--archive", metavar="FILE", help="write the games to a binary game archive")
+    args = parser.parse_args(argv)
+    for spec in (args.engine1, args.engine2):
+        try:
+            parseEngine(spec)
+        except ValueError as error:
+            parser.error(str(error))
+
+    def report(played, game, totals, seconds):
+        elo, margin = eloDifference(totals["wins"], totals["draws"], totals["losses"])
+        print("game %4d  %-24s %-7s %-22s  +%d =%d -%d  elo %+.0f +/- %.0f  %.2f games/s" % (
+            played, "%s - %s" % (game["white"], game["black"]), game["result"], game["termination"],
+            totals["wins"], totals["draws"], totals["losses"], elo, margin, played / seconds), flush=True)
+
+    pgnFile = open(args.pgn, "a") if args.pgn else None
+    resultsFile = open(args.results, "a") if args.results else None
+    archive = gameArchive.ArchiveWriter(args.archive) if args.archive else None
+    try:
+        summary = runMatch(args.engine1, args.engine2, args.games, args.workers, args.seed, args.random_plies,
+                           args.max_plies, args.resign_score, args.resign_plies, pgnFile, resultsFile, report,
+                           archive)
+    finally:
+        for file in (pgnFile, resultsFile, archive):
+            if file is not None:
+                file.close()
+    print("%s vs %s: +%d =%d -%d, elo %+.1f +/- %.1f, %d games in %.1fs (%.2f games/s)" % (
+        args.engine1, args.engine2, summary["wins"], summary["draws"], summary["losses"], summary["elo"],
+        summary["eloMargin"], summary["games"], summary["seconds"], summary["gamesPerSecond"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
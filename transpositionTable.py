@@ -0,0 +1,68 @@
+"""
+fixed size transposition table for the AI searches
+-> indexed by the zobrist key of GameState
+-> stores depth, score, bound type and best move
+-> replacement by depth and age (entries from older searches are replaced first)
+"""
+
+EXACT = 0
+LOWER_BOUND = 1             #score is at least this (beta cutoff)
+UPPER_BOUND = 2             #score is at most this (no move raised alpha)
+
+DEFAULT_SIZE = 1 << 18      #number of entries, must be a power of 2
+
+#positions of the fields inside an entry tuple
+KEY, DEPTH, SCORE, BOUND, BEST_MOVE, AGE = range(6)
+
+
+class TranspositionTable:
+    def __init__(self, size=DEFAULT_SIZE):
+        if size <= 0 or size & (size - 1):
+            raise ValueError("transposition table size must be a power of 2")
+        self.size = size
+        self.mask = size - 1
+        self.entries = [None] * size
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    #call once per search, older entries become the first to be replaced
+    def newSearch(self):
+        self.age += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.age = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    #returns the entry tuple stored for key or None
+    def probe(self, key):
+        self.probes += 1
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[KEY] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, bestMove):
+        index = key & self.mask
+        old = self.entries[index]
+        #keep a deeper result from the current search for a different position
+        if old is not None and old[KEY] != key and old[AGE] == self.age and old[DEPTH] > depth:
+            return
+        self.entries[index] = (key, depth, score, bound, bestMove, self.age)
+        self.stores += 1
+
+    def stats(self):
+        used = sum(1 for entry in self.entries if entry is not None)
+        return {"probes": self.probes,
+                "hits": self.hits,
+                "stores": self.stores,
+                "hitRate": self.hits / self.probes if self.probes else 0.0,
+                "fill": used / self.size}
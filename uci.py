@@ -0,0 +1,260 @@
+"""
+UCI front end, lets match managers and analysis GUIs drive the engine (no pygame on this path)
+-> uci, isready, ucinewgame, setoption (Hash, Ponder, BookFile, BookDepth), position, go, stop, ponderhit, quit
+-> go takes wtime/btime/winc/binc/movestogo, movetime, depth, nodes, infinite and ponder
+-> the search runs on its own thread, stdin keeps being read so stop answers within milliseconds
+-> info lines with depth, score, nodes, nps, time and pv after every iteration
+-> "d" prints the current position as FEN (debugging, not part of UCI)
+
+usage:
+    python uci.py
+"""
+import time
+
+_startTime = time.perf_counter()                        #startup is reported at uciok
+
+import sys
+import threading
+
+import chessEngine
+from polyglotBook import PolyglotBook, DEFAULT_MAX_PLY
+from SmartMoveFinder import NegaMaxSearch, CHECKMATE, MATE_BOUND, MAX_DEPTH
+from transpositionTable import TranspositionTable
+
+ENGINE_NAME = "chess"
+ENGINE_AUTHOR = "MindedCat"
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+BYTES_PER_ENTRY = 64                                    #rough cost of one table entry in Python
+MOVE_OVERHEAD = 0.03                                    #seconds kept back for the GUI and the pipe
+
+
+def tableSize(megabytes):
+    entries = max(1, megabytes * 1024 * 1024 // BYTES_PER_ENTRY)
+    return 1 << (entries.bit_length() - 1)
+
+
+def formatScore(score):
+    if score > MATE_BOUND:
+        return "mate %d" % ((CHECKMATE - score + 1) // 2)
+    if score < -MATE_BOUND:
+        return "mate -%d" % ((CHECKMATE + score) // 2)
+    return "cp %d" % score
+
+
+#seconds to spend on this move, None for no limit
+def allocateTime(gs, options):
+    if "movetime" in options:
+        return max(0.001, options["movetime"] / 1000 - MOVE_OVERHEAD)
+    remaining = options.get("wtime" if gs.whiteToMove else "btime")
+    if remaining is None:
+        return None
+    increment = options.get("winc" if gs.whiteToMove else "binc", 0)
+    movesToGo = options.get("movestogo", 30)
+    budget = remaining / max(movesToGo, 1) + increment * 0.8
+    return max(0.001, min(budget, remaining * 0.5) / 1000 - MOVE_OVERHEAD)
+
+
+class UciEngine:
+    def __init__(self, output=None):
+        self.output = output or sys.stdout
+        self.outputLock = threading.Lock()
+        self.gs = chessEngine.GameState()
+        self.tt = TranspositionTable(tableSize(DEFAULT_HASH_MB))
+        self.thread = None
+        self.stopRequested = False
+        self.pondering = False              #ponder or infinite: bestmove waits for stop/ponderhit
+        self.deadline = None                #perf_counter time the running search has to stop at
+        self.pendingTimeLimit = None        #time limit that starts at ponderhit
+        self.book = None                    #PolyglotBook once BookFile is set
+        self.bookDepth = DEFAULT_MAX_PLY
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    #returns False on quit
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max %d" % (DEFAULT_HASH_MB, MAX_HASH_MB))
+            self.send("option name Ponder type check default false")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name BookDepth type spin default %d min 0 max 200" % DEFAULT_MAX_PLY)
+            self.send("uciok")
+            self.send("info string startup %.1f ms" % ((time.perf_counter() - _startTime) * 1000))
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stopSearch()
+            self.tt.clear()
+            self.gs = chessEngine.GameState()
+        elif command == "setoption":
+            self.setOption(args)
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(args)
+        elif command == "go":
+            self.stopSearch()
+            self.go(args)
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "d":
+            self.send(self.gs.getFen())
+        elif command == "quit":
+            self.stopSearch()
+            return False
+        return True
+
+    def setOption(self, args):
+        text = " ".join(args)
+        name, _, value = text.partition(" value ")
+        name = name.replace("name", "", 1).strip().lower()
+        if name == "hash":
+            try:
+                megabytes = min(max(int(value), 1), MAX_HASH_MB)
+            except ValueError:
+                self.send("info string bad Hash value " + value)
+                return
+            self.stopSearch()
+            self.tt = TranspositionTable(tableSize(megabytes))
+        elif name == "bookfile":
+            if self.book is not None:
+                self.book.close()
+                self.book = None
+            if value and value != "<empty>":
+                try:
+                    self.book = PolyglotBook(value, self.bookDepth)
+                except OSError as error:
+                    self.send("info string cannot open book: %s" % error)
+        elif name == "bookdepth":
+            try:
+                self.bookDepth = int(value)
+            except ValueError:
+                self.send("info string bad BookDepth value " + value)
+                return
+            if self.book is not None:
+                self.book.maxPly = self.bookDepth
+
+    def setPosition(self, args):
+        if "moves" in args:
+            index = args.index("moves")
+            setup, moves = args[:index], args[index + 1:]
+        else:
+            setup, moves = args, []
+        try:
+            if setup[:1] == ["startpos"]:
+                gs = chessEngine.GameState()
+            elif setup[:1] == ["fen"]:
+                gs = chessEngine.GameState(" ".join(setup[1:]))
+            else:
+                raise ValueError("position needs startpos or fen")
+        except ValueError as error:
+            self.send("info string " + str(error))
+            return
+        for text in moves:
+            move = next((m for m in gs.getValidMoves() if m.getChessNotation() == text), None)
+            if move is None:
+                self.send("info string illegal move " + text)
+                break
+            gs.makeMove(move)
+        self.gs = gs
+
+    def go(self, args):
+        options = {}
+        flags = set()
+        i = 0
+        while i < len(args):
+            if args[i] in ("infinite", "ponder"):
+                flags.add(args[i])
+                i += 1
+            elif i + 1 < len(args):
+                try:
+                    options[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                i += 1
+        if self.book is not None and not flags:
+            bookMove = self.book.chooseMove(self.gs)
+            if bookMove is not None:
+                self.send("info string book move")
+                self.send("bestmove " + bookMove.getChessNotation())
+                return
+        timeLimit = None if "infinite" in flags else allocateTime(self.gs, options)
+        self.pondering = bool(flags)
+        if "ponder" in flags:                                   #the clock starts at ponderhit
+            self.pendingTimeLimit, self.deadline = timeLimit, None
+        else:
+            self.pendingTimeLimit = None
+            self.deadline = time.perf_counter() + timeLimit if timeLimit is not None else None
+        self.stopRequested = False
+        self.thread = threading.Thread(target=self.search, daemon=True,
+                                       args=(self.gs, options.get("depth", MAX_DEPTH), options.get("nodes")))
+        self.thread.start()
+
+    def ponderHit(self):
+        if self.thread is not None and self.pondering:
+            if self.pendingTimeLimit is not None:
+                self.deadline = time.perf_counter() + self.pendingTimeLimit
+            self.pondering = False                          #a finished ponder search answers right away
+
+    def stopSearch(self):
+        if self.thread is not None:
+            self.stopRequested = True
+            self.pondering = False
+            self.thread.join()
+            self.thread = None
+
+    def stopCheck(self):
+        return self.stopRequested or (self.deadline is not None and time.perf_counter() > self.deadline)
+
+    def sendInfo(self, result):
+        nodes = result.nodes + result.qNodes
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s" % (
+            result.depth, formatScore(result.score), nodes, nodes / result.elapsed if result.elapsed > 0 else 0,
+            result.elapsed * 1000, " ".join(move.getChessNotation() for move in result.pv)))
+
+    #runs on the search thread, always ends with one bestmove line
+    def search(self, gs, maxDepth, nodeLimit):
+        gs = chessEngine.GameState(gs.getFen())             #own copy, the reader thread may set a new position
+        validMoves = gs.getValidMoves()
+        if not validMoves:
+            self.waitWhilePondering()
+            self.send("bestmove 0000")
+            return
+        search = NegaMaxSearch(gs, maxDepth, nodeLimit=nodeLimit, tt=self.tt, stopCheck=self.stopCheck,
+                               onIteration=self.sendInfo)
+        result = search.search(validMoves)
+        self.waitWhilePondering()
+        line = "bestmove " + result.bestMove.getChessNotation()
+        if len(result.pv) > 1:
+            line += " ponder " + result.pv[1].getChessNotation()
+        self.send(line)
+
+    #in ponder and infinite mode bestmove may only be sent after stop or ponderhit
+    def waitWhilePondering(self):
+        while self.pondering and not self.stopRequested:
+            time.sleep(0.001)
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stopSearch()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())